@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryAdviceBackend:
+    """In-process LRU store for advice text with a TTL"""
+
+    def __init__(self, ttl=604800, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (advice_text, stored_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[1] >= self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SqliteAdviceBackend:
+    """On-disk advice store that survives restarts and is shared by worker processes"""
+
+    def __init__(self, path, ttl=604800, max_entries=1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS advice ("
+                " key TEXT PRIMARY KEY,"
+                " advice_text TEXT NOT NULL,"
+                " stored_at REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS advice_last_used ON advice (last_used)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT advice_text, stored_at FROM advice WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] >= self.ttl:
+                self._conn.execute("DELETE FROM advice WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE advice SET last_used = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO advice (key, advice_text, stored_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            # Evict least recently used rows beyond the size bound
+            self._conn.execute(
+                "DELETE FROM advice WHERE key IN ("
+                " SELECT key FROM advice ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM advice").fetchone()[0]
+
+
+class AdviceCache:
+    """
+    Cache of OpenAI advice keyed by a canonical fingerprint of the prompt inputs
+
+    The advice prompt is determined by the scalp condition band, the
+    quantized scalp pH, the set of symptoms, the ids of the products shown
+    to the model and the (coarsely rounded) reading-history sentence, so two
+    requests that agree on those share one completion.
+    """
+
+    def __init__(self, backend, ph_step=0.1):
+        self.backend = backend
+        self.ph_step = ph_step
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a cache from ADVICE_CACHE_* environment variables
+
+        ADVICE_CACHE_BACKEND selects "memory" (default) or "sqlite"; the
+        sqlite file lives at ADVICE_CACHE_PATH.
+        """
+        ttl = float(os.getenv("ADVICE_CACHE_TTL_SECONDS", "604800"))
+        max_entries = int(os.getenv("ADVICE_CACHE_MAX_ENTRIES", "1024"))
+        if os.getenv("ADVICE_CACHE_BACKEND", "memory").lower() == "sqlite":
+            path = os.getenv("ADVICE_CACHE_PATH", "advice_cache.sqlite3")
+            backend = SqliteAdviceBackend(path, ttl=ttl, max_entries=max_entries)
+        else:
+            backend = MemoryAdviceBackend(ttl=ttl, max_entries=max_entries)
+        return cls(backend, ph_step=float(os.getenv("ADVICE_CACHE_PH_STEP", "0.1")))
+
+    def quantize_ph(self, scalp_ph):
+        """Snap a pH reading to the configured step (e.g. 5.53 -> 5.5 for step 0.1)"""
+        if not self.ph_step:
+            return float(scalp_ph)
+        return round(round(float(scalp_ph) / self.ph_step) * self.ph_step, 6)
+
+    def fingerprint(self, condition, scalp_ph, symptoms, products, history=None, max_tokens=None):
+        """
+        Build the canonical cache key for an advice request
+
+        Args:
+            condition: Scalp condition band used in the prompt
+            scalp_ph: User's scalp pH measurement
+            symptoms: List of symptoms reported by the user
+            products: Products included in the prompt (only their ids are used)
+            history: Reading-history sentence added to the prompt, if any
+            max_tokens: Reply token cap the advice is requested with, if any
+
+        Returns:
+            Hex digest identifying the advice request
+        """
+        canonical = {
+            "condition": condition,
+            "ph": self.quantize_ph(scalp_ph),
+            "symptoms": sorted(set(symptoms or [])),
+            "products": [str(p.get('id') or p.get('name', '')) for p in products or []]
+        }
+        # Only keyed when present, so advice cached without a history keeps its key
+        if history is not None:
+            canonical["history"] = history
+        # Streamed and blocking advice are capped (and asked for) at different lengths
+        if max_tokens is not None:
+            canonical["max_tokens"] = max_tokens
+        encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return cached advice text for `key`, or None"""
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def put(self, key, advice_text):
+        """Store advice text under `key`"""
+        self.backend.put(key, advice_text)
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.backend),
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
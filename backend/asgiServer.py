@@ -0,0 +1,244 @@
+"""
+Async (ASGI) serving mode for the recommendation backend
+
+Serves the same routes and response schema as server.py, but upstream I/O
+is awaited on one event loop instead of blocking a worker thread per request:
+
+    uvicorn asgiServer:app --host 0.0.0.0 --port 3001
+
+Device readings (POST /api/readings) go through this process's sensor
+filter and readings store as in server.py, so device_id and user_id
+requests see the same smoothing and trends in either mode.
+"""
+import contextlib
+import logging
+import os
+import time
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+from asyncRecommendations import AsyncPHPerfectAPIIntegration
+from phTrends import TrendStore
+from readingStore import ReadingStore, ReadingStoreFull, ReadingStoreUnavailable, parse_readings
+from sensorFilter import SensorFilter
+from structuredLogging import configure_logging, logging_metrics, request_id_var, set_request_id, reset_request_id
+
+# Load environment variables
+load_dotenv()
+
+# Log through a background queue, tagged with the request id (LOG_LEVEL, LOG_FORMAT)
+configure_logging()
+logger = logging.getLogger("asgiServer")
+
+if not os.getenv("OPENAI_API_KEY"):
+    logger.warning("OPENAI_API_KEY not found in environment")
+if not os.getenv("SEPHORA_API_KEY"):
+    logger.warning("SEPHORA_API_KEY not found in environment")
+
+# Largest accepted /api/readings batch
+READINGS_MAX_BATCH = int(os.getenv("READINGS_MAX_BATCH", "1000"))
+
+# Days of reading history summarized into the advice for a user
+TREND_WINDOW_DAYS = float(os.getenv("TREND_WINDOW_DAYS", "30"))
+
+api = AsyncPHPerfectAPIIntegration()
+api.api.metrics.add_collector(logging_metrics)
+logger.info("Successfully initialized async API integration")
+
+# Smooth and calibrate device readings before they are used (SENSOR_*)
+sensor_filter = SensorFilter.from_env()
+api.api.metrics.add_collector(sensor_filter.collect_metrics)
+
+# Buffer streamed pH readings and write them to READINGS_DB_PATH in bulk (started in lifespan)
+reading_store = ReadingStore.from_env(metrics=api.api.metrics)
+# Rollups are kept up to date by the store's flushes, so hook them in before it starts
+trend_store = TrendStore(reading_store)
+api.api.metrics.add_collector(reading_store.collect_metrics)
+
+
+class RequestIdMiddleware:
+    """Binds a request id to each HTTP request's context, echoes it in X-Request-ID and logs completion"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = [500]
+
+        # Honour a caller-supplied id so logs can be joined across services
+        supplied = dict(scope.get("headers") or []).get(b"x-request-id")
+        token = set_request_id(supplied.decode("latin-1") if supplied else None)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id_var.get().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            logger.info(
+                "%s %s %d in %.1f ms", scope["method"], scope["path"], status[0], (time.perf_counter() - start) * 1000
+            )
+            reset_request_id(token)
+
+
+async def test_endpoint(request):
+    return JSONResponse({"status": "ok", "message": "API server is running"})
+
+
+async def metrics_endpoint(request):
+    """Stage latency histograms, upstream statuses and cache counters in Prometheus text format"""
+    return PlainTextResponse(api.api.metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+async def fetch_hair_products(scalp_ph, symptoms):
+    """Fetch products from every planned source, falling back to the default set"""
+    hair_products = []
+
+    try:
+        hair_products = api.api.catalog_products_for(scalp_ph, symptoms)
+        if hair_products is not None:
+            logger.debug("Serving %d products from the local catalog", len(hair_products))
+            return hair_products
+
+        hair_products = await api.fetch_products_for(scalp_ph, symptoms)
+        logger.debug("Fetched %d products total", len(hair_products))
+    except Exception as e:
+        logger.exception("Error fetching products: %s", e)
+
+    if not hair_products:
+        logger.warning("Using default products, no source returned in time")
+        hair_products = api.api._generate_default_products()
+
+    return hair_products
+
+
+async def get_recommendations(request):
+    data = None
+    try:
+        data = await request.json()
+        scalp_ph = data.get('scalp_ph', 5.5)  # Default to 5.5 if not provided
+        symptoms = data.get('symptoms', [])
+
+        logger.debug("Received request for scalp pH: %s, symptoms: %s", scalp_ph, symptoms)
+
+        # A known device's reading is replaced by its filter's current stabilized pH
+        if data.get('device_id') is not None:
+            scalp_ph = sensor_filter.current(str(data['device_id']), float(scalp_ph))
+
+        # Summarize the user's recent readings for the advice, if we have any
+        trend = None
+        if data.get('user_id') is not None:
+            trend = trend_store.summary(str(data['user_id']), days=TREND_WINDOW_DAYS)
+            if not trend["readings"]:
+                trend = None
+
+        # Readings inside the precomputed table are a single lookup (the table has no history-aware advice)
+        if not data.get('debug') and trend is None:
+            body = api.api.recommendation_table.lookup(scalp_ph, symptoms)
+            if body is not None:
+                return Response(body, media_type="application/json")
+
+        hair_products = await fetch_hair_products(scalp_ph, symptoms)
+
+        recommendations = await api.get_openai_recommendation(
+            scalp_ph, symptoms, hair_products, debug=bool(data.get('debug')), trend=trend
+        )
+        if trend is not None:
+            recommendations["trend"] = trend
+        return JSONResponse(recommendations)
+
+    except Exception as e:
+        logger.exception("Error processing recommendation request: %s", e)
+        return JSONResponse({
+            "error": str(e),
+            "advice_text": f"Sorry, we encountered an error processing your request: {str(e)}. Please try again later.",
+            "recommended_products": api.api._generate_default_products(),
+            "scalp_ph": data.get('scalp_ph', 5.5) if isinstance(data, dict) else 5.5,
+            "symptoms": data.get('symptoms', []) if isinstance(data, dict) else []
+        }, status_code=500)
+
+
+async def ingest_readings(request):
+    """Async version of server.ingest_readings: filter, buffer and acknowledge a batch of readings"""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    try:
+        rows = parse_readings(data, max_readings=READINGS_MAX_BATCH)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    # Filter state only moves on once the batch is buffered, so a retried batch is filtered afresh
+    rows, outliers, staged = sensor_filter.stage_rows(rows)
+    try:
+        if rows:
+            reading_store.submit(rows)
+    except ReadingStoreFull as e:
+        return JSONResponse({"error": str(e)}, status_code=429, headers={"Retry-After": str(e.retry_after)})
+    except ReadingStoreUnavailable as e:
+        return JSONResponse({"error": str(e)}, status_code=503, headers={"Retry-After": str(e.retry_after)})
+    sensor_filter.commit(staged)
+
+    return JSONResponse({"accepted": len(rows), "outliers": outliers}, status_code=202)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    reading_store.start()
+
+    # Pre-warm the local product catalog from a nightly crawl, if one exists
+    catalog_path = os.getenv("CATALOG_JSONL_PATH")
+    if catalog_path and os.path.exists(catalog_path):
+        api.api.catalog.load_jsonl(catalog_path)
+
+    # Keep the local product catalog in sync with the upstream APIs
+    catalog_sync_interval = float(os.getenv("CATALOG_SYNC_INTERVAL_SECONDS", "0"))
+    if catalog_sync_interval > 0:
+        api.api.catalog.start_background_sync(api.api, catalog_sync_interval)
+
+    # Serve precomputed responses from RECOMMENDATION_TABLE_PATH, rebuilt in the background
+    api.api.recommendation_table.load()
+    table_refresh_interval = float(os.getenv("RECOMMENDATION_TABLE_REFRESH_SECONDS", "0"))
+    if api.api.recommendation_table.path and table_refresh_interval > 0:
+        api.api.recommendation_table.start_background_refresh(api.api, table_refresh_interval)
+    yield
+    api.api.catalog.stop_background_sync()
+    api.api.recommendation_table.stop_background_refresh()
+    reading_store.close()
+    await api.aclose()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/test', test_endpoint, methods=['GET']),
+        Route('/api/metrics', metrics_endpoint, methods=['GET']),
+        Route('/api/recommendations', get_recommendations, methods=['POST']),
+        Route('/api/readings', ingest_readings, methods=['POST']),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_headers=["*"], allow_methods=["*"]),
+        Middleware(RequestIdMiddleware)
+    ],
+    lifespan=lifespan
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    port = int(os.environ.get("PORT", 3001))
+    uvicorn.run(app, host="0.0.0.0", port=port)
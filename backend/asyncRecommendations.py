@@ -0,0 +1,292 @@
+import asyncio
+import json
+import logging
+import os
+import httpx
+from circuitBreaker import CircuitOpenError
+from singleFlight import AsyncSingleFlight
+from productRecommendations import ADVICE_UNAVAILABLE, PHPerfectAPIIntegration
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncPHPerfectAPIIntegration:
+    """
+    Async variant of PHPerfectAPIIntegration for the ASGI server
+
+    Upstream I/O is awaited on pooled httpx clients, so a single event loop
+    can keep hundreds of recommendation requests in flight without a thread
+    per request. Parsing, enrichment, prompt building, rate limiting and the
+    product/advice caches are shared with the wrapped synchronous integration,
+    so both serving modes produce identical responses, and so are the
+    per-upstream circuit breakers, so an outage seen by either mode opens the
+    circuit for both.
+    """
+
+    def __init__(self, api=None):
+        self.api = api or PHPerfectAPIIntegration()
+
+        pool_size = int(os.getenv("ASYNC_UPSTREAM_POOL_SIZE", "100"))
+        connect_timeout = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3.05"))
+        read_timeout = float(os.getenv("UPSTREAM_READ_TIMEOUT", "10"))
+        openai_read_timeout = float(os.getenv("OPENAI_READ_TIMEOUT", "30"))
+        retries = int(os.getenv("UPSTREAM_RETRIES", "2"))
+
+        def pooled_client(timeout):
+            # One client per upstream host so each gets its own connection pool
+            limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            return httpx.AsyncClient(
+                timeout=httpx.Timeout(timeout, connect=connect_timeout),
+                transport=httpx.AsyncHTTPTransport(retries=retries, limits=limits)
+            )
+
+        self.openbeauty_client = pooled_client(read_timeout)
+        self.sephora_client = pooled_client(read_timeout)
+        self.openai_client = pooled_client(openai_read_timeout)
+
+        # Identical concurrent loads on the event loop share one upstream call
+        self.product_flight = AsyncSingleFlight("async_products")
+        self.advice_flight = AsyncSingleFlight("async_advice")
+        self.api.single_flights += [self.product_flight, self.advice_flight]
+
+    async def aclose(self):
+        """Close every pooled upstream connection"""
+        await self.openbeauty_client.aclose()
+        await self.sephora_client.aclose()
+        await self.openai_client.aclose()
+
+    async def _upstream(self, upstream, send):
+        """
+        Await an upstream request through its circuit breaker, counting its
+        status (or 'error') in the shared metrics
+        """
+        breaker = self.api.circuit_breakers[upstream]
+        if not breaker.allow_request():
+            send.close()
+            raise CircuitOpenError(upstream)
+        try:
+            response = await send
+        except httpx.HTTPError:
+            self.api.metrics.record_upstream(upstream, "error")
+            breaker.record_failure()
+            raise
+        except asyncio.CancelledError:
+            # Abandoned at a fetch or advice deadline: the upstream is too slow to use
+            breaker.record_failure()
+            raise
+        self.api.metrics.record_upstream(upstream, response.status_code)
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    async def fetch_beauty_products(self, category=None, count=20):
+        """Async version of PHPerfectAPIIntegration.fetch_beauty_products"""
+        logger.debug("Fetching %s beauty products from Open Beauty Facts API", count)
+
+        cache_key = ("OpenBeauty", category or "Hair", count)
+        if self.api.circuit_breakers["openbeauty"].is_open():
+            return self.api._fallback_products(cache_key)
+
+        try:
+            processed_products = self.api.product_cache.get(
+                cache_key, refresh_loader=lambda: self.api._load_beauty_products(category, count)
+            )
+            if processed_products is None:
+                processed_products = await self.product_flight.do(
+                    cache_key, lambda: self._load_beauty_products(category, count)
+                )
+                self.api.product_cache.put(cache_key, processed_products)
+
+            if not processed_products:
+                logger.info("No products found. Using default product set.")
+                return self.api._generate_default_products(source="OpenBeauty")
+
+            return list(processed_products)
+
+        except CircuitOpenError:
+            return self.api._fallback_products(cache_key)
+        except Exception as e:
+            logger.warning("Error fetching products from Open Beauty Facts API, using fallback products: %s", e)
+            return self.api._fallback_products(cache_key)
+
+    async def _load_beauty_products(self, category=None, count=20):
+        params = {"categories_tags": category or "Hair", "page_size": count}
+        with self.api.metrics.span("fetch", source="openbeauty"):
+            response = await self._upstream(
+                "openbeauty", self.openbeauty_client.get(f"{self.api.openbeauty_api_url}/search", params=params)
+            )
+            response.raise_for_status()
+            result = response.json()
+
+        with self.api.metrics.span("parse", source="openbeauty"):
+            processed_products = self.api._parse_beauty_products(result.get('products', []))
+        logger.debug("Fetched %d products from OpenBeauty", len(processed_products))
+        return processed_products
+
+    async def fetch_sephora_products(self, query=None, count=10):
+        """Async version of PHPerfectAPIIntegration.fetch_sephora_products"""
+        logger.debug("Fetching %s products from Sephora API for query '%s'", count, query)
+
+        if not query:
+            query = "scalp care"
+
+        cache_key = ("Sephora", query, count)
+        if self.api.circuit_breakers["sephora"].is_open():
+            return self.api._fallback_products(cache_key)
+
+        try:
+            processed_products = self.api.product_cache.get(
+                cache_key, refresh_loader=lambda: self.api._load_sephora_products(query, count)
+            )
+            if processed_products is None:
+                processed_products = await self.product_flight.do(
+                    cache_key, lambda: self._load_sephora_products(query, count)
+                )
+                self.api.product_cache.put(cache_key, processed_products)
+
+            if not processed_products:
+                logger.info("No products found from Sephora API. Using default product set.")
+                return self.api._generate_default_products(source="Sephora")
+
+            return list(processed_products)
+
+        except CircuitOpenError:
+            return self.api._fallback_products(cache_key)
+        except Exception as e:
+            logger.warning("Error fetching products from Sephora API, using fallback products: %s", e)
+            return self.api._fallback_products(cache_key)
+
+    async def _load_sephora_products(self, query, count):
+        endpoint = f"{self.api.sephora_api_url}/us/products/v2/search"
+        params = {"q": query, "pageSize": count, "currentPage": 1}
+        logger.debug("Making request to %s with %s", endpoint, params)
+
+        # Respect the RapidAPI rate limit without blocking the event loop
+        with self.api.metrics.span("rate_limit_wait", source="sephora"):
+            wait_seconds = self.api.sephora_rate_limiter.reserve()
+            if wait_seconds > 0:
+                await asyncio.sleep(wait_seconds)
+
+        with self.api.metrics.span("fetch", source="sephora"):
+            response = await self._upstream(
+                "sephora", self.sephora_client.get(endpoint, params=params, headers=self.api._sephora_headers())
+            )
+            response.raise_for_status()
+
+        if not response.content:
+            logger.info("No response data from Sephora API")
+            return []
+
+        try:
+            response_data = response.json()
+        except ValueError as e:
+            logger.warning("Failed to parse Sephora JSON: %s", e)
+            return []
+
+        with self.api.metrics.span("parse", source="sephora"):
+            processed_products = self.api._parse_sephora_products(response_data, query)
+        logger.debug("Fetched %d products from Sephora", len(processed_products))
+        return processed_products
+
+    async def _run_planned_query(self, source, query, count):
+        if source == "OpenBeauty":
+            return await self.fetch_beauty_products(category=query, count=count)
+        return await self.fetch_sephora_products(query=query, count=count)
+
+    async def fetch_planned_products(self, plan, deadline=None):
+        """Await planned source queries concurrently and merge them in plan order"""
+        if deadline is None:
+            deadline = self.api.fetch_deadline
+
+        tasks = [
+            asyncio.create_task(self._run_planned_query(source, query, count))
+            for source, query, count in plan
+        ]
+        await asyncio.wait(tasks, timeout=deadline)
+
+        products = []
+        for (source, query, count), task in zip(plan, tasks):
+            if not task.done():
+                task.cancel()
+                logger.warning("%s query '%s' missed the %ss deadline, skipping", source, query, deadline)
+                continue
+            try:
+                products.extend(task.result())
+            except Exception as e:
+                logger.warning("%s query '%s' failed: %s", source, query, e)
+
+        return products
+
+    async def fetch_products_for(self, scalp_ph, symptoms=None, deadline=None):
+        """Plan and concurrently fetch all source products for a scalp pH and symptom set"""
+        plan = self.api.plan_product_queries(scalp_ph, symptoms)
+        return await self.fetch_planned_products(plan, deadline=deadline)
+
+    async def _request_openai_advice(self, scalp_ph, symptoms, products, trend=None):
+        """Async version of PHPerfectAPIIntegration._request_openai_advice"""
+        try:
+            headers, payload = self.api._build_openai_request(scalp_ph, symptoms, products, trend=trend)
+            with self.api.metrics.span("llm", source="openai"):
+                response = await self._upstream("openai", self.openai_client.post(
+                    f"{self.api.openai_api_url}/chat/completions",
+                    headers=headers,
+                    content=json.dumps(payload)
+                ))
+                response.raise_for_status()
+                result = response.json()
+            self.api.prompt_builder.record_usage(result.get("usage"))
+            return result["choices"][0]["message"]["content"]
+
+        except CircuitOpenError:
+            logger.debug("OpenAI circuit is open, skipping advice")
+            return None
+        except Exception as e:
+            logger.warning("Error getting recommendations from OpenAI: %s", e)
+            return None
+
+    async def get_openai_recommendation(self, scalp_ph, symptoms=None, products=None, debug=False, trend=None):
+        """Async version of PHPerfectAPIIntegration.get_openai_recommendation"""
+        api = self.api
+        if not api.openai_api_key:
+            return {"error": "OpenAI API key not configured"}
+
+        try:
+            if not products:
+                products = api._generate_default_products()
+
+            prompt_products = api._prompt_products(products, scalp_ph)
+            advice_key = api._advice_key(scalp_ph, symptoms, prompt_products, trend)
+            advice_text = api.advice_cache.get(advice_key)
+
+            if advice_text is None:
+                # The shared call keeps running past the deadline and still caches its answer
+                async def request_and_cache():
+                    text = await self._request_openai_advice(scalp_ph, symptoms, prompt_products, trend)
+                    if text is not None:
+                        api.advice_cache.put(advice_key, text)
+                    return text
+
+                try:
+                    advice_text = await asyncio.wait_for(
+                        self.advice_flight.do(advice_key, request_and_cache), timeout=api.advice_deadline
+                    )
+                except asyncio.TimeoutError:
+                    logger.warning("OpenAI advice missed the %ss deadline", api.advice_deadline)
+                if advice_text is None:
+                    advice_text = ADVICE_UNAVAILABLE
+
+            return {
+                "advice_text": advice_text,
+                "recommended_products": api._rank_products(products, scalp_ph, symptoms=symptoms, debug=debug),
+                "scalp_ph": scalp_ph,
+                "symptoms": symptoms
+            }
+
+        except Exception as e:
+            logger.exception("Unexpected error in recommendation process: %s", e)
+            return {
+                "error": f"Failed to get recommendations: {str(e)}",
+                "recommended_products": api._enrich_products(products, scalp_ph)[:10] if products else [],
+            }
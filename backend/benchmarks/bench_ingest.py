@@ -0,0 +1,201 @@
+"""
+Reading ingestion benchmark: bulk-buffered /api/readings vs one insert per reading
+
+    python3 benchmarks/bench_ingest.py --devices 5000 --batch 10 --concurrency 8 --seconds 10
+
+Simulates --devices sensors that each report one reading a second and reach
+the backend through relays posting --batch readings per request. Measures:
+
+  * the server.js pattern, one INSERT and commit per reading, as a baseline
+  * ReadingStore.submit called directly from --concurrency threads
+  * POST /api/readings on a local threaded server from --concurrency clients
+
+and reports sustained readings/s written to SQLite during the run (how many
+1 Hz devices that keeps up with), request latency, 429/503 responses (clients
+back off for Retry-After) and that every accepted reading was written in the
+end. Each target writes to its own database in a temporary directory.
+"""
+import argparse
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from readingStore import INSERT, SCHEMA, ReadingStore, ReadingStoreFull, ReadingStoreUnavailable, parse_readings
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Devices:
+    """Round-robin batches of readings from `count` simulated 1 Hz devices"""
+
+    def __init__(self, count, batch, seed=3):
+        self.count = count
+        self.batch = batch
+        self.rng = random.Random(seed)
+        self.ph = [self.rng.uniform(4.0, 7.0) for _ in range(count)]
+        self.next = 0
+        self.lock = threading.Lock()
+
+    def payload(self):
+        with self.lock:
+            device = self.next
+            self.next = (self.next + 1) % self.count
+            noise = [self.rng.gauss(0, 0.05) for _ in range(self.batch)]
+        now = time.time()
+        return {
+            "device_id": f"esp32-{device:05d}",
+            "user_id": f"user-{device:05d}",
+            "readings": [
+                {"ph": f"{self.ph[device] + noise[i]:.2f}", "timestamp": now - self.batch + i}
+                for i in range(self.batch)
+            ]
+        }
+
+
+def count_rows(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT COUNT(*) FROM ph_readings").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def single_insert_baseline(path, readings, seconds):
+    """One INSERT and commit per reading, like POST /api/ph-data in server.js"""
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    written = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds and written < readings:
+        with connection:
+            connection.execute(INSERT, ("esp32-00000", "user-00000", 5.5, time.time()))
+        written += 1
+    elapsed = time.perf_counter() - start
+    connection.close()
+    return {"readings_per_s": written / elapsed, "written": count_rows(path)}
+
+
+def drive(call, concurrency, seconds):
+    """Call `call()` from `concurrency` threads for `seconds`; returns latencies and per-status counts"""
+    stop_at = time.perf_counter() + seconds
+    latencies, statuses, lock = [], {}, threading.Lock()
+
+    def worker():
+        local_latencies, local_statuses = [], {}
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            status = call()
+            local_latencies.append(time.perf_counter() - start)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            for status, n in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + n
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    latencies.sort()
+    return latencies, statuses
+
+
+def summarize(label, latencies, statuses, seconds, written_during_run, accepted, written):
+    ms = lambda s: f"{s * 1000:.2f}" if s is not None else "-"
+    rate = written_during_run / seconds
+    print(f"{label:<22}{rate:>12.0f}{rate:>10.0f}  p50 {ms(percentile(latencies, 50)):>7} ms  "
+          f"p99 {ms(percentile(latencies, 99)):>7} ms  statuses {dict(sorted(statuses.items()))}  "
+          f"accepted {accepted} written {written}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--devices", type=int, default=5000, help="Simulated devices, one reading per second each")
+    parser.add_argument("--batch", type=int, default=10, help="Readings per POST")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent relays")
+    parser.add_argument("--seconds", type=float, default=10, help="Duration of each measurement")
+    parser.add_argument("--flush-batch", type=int, default=1000, help="READINGS_FLUSH_BATCH")
+    parser.add_argument("--max-pending", type=int, default=100000, help="READINGS_MAX_PENDING")
+    parser.add_argument("--backoff", type=float, default=0.1, help="Longest client wait after a 429/503 (s)")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-ingest-")
+    devices = Devices(args.devices, args.batch)
+    print(f"{'target':<22}{'readings/s':>12}{'devices':>10}")
+
+    baseline = single_insert_baseline(os.path.join(tmp, "single.db"), 10 ** 9, min(args.seconds, 5))
+    print(f"{'single insert':<22}{baseline['readings_per_s']:>12.0f}{baseline['readings_per_s']:>10.0f}")
+
+    # The store on its own, without HTTP parsing
+    store = ReadingStore(os.path.join(tmp, "store.db"), batch_size=args.flush_batch, max_pending=args.max_pending)
+    store.start()
+
+    def submit():
+        try:
+            store.submit(parse_readings(devices.payload()))
+            return 202
+        except (ReadingStoreFull, ReadingStoreUnavailable) as e:
+            time.sleep(min(e.retry_after, args.backoff))
+            return 429 if isinstance(e, ReadingStoreFull) else 503
+
+    latencies, statuses = drive(submit, args.concurrency, args.seconds)
+    written_during_run = store.written
+    store.flush(timeout=60)
+    store.close()
+    summarize("ReadingStore.submit", latencies, statuses, args.seconds,
+              written_during_run, store.accepted, count_rows(store.path))
+
+    # The full HTTP path through server.py
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["CATALOG_SYNC_INTERVAL_SECONDS"] = "0"
+    os.environ.pop("CATALOG_JSONL_PATH", None)
+    os.environ.pop("RECOMMENDATION_TABLE_PATH", None)
+    os.environ["READINGS_DB_PATH"] = os.path.join(tmp, "http.db")
+    os.environ["READINGS_FLUSH_BATCH"] = str(args.flush_batch)
+    os.environ["READINGS_MAX_PENDING"] = str(args.max_pending)
+
+    import logging
+    import requests
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    import server
+
+    http_server = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{http_server.server_port}/api/readings"
+    sessions = threading.local()
+
+    def post():
+        if not hasattr(sessions, "session"):
+            sessions.session = requests.Session()
+        response = sessions.session.post(url, json=devices.payload())
+        if response.status_code in (429, 503):
+            time.sleep(min(float(response.headers.get("Retry-After", 1)), args.backoff))
+        return response.status_code
+
+    latencies, statuses = drive(post, args.concurrency, args.seconds)
+    written_during_run = server.reading_store.written
+    server.reading_store.flush(timeout=60)
+    http_server.shutdown()
+    summarize("POST /api/readings", latencies, statuses, args.seconds,
+              written_during_run, server.reading_store.accepted, count_rows(server.reading_store.path))
+    print(f"\n{args.devices} devices at 1 reading/s need {args.devices} readings/s, "
+          f"{args.devices / args.batch:.0f} requests/s at --batch {args.batch}")
+
+
+if __name__ == "__main__":
+    main()
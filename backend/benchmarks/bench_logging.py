@@ -0,0 +1,188 @@
+"""
+Logging cost benchmark: queued structured logging vs the old print calls
+
+    python3 benchmarks/bench_logging.py --calls 20000 --threads 1 8
+
+Measures what a log call costs the thread that makes it (a request or fetch
+worker) for print() and for logger.info through the NonBlockingQueueHandler,
+writing to a line-buffered file and to a slow sink that stands in for a
+stalled stderr pipe, plus a disabled logger.debug. Wall time includes GIL
+contention with the listener thread; CPU time is the calling thread's own.
+It then counts how many records one /api/recommendations request emits
+against the fake upstreams at INFO and DEBUG, which gives logging's share of
+the request latency budget.
+"""
+import argparse
+import contextlib
+import io
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fakeUpstreamServer import start_fake_upstream_server
+from structuredLogging import (
+    NonBlockingQueueHandler, RequestIdFilter, TEXT_FORMAT, configure_logging, set_request_id, stop_listener
+)
+
+
+class SlowSink(io.TextIOBase):
+    """Text stream whose every write stalls, like a full pipe to a log collector"""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def write(self, text):
+        time.sleep(self.delay)
+        return len(text)
+
+
+def per_call_us(log_call, calls, threads):
+    """Mean (wall, thread CPU) time per call on the calling threads, in microseconds"""
+    per_thread = calls // threads
+    barrier = threading.Barrier(threads + 1)
+    elapsed = []
+
+    def worker():
+        set_request_id()
+        barrier.wait()
+        start, cpu_start = time.perf_counter(), time.thread_time()
+        for i in range(per_thread):
+            log_call(i)
+        elapsed.append((time.perf_counter() - start, time.thread_time() - cpu_start))
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    for w in workers:
+        w.join()
+    scale = 1e6 / (per_thread * threads)
+    return sum(wall for wall, _ in elapsed) * scale, sum(cpu for _, cpu in elapsed) * scale
+
+
+def call_costs(sink, calls, thread_counts, queue_size):
+    """Per-call cost of print vs queued logging, both writing to `sink`"""
+    message = "Fetching %s products from Sephora API for query '%s' %s"
+    products = [{"name": f"Product {i}", "ph_level": 5.5} for i in range(3)]
+    results = {}
+
+    # The old path: print straight to the process output
+    with contextlib.redirect_stdout(sink):
+        for threads in thread_counts:
+            results[("print", threads)] = per_call_us(
+                lambda i: print(message % (i, "scalp care", products)), calls, threads
+            )
+
+    # The new path: record handed to the queue, formatted and written by the listener
+    logger = logging.getLogger("bench_logging")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    log_queue = queue.Queue(maxsize=queue_size)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+    output = logging.StreamHandler(sink)
+    output.setFormatter(logging.Formatter(TEXT_FORMAT))
+    listener = logging.handlers.QueueListener(log_queue, output)
+    listener.start()
+    logger.addHandler(handler)
+    for threads in thread_counts:
+        results[("logger.info (queued)", threads)] = per_call_us(
+            lambda i: logger.info(message, i, "scalp care", products), calls, threads
+        )
+        results[("logger.debug (disabled)", threads)] = per_call_us(
+            lambda i: logger.debug(message, i, "scalp care", products), calls, threads
+        )
+    logger.removeHandler(handler)
+    stop_listener(listener)
+    return results, handler.dropped
+
+
+class CountingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def records_per_request(requests_per_level):
+    """Log records one recommendation request emits at INFO and at DEBUG"""
+    upstream, base_url = start_fake_upstream_server()
+    os.environ.update({
+        "OPENAI_API_KEY": "benchmark",
+        "SEPHORA_API_KEY": "benchmark",
+        "OPENBEAUTY_API_URL": f"{base_url}/api/v0",
+        "SEPHORA_API_URL": base_url,
+        "OPENAI_API_BASE": f"{base_url}/v1",
+        "SEPHORA_RATE_LIMIT_STATE_FILE": "",
+        "SEPHORA_RATE_LIMIT_RPS": "1000000",
+        "SEPHORA_RATE_LIMIT_BURST": "1000000",
+        "PRODUCT_CACHE_TTL_SECONDS": "0",
+        "PRODUCT_CACHE_STALE_SECONDS": "0",
+        "ADVICE_CACHE_TTL_SECONDS": "0",
+        "LOG_LEVEL": "INFO",
+    })
+    # Records still go through the queue and listener; only the output is discarded
+    devnull = open(os.devnull, "w")
+    configure_logging(stream=devnull)
+    import server
+
+    counter = CountingHandler()
+    root = logging.getLogger()
+    root.addHandler(counter)
+    client = server.app.test_client()
+
+    counts = {}
+    for level in ("INFO", "DEBUG"):
+        root.setLevel(level)
+        counter.count = 0
+        for i in range(requests_per_level):
+            client.post('/api/recommendations', json={"scalp_ph": 4.5 + i % 30 / 10, "symptoms": ["dandruff"]})
+        counts[level] = counter.count / requests_per_level
+
+    root.removeHandler(counter)
+    upstream.shutdown()
+    devnull.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20000, help="Log calls per measurement")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--queue-size", type=int, default=10000)
+    parser.add_argument("--sink-delay", type=float, default=0.001, help="Seconds each write to the slow sink takes")
+    parser.add_argument("--requests", type=int, default=20, help="Recommendation requests per level when counting records")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        with open(os.path.join(log_dir, "bench.log"), "w", buffering=1) as log_file:
+            file_costs, file_dropped = call_costs(log_file, args.calls, args.threads, args.queue_size)
+    # Fewer calls against the slow sink; print pays the full delay on every one
+    slow_calls = max(args.threads) * 50
+    slow_costs, slow_dropped = call_costs(SlowSink(args.sink_delay), slow_calls, args.threads, args.queue_size)
+
+    print(f"{'sink':<10}{'log call':<26}{'threads':>8}{'wall us':>11}{'cpu us':>10}")
+    for sink, costs in (("file", file_costs), ("slow", slow_costs)):
+        for (name, threads), (wall, cpu) in costs.items():
+            print(f"{sink:<10}{name:<26}{threads:>8}{wall:>11.2f}{cpu:>10.2f}")
+    print(f"records dropped by a full queue: file {file_dropped}, slow {slow_dropped}")
+
+    counts = records_per_request(args.requests)
+    info_wall, info_cpu = file_costs[("logger.info (queued)", args.threads[0])]
+    print(f"\nrecords per /api/recommendations request: INFO {counts['INFO']:.1f}, DEBUG {counts['DEBUG']:.1f}")
+    for level in ("INFO", "DEBUG"):
+        print(f"logging cost per request at {level}: ~{counts[level] * info_wall:.0f} us wall, "
+              f"~{counts[level] * info_cpu:.0f} us CPU on the request threads")
+
+
+if __name__ == "__main__":
+    main()
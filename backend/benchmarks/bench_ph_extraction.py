@@ -0,0 +1,144 @@
+"""
+pH extraction benchmark: phExtraction vs the original per-call regex methods
+
+    python3 benchmarks/bench_ph_extraction.py --products 100000
+
+Builds a synthetic Open Beauty Facts corpus, checks that phExtraction gives
+the same pH for every product as the original implementation, then reports
+throughput in products/sec for both.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from phExtraction import extract_ph_levels
+
+
+class LegacyPhExtractor:
+    """The original PHPerfectAPIIntegration pH methods, kept verbatim as the baseline"""
+
+    def _extract_ph_level(self, product):
+        if 'ph' in product:
+            try:
+                return float(product['ph'])
+            except (ValueError, TypeError):
+                pass
+        for field in ['product_name', 'generic_name', 'ingredients_text']:
+            if field in product and product[field]:
+                ph_match = self._find_ph_in_text(str(product[field]))
+                if ph_match is not None:
+                    return ph_match
+        return self._estimate_ph_by_category(product)
+
+    def _find_ph_in_text(self, text):
+        import re
+        ph_patterns = [
+            r'pH\s*?(\d+\.?\d*)',
+            r'pH\s+balance.*?(\d+\.?\d*)',
+            r'pH\s+level.*?(\d+\.?\d*)'
+        ]
+        for pattern in ph_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                try:
+                    ph_value = float(match.group(1))
+                    if 3 <= ph_value <= 8:
+                        return ph_value
+                except (ValueError, IndexError):
+                    continue
+        return None
+
+    def _estimate_ph_by_category(self, product):
+        category_ph = {
+            'shampoo': 5.5,
+            'conditioner': 4.5,
+            'hair mask': 4.8,
+            'treatment': 5.0,
+            'oil': 5.0,
+            'serum': 5.0,
+            'spray': 5.5
+        }
+        categories = []
+        if 'categories' in product and product['categories']:
+            categories.append(product['categories'].lower())
+        if 'categories_tags' in product:
+            for tag in product['categories_tags']:
+                if isinstance(tag, str):
+                    categories.append(tag.lower().replace('en:', ''))
+        for category in categories:
+            for key, ph in category_ph.items():
+                if key in category:
+                    return ph
+        return 5.5
+
+
+NAMES = [
+    "Gentle Shampoo", "pH 5.5 Balanced Shampoo", "Hydrating Conditioner pH4.5", "Scalp Serum",
+    "PH balanced formula (5.2)", "Clarifying wash pH 9 then pH level 5.0", "Hair Mask", "Argan Oil"
+]
+GENERIC = [
+    "", "pH balanced cleanser with a level of 5.8", "Shampooing doux", "ph level: 4.9 for dry hair",
+    "Soin pH 12, pH balance 6.1", "Leave-in spray"
+]
+INGREDIENTS = [
+    "Aqua, Sodium Laureth Sulfate, Cocamidopropyl Betaine, Glycerin, Phenoxyethanol, Sodium Phosphate",
+    "Water, Cetearyl Alcohol, Behentrimonium Chloride, Citric Acid (to adjust pH), Parfum",
+    "Aqua, Sodium Lauroyl Methyl Isethionate, Ethylhexylglycerin, Disodium Phosphate, pH adjuster 4.7",
+    "Water\npH balance\n5.5, Glycerin",
+]
+CATEGORY_TAGS = [
+    ["en:shampoos"], ["en:hair-conditioners"], ["en:hair-masks"], ["en:hair-oils"],
+    ["en:beauty", "en:hair-treatments"], ["en:sprays"], ["en:hair"], []
+]
+
+
+def synthetic_corpus(n, seed=11):
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(n):
+        product = {
+            'product_name': rng.choice(NAMES),
+            'generic_name': rng.choice(GENERIC),
+            'ingredients_text': rng.choice(INGREDIENTS) * rng.randint(1, 4),
+            'categories_tags': rng.choice(CATEGORY_TAGS),
+        }
+        if i % 10 == 0:
+            product['categories'] = rng.choice(["Shampoos", "Hair care, Conditioners", "Serums"])
+        if i % 50 == 0:
+            product['ph'] = rng.choice(["5.4", "n/a", 6])
+        corpus.append(product)
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.products)
+    legacy = LegacyPhExtractor()
+
+    start = time.perf_counter()
+    expected = [legacy._extract_ph_level(p) for p in corpus]
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = extract_ph_levels(corpus)
+    new_seconds = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(actual, expected) if a != b)
+    if mismatches:
+        raise SystemExit(f"{mismatches} products extracted differently from the original methods")
+
+    print(f"corpus:      {args.products} products, outputs identical")
+    print(f"original:    {args.products / legacy_seconds:>12,.0f} products/sec")
+    print(f"phExtraction:{args.products / new_seconds:>12,.0f} products/sec")
+    print(f"speedup:     {legacy_seconds / new_seconds:>12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
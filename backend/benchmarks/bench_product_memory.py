@@ -0,0 +1,111 @@
+"""
+Product memory benchmark: slotted Product records vs per-product dicts
+
+    python3 benchmarks/bench_product_memory.py --products 100000
+
+Builds a JSONL crawl of --products products by parsing the recorded Open
+Beauty Facts and Sephora fixtures and varying ids, names and pH, then loads
+it the way ProductCatalog.load_jsonl does, once keeping the decoded dicts and
+once converting them to Product records. Reports tracemalloc bytes per
+product for the records alone and for a whole catalog snapshot (records plus
+pH, category, brand and source indexes), and the per-call cost of the dict
+interface and of to_dict() at the API boundary.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from fakeUpstreamServer import load_fixtures
+from productCatalog import ProductCatalog, _CatalogSnapshot
+from productRecommendations import PHPerfectAPIIntegration
+from productRecord import Product
+
+
+def crawl_lines(api, n, seed=11):
+    """JSONL lines shaped like a catalogIngest.py crawl, built from the parsed fixtures"""
+    fixtures = load_fixtures()
+    parsed = api._parse_beauty_products(fixtures["openbeauty"].get("products", []))
+    parsed += api._parse_sephora_products(fixtures["sephora"], "scalp care")
+    templates = [p.to_dict() for p in parsed]
+
+    rng = random.Random(seed)
+    lines = []
+    for i in range(n):
+        product = dict(templates[i % len(templates)])
+        product['id'] = f"{product['id']}-{i}"
+        product['name'] = f"{product['name']} {i}"
+        product['ph_level'] = round(rng.uniform(3.0, 8.0), 1)
+        lines.append(json.dumps(product))
+    return lines
+
+
+def retained_bytes(build):
+    """Bytes still allocated after `build()` returns, and the value it built"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, value
+
+
+def per_call_ns(fn, items, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - start)
+    return best / len(items) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    args = parser.parse_args()
+
+    api = PHPerfectAPIIntegration()
+    lines = crawl_lines(api, args.products)
+    n = len(lines)
+
+    dict_bytes, dicts = retained_bytes(lambda: [json.loads(line) for line in lines])
+    record_bytes, records = retained_bytes(lambda: [Product.from_dict(json.loads(line)) for line in lines])
+    assert all(r.to_dict() == d for r, d in zip(records, dicts))
+
+    key = ProductCatalog.product_key
+    dict_catalog_bytes, _ = retained_bytes(lambda: _CatalogSnapshot({key(p): p for p in dicts}))
+    record_catalog_bytes, _ = retained_bytes(lambda: _CatalogSnapshot({key(p): p for p in records}))
+
+    print(f"{n} products")
+    print(f"{'':<28}{'dict':>12}{'Product':>12}{'saved':>9}")
+    for label, old, new in (
+        ("products, bytes each", dict_bytes, record_bytes),
+        ("catalog snapshot, bytes each", dict_bytes + dict_catalog_bytes, record_bytes + record_catalog_bytes),
+    ):
+        print(f"{label:<28}{old / n:>12.0f}{new / n:>12.0f}{1 - new / old:>9.0%}")
+
+    sample_dicts, sample_records = dicts[:20000], records[:20000]
+    print(f"\n{'per call, ns':<28}{'dict':>12}{'Product':>12}")
+    for label, fn_dict, fn_record in (
+        ("p['ph_level']", lambda p: p['ph_level'], lambda p: p['ph_level']),
+        ("p.get('rating')", lambda p: p.get('rating'), lambda p: p.get('rating')),
+        ("'ph_difference' in p", lambda p: 'ph_difference' in p, lambda p: 'ph_difference' in p),
+        ("copy for enrichment", dict, Product.to_dict),
+        ("build from decoded JSON", dict, Product.from_dict),
+    ):
+        source = sample_dicts if fn_record == Product.from_dict else sample_records
+        print(f"{label:<28}{per_call_ns(fn_dict, sample_dicts):>12.0f}{per_call_ns(fn_record, source):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Advice prompt benchmark: PromptBuilder vs the previous f-string prompt
+
+    python3 benchmarks/bench_prompt.py --budgets 400,350,300
+
+Builds the advice prompt for the recorded Open Beauty Facts and Sephora
+fixture products (the three prompt products _prompt_products picks) across
+a range of scalp pH values, with and without symptoms and a reading-history
+sentence, once with the indentation-padded f-string the backend used before
+PromptBuilder and once per --budgets input token budget. Reports estimated
+input tokens (mean and max), the reply cap each sends as max_tokens, how
+many prompts had to be compacted, and build time per prompt.
+
+The recorded OpenAI fixture reports its usage; its prompt_tokens is printed
+next to the estimate for the same prompt as a check on the estimator.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from fakeUpstreamServer import load_fixtures
+from productRecommendations import PHPerfectAPIIntegration
+from promptBuilder import SYSTEM_PROMPT, PromptBuilder, estimate_tokens
+
+HISTORY = ("Over the last 30 days their scalp pH averaged 5.8 (median 5.8, range 5.2-6.4) "
+           "and has been rising (about +0.4 pH over 29 days).")
+SYMPTOMS = ["dandruff", "itchiness", "oily roots"]
+
+
+def legacy_prompt(condition, scalp_ph, symptoms, products, history=None):
+    """The advice prompt as _create_recommendation_prompt built it before PromptBuilder"""
+    prompt = f"""
+        The user has a scalp pH of {scalp_ph}, which indicates a {condition}.
+        """
+    if symptoms and len(symptoms) > 0:
+        prompt += f"\nThey report the following symptoms: {', '.join(symptoms)}."
+    if history:
+        prompt += f"\n{history}"
+    prompt += "\n\nBased on their scalp pH, these are some recommended products we found from our database:"
+    for i, product in enumerate(products[:3], 1):
+        source = product.get('source', 'Unknown')
+        rating_info = f" | Rating: {product['rating']} stars" if product.get('rating') else ""
+        price_info = f" | Price: {product['price']}" if product.get('price') and product['price'] != 'Price not available' else ""
+        prompt += f"""
+            {i}. {product['name']} by {product['brand']} (pH: {product['ph_level']}) - Source: {source}{rating_info}{price_info}
+               Description: {product['category']} with ingredients: {product['ingredients'][:100]}...
+            """
+    prompt += """
+        Please provide:
+
+        1. A brief explanation of what this scalp pH means for their hair health.
+
+        2. A concise overview of why the products from our database are suitable for this pH level and symptoms.
+
+        3. General recommendations for hair care routines based on this scalp pH.
+
+        4. Tips for effectively using hair products with this scalp pH.
+
+        Format your response to be conversational and informative. Do NOT list additional specific product recommendations - we will present our own product list to the user separately.
+        """
+    return prompt
+
+
+def cases(api):
+    """(condition, scalp_ph, symptoms, prompt products, history) over a spread of requests"""
+    fixtures = load_fixtures()
+    products = api._parse_beauty_products(fixtures["openbeauty"].get("products", []))
+    products += api._parse_sephora_products(fixtures["sephora"], "scalp care")
+    result = []
+    for tenth in range(35, 80, 5):
+        scalp_ph = tenth / 10
+        prompt_products = api._prompt_products(products, scalp_ph)
+        for symptoms in ([], SYMPTOMS):
+            for history in (None, HISTORY):
+                result.append((api._describe_scalp_condition(scalp_ph), scalp_ph, symptoms, prompt_products, history))
+    return result
+
+
+def measure(build, requests, repeat=200):
+    """Estimated tokens (system + user) per request and best build time per prompt in microseconds"""
+    tokens = [estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(build(*request)) + 11 for request in requests]
+    best = float("inf")
+    for _ in range(repeat // 20):
+        start = time.perf_counter()
+        for _ in range(20):
+            for request in requests:
+                build(*request)
+        best = min(best, (time.perf_counter() - start) / (20 * len(requests)))
+    return tokens, best * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budgets", default="400,350,300", help="Comma-separated PROMPT_INPUT_TOKEN_BUDGET values")
+    args = parser.parse_args()
+
+    api = PHPerfectAPIIntegration()
+    requests = cases(api)
+    print(f"{len(requests)} prompts\n")
+    print(f"{'builder':<24}{'mean tokens':>12}{'max tokens':>12}{'max_tokens':>12}{'compacted':>11}{'us/prompt':>11}")
+
+    tokens, micros = measure(legacy_prompt, requests)
+    print(f"{'f-string (before)':<24}{statistics.fmean(tokens):>12.0f}{max(tokens):>12}{1000:>12}{'-':>11}{micros:>11.1f}")
+
+    for budget in (int(b) for b in args.budgets.split(",")):
+        builder = PromptBuilder(input_token_budget=budget)
+
+        def build(condition, scalp_ph, symptoms, products, history):
+            return builder.user_prompt(scalp_ph, condition, symptoms, products, history=history)
+
+        tokens, micros = measure(build, requests)
+        compacted = sum(
+            estimate_tokens(builder.user_prompt(scalp_ph, condition, symptoms, products, history=history))
+            < estimate_tokens(PromptBuilder(input_token_budget=10 ** 6).user_prompt(
+                scalp_ph, condition, symptoms, products, history=history))
+            for condition, scalp_ph, symptoms, products, history in requests
+        )
+        print(f"{f'PromptBuilder {budget}':<24}{statistics.fmean(tokens):>12.0f}{max(tokens):>12}"
+              f"{builder.max_tokens['advice']:>12}{compacted:>11}{micros:>11.1f}")
+
+    usage = load_fixtures()["openai"].get("usage") or {}
+    fixture_products = api._prompt_products(api._generate_default_products(), 5.5)
+    estimate = estimate_tokens(SYSTEM_PROMPT) + 11 + estimate_tokens(
+        legacy_prompt(api._describe_scalp_condition(5.5), 5.5, [], fixture_products)
+    )
+    print(f"\nrecorded OpenAI fixture: prompt_tokens {usage.get('prompt_tokens')}, "
+          f"estimate for the prompt it was recorded with {estimate}")
+
+
+if __name__ == "__main__":
+    main()
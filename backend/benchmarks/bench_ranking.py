@@ -0,0 +1,83 @@
+"""
+Ranking benchmark: columnar top-k engine vs enriching and sorting every candidate
+
+    python3 benchmarks/bench_ranking.py --sizes 15 100 1000 10000 100000
+
+For every size the engine's output is checked to be identical to the
+original path before it is timed.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from productRecommendations import PHPerfectAPIIntegration
+from rankingEngine import RankingEngine
+
+CATEGORIES = ["Shampoo", "Conditioner", "Treatment", "Mask", "Oil", "Serum", "Scalp Care", "unknown"]
+
+
+def synthetic_products(n, seed=7):
+    """Products shaped like fetch_sephora_products output, with plenty of pH ties"""
+    rng = random.Random(seed)
+    products = []
+    for i in range(n):
+        products.append({
+            'id': f"P{i}",
+            'name': rng.choice([f"Product {i}", f"Product {i}", f"Product {i}", "Unknown Product", ""]),
+            'brand': f"Brand {i % 97}",
+            'category': rng.choice(CATEGORIES),
+            'ingredients': "Water, Glycerin, Panthenol, Niacinamide, Aloe Vera " * 3,
+            'ph_level': round(rng.uniform(3.0, 8.0), 1),
+            'image_url': '',
+            'rating': rng.choice([None, round(rng.uniform(3, 5), 1)]),
+            'price': rng.choice(["Price not available", f"${rng.randint(8, 60)}.00"]),
+            'source': rng.choice(["Sephora", "OpenBeauty"])
+        })
+    return products
+
+
+def original_top_k(api, products, scalp_ph, k):
+    """The pre-engine path: enrich every product, sort all of them, keep k"""
+    enriched = api._enrich_products(products, scalp_ph)
+    return sorted(enriched, key=lambda x: x['ph_difference'])[:k]
+
+
+def best_time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[15, 100, 1000, 10000, 100000])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    api = PHPerfectAPIIntegration()
+    ranker = RankingEngine(api)  # pH-only, comparable with the original path
+    print(f"{'candidates':>10} {'original ms':>12} {'engine ms':>10} {'speedup':>8}")
+    for n in args.sizes:
+        products = synthetic_products(n)
+        for scalp_ph in (3.2, 5.5, 7.9):
+            expected = original_top_k(api, products, scalp_ph, args.k)
+            actual = ranker.top_k(products, scalp_ph, k=args.k)
+            if actual != expected:
+                raise SystemExit(f"Ranking mismatch for n={n}, scalp_ph={scalp_ph}")
+
+        original = best_time(lambda: original_top_k(api, products, 5.5, args.k), args.repeat)
+        engine = best_time(lambda: ranker.top_k(products, 5.5, k=args.k), args.repeat)
+        print(f"{n:>10} {original * 1000:>12.3f} {engine * 1000:>10.3f} {original / engine:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+End-to-end recommendation benchmark against recorded upstream fixtures
+
+    python3 benchmarks/bench_recommendations.py --concurrency 1 4 16 --requests 200 \
+        --latency 0.05 --openai-latency 0.3 --error-rate 0.01 --output bench_results.json
+
+Starts fakeUpstreamServer on a free port and points the backend at it, so no
+network access is needed. It then drives POST /api/recommendations (the Flask
+app on a local threaded server) and the PHPerfectAPIIntegration methods at
+each concurrency level, and writes p50/p95/p99 latency and throughput per
+target and level to a JSON results file.
+
+The product and advice caches are disabled unless --warm-cache is given, so
+every call reaches the (fake) upstreams. The Sephora rate limit is lifted
+unless --sephora-rps is given.
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import math
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fakeUpstreamServer import start_fake_upstream_server
+
+TARGETS = ("http", "fetch_products_for", "get_openai_recommendation", "get_batch_recommendations")
+SYMPTOMS = ["dandruff", "dryness", "itchiness"]
+
+
+def workload(n, seed=5):
+    """Deterministic (scalp_ph, symptoms) readings spread over the plausible range"""
+    rng = random.Random(seed)
+    readings = []
+    for _ in range(n):
+        symptoms = [s for s in SYMPTOMS if rng.random() < 0.3]
+        readings.append((round(rng.uniform(3.5, 7.5), 1), symptoms))
+    return readings
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def configure_backend(base_url, args):
+    """Point the backend at the fake upstreams before it is imported"""
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    os.environ["SEPHORA_API_KEY"] = "benchmark"
+    os.environ["OPENBEAUTY_API_URL"] = f"{base_url}/api/v0"
+    os.environ["SEPHORA_API_URL"] = base_url
+    os.environ["OPENAI_API_BASE"] = f"{base_url}/v1"
+    os.environ["SEPHORA_RATE_LIMIT_STATE_FILE"] = ""
+    os.environ["SEPHORA_RATE_LIMIT_RPS"] = str(args.sephora_rps or 1e9)
+    os.environ["SEPHORA_RATE_LIMIT_BURST"] = str(args.sephora_rps or 1e9)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["CATALOG_SYNC_INTERVAL_SECONDS"] = "0"
+    os.environ.pop("CATALOG_JSONL_PATH", None)
+    if not args.warm_cache:
+        os.environ["PRODUCT_CACHE_TTL_SECONDS"] = "0"
+        os.environ["PRODUCT_CACHE_STALE_SECONDS"] = "0"
+        os.environ["ADVICE_CACHE_TTL_SECONDS"] = "0"
+        os.environ["ADVICE_CACHE_BACKEND"] = "memory"
+
+
+def make_calls(server_module, http_url, batch_size):
+    """One callable per target; each takes a (scalp_ph, symptoms) reading and returns True on success"""
+    import requests
+
+    api = server_module.api
+    sessions = threading.local()
+    sample_products = api.fetch_products_for(5.5, [])
+
+    def http_call(reading):
+        if not hasattr(sessions, "session"):
+            sessions.session = requests.Session()
+        scalp_ph, symptoms = reading
+        response = sessions.session.post(http_url, json={"scalp_ph": scalp_ph, "symptoms": symptoms})
+        return response.status_code == 200 and "error" not in response.json()
+
+    def fetch_call(reading):
+        return bool(api.fetch_products_for(*reading))
+
+    def recommendation_call(reading):
+        scalp_ph, symptoms = reading
+        return "error" not in api.get_openai_recommendation(scalp_ph, symptoms, sample_products)
+
+    def batch_call(reading):
+        scalp_ph, symptoms = reading
+        items = [{"scalp_ph": round(scalp_ph + i / 10, 1), "symptoms": symptoms} for i in range(batch_size)]
+        return all("error" not in result for result in api.get_batch_recommendations(items))
+
+    return {
+        "http": http_call,
+        "fetch_products_for": fetch_call,
+        "get_openai_recommendation": recommendation_call,
+        "get_batch_recommendations": batch_call,
+    }
+
+
+def run_level(call, readings, concurrency, warmup):
+    """Issue the readings through `call` with `concurrency` workers; the first `warmup` are not measured"""
+    latencies = []
+    errors = 0
+
+    def timed(reading):
+        start = time.perf_counter()
+        try:
+            ok = call(reading)
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, readings[:warmup]))
+        readings = readings[warmup:]
+
+        wall_start = time.perf_counter()
+        for seconds, ok in executor.map(timed, readings):
+            latencies.append(seconds)
+            errors += not ok
+        wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    ms = lambda seconds: round(seconds * 1000, 2) if seconds is not None else None
+    return {
+        "requests": len(readings),
+        "errors": errors,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "max_ms": ms(latencies[-1]) if latencies else None,
+        "throughput_rps": round(len(readings) / wall, 2) if wall else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=200, help="Measured calls per target and level")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured calls before each level")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    parser.add_argument("--batch-size", type=int, default=10, help="Items per get_batch_recommendations call")
+    parser.add_argument("--latency", type=float, default=0.05, help="Added Open Beauty Facts/Sephora latency (s)")
+    parser.add_argument("--openai-latency", type=float, default=0.3, help="Added OpenAI latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Random +/- fraction applied to the latencies")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of upstream requests answered with a 503")
+    parser.add_argument("--sephora-rps", type=float, default=None, help="Keep a Sephora rate limit (requests/s)")
+    parser.add_argument("--warm-cache", action="store_true", help="Leave the product and advice caches enabled")
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    latency = {"openbeauty": args.latency, "sephora": args.latency, "openai": args.openai_latency}
+    upstream, base_url = start_fake_upstream_server(
+        latency=latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed
+    )
+    configure_backend(base_url, args)
+
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    # Keep anything the backend prints out of the results
+    backend_output = io.StringIO()
+    with contextlib.redirect_stdout(backend_output):
+        import server
+        http_server = make_server("127.0.0.1", 0, server.app, threaded=True)
+        threading.Thread(target=http_server.serve_forever, daemon=True).start()
+        calls = make_calls(server, f"http://127.0.0.1:{http_server.server_port}/api/recommendations", args.batch_size)
+
+    readings = workload(args.requests + args.warmup, seed=args.seed)
+    results = []
+    for target in args.targets:
+        for concurrency in args.concurrency:
+            with contextlib.redirect_stdout(backend_output):
+                summary = run_level(calls[target], readings, concurrency, args.warmup)
+            summary = {"target": target, "concurrency": concurrency, **summary}
+            results.append(summary)
+            print(f"{target:<27} c={concurrency:<4} p50 {summary['p50_ms']:>9} ms  p95 {summary['p95_ms']:>9} ms  "
+                  f"p99 {summary['p99_ms']:>9} ms  {summary['throughput_rps']:>8} req/s  errors {summary['errors']}")
+
+    http_server.shutdown()
+    upstream.shutdown()
+
+    report = {
+        "config": {
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "batch_size": args.batch_size,
+            "latency": latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "sephora_rps": args.sephora_rps,
+            "warm_cache": args.warm_cache,
+            "seed": args.seed,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "started_at": started_at,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Scoring benchmark: multi-factor ScoringModel vs the original pH-difference sort
+
+    python3 benchmarks/bench_scoring.py --sizes 1000 10000 --config scoringConfig.multifactor.json
+
+Fails (exit 1) if multi-factor ranking at the largest size is slower than
+enriching and sorting every candidate the way the original path did, or if
+a rating sent as a numeric string (as Sephora does) scores differently from
+the same rating sent as a number.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from bench_ranking import best_time, original_top_k, synthetic_products
+from productRecommendations import PHPerfectAPIIntegration
+from rankingEngine import CandidateBatch, RankingEngine
+from scoringModel import MULTIFACTOR_CONFIG_PATH, ScoringModel
+
+
+def string_ratings_match(model):
+    """Sephora's "4.9" must score like 4.9, not like an unrated product"""
+    products = [
+        {'id': 'sephora', 'name': 'Scalp Serum', 'ph_level': 5.5, 'rating': "4.9", 'price': "$30.00"},
+        {'id': 'numeric', 'name': 'Scalp Serum', 'ph_level': 5.5, 'rating': 4.9, 'price': 30.0},
+    ]
+    rating = model._factor("rating", CandidateBatch(products, 5.5), [])
+    print(f"rating penalty, string vs number: {rating[0]:.3f} vs {rating[1]:.3f}")
+    return rating[0] == rating[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--config", default=MULTIFACTOR_CONFIG_PATH,
+                        help="Scoring config JSON (defaults to scoringConfig.multifactor.json)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    api = PHPerfectAPIIntegration()
+    model = ScoringModel.from_config(args.config)
+    if model is None:
+        raise SystemExit("No scoring config found")
+    ranker = RankingEngine(api, scoring_model=model)
+    symptoms = ["dandruff", "dryness"]
+
+    print(f"weights: {model.weights}")
+    print(f"{'candidates':>10} {'original ms':>12} {'scored ms':>10} {'debug ms':>9}")
+    regression = False
+    for n in args.sizes:
+        products = synthetic_products(n)
+        original = best_time(lambda: original_top_k(api, products, 5.5, args.k), args.repeat)
+        scored = best_time(lambda: ranker.top_k(products, 5.5, k=args.k, symptoms=symptoms), args.repeat)
+        debug = best_time(lambda: ranker.top_k(products, 5.5, k=args.k, symptoms=symptoms, debug=True), args.repeat)
+        print(f"{n:>10} {original * 1000:>12.3f} {scored * 1000:>10.3f} {debug * 1000:>9.3f}")
+        regression = scored > original
+
+    if regression:
+        print("Latency regression: multi-factor scoring is slower than the original sort")
+        return 1
+    if not string_ratings_match(model):
+        print("String ratings are scored differently from numeric ones")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
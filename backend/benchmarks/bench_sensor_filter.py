@@ -0,0 +1,110 @@
+"""
+Sensor filter benchmark: raw firmware readings vs SensorFilter output
+
+    python3 benchmarks/bench_sensor_filter.py --devices 200 --readings 600 --noise-lsb 25 --spike-rate 0.01
+
+Simulates --devices ESP32 sensors sending one reading a second the way the
+firmware computes it: a single 12-bit analogRead with --noise-lsb of
+Gaussian ADC noise and a --spike-rate share of garbage samples, converted
+with ph = -5.1552 * volt + calibration_value and sent with two decimals.
+Each device sits on a scalp whose true pH drifts slowly and steps once.
+
+Reports, for the raw values and for the filtered ones:
+
+  * error against the true pH (RMS, and worst 1% of readings)
+  * how often a device's advice cache key (pH quantized to --ph-step, as
+    AdviceCache does) matches its previous reading's key, i.e. how often
+    a repeated request for the same scalp can be served from cache, and
+    distinct keys per device
+  * SensorFilter.update cost per reading
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from adviceCache import AdviceCache, MemoryAdviceBackend
+from sensorFilter import SensorFilter
+
+CALIBRATION_VALUE = 18.96
+
+
+def firmware_reading(true_ph, rng, noise_lsb, spike_rate):
+    """What the firmware sends for a scalp at `true_ph`"""
+    volt = (CALIBRATION_VALUE - true_ph) / 5.1552
+    if rng.random() < spike_rate:
+        sensor_value = rng.randrange(4096)
+    else:
+        sensor_value = round((volt + 0.4) * 4095 / 3.3 + rng.gauss(0, noise_lsb))
+        sensor_value = min(4095, max(0, sensor_value))
+    ph = -5.1552 * ((sensor_value * 3.3 / 4095) - 0.4) + CALIBRATION_VALUE
+    return float(f"{ph:.2f}")
+
+
+def simulate(devices, readings, noise_lsb, spike_rate, seed=7):
+    """(device_id, timestamp, true_ph, raw_ph) per reading, devices interleaved like a live stream"""
+    rng = random.Random(seed)
+    traces = []
+    for device in range(devices):
+        base = rng.uniform(4.0, 7.0)
+        drift = rng.gauss(0, 0.2) / readings
+        step_at, step = rng.randrange(readings), rng.choice((-0.5, 0.5))
+        traces.append((f"esp32-{device:04d}", base, drift, step_at, step))
+    stream = []
+    for i in range(readings):
+        for device_id, base, drift, step_at, step in traces:
+            true_ph = base + drift * i + (step if i >= step_at else 0.0)
+            stream.append((device_id, 1735689600 + i, true_ph, firmware_reading(true_ph, rng, noise_lsb, spike_rate)))
+    return stream
+
+
+def report(label, stream, values, cache):
+    errors = sorted(abs(value - true_ph) for (_, _, true_ph, _), value in zip(stream, values))
+    rms = math.sqrt(sum(e * e for e in errors) / len(errors))
+    worst = errors[int(len(errors) * 0.99)]
+
+    previous, repeats, keys = {}, 0, set()
+    for (device_id, _, _, _), value in zip(stream, values):
+        key = cache.quantize_ph(value)
+        repeats += previous.get(device_id) == key
+        previous[device_id] = key
+        keys.add((device_id, key))
+    print(f"{label:<10}{rms:>10.3f}{worst:>10.3f}{repeats / len(values):>14.1%}{len(keys) / len(previous):>16.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--readings", type=int, default=600, help="Readings per device, one a second")
+    parser.add_argument("--noise-lsb", type=float, default=25, help="ADC noise, standard deviation in counts")
+    parser.add_argument("--spike-rate", type=float, default=0.01, help="Share of garbage ADC samples")
+    parser.add_argument("--ph-step", type=float, default=0.1, help="ADVICE_CACHE_PH_STEP")
+    args = parser.parse_args()
+
+    stream = simulate(args.devices, args.readings, args.noise_lsb, args.spike_rate)
+    cache = AdviceCache(MemoryAdviceBackend(), ph_step=args.ph_step)
+    sensor_filter = SensorFilter(max_devices=args.devices)
+
+    filtered, outliers = [], 0
+    start = time.perf_counter()
+    for device_id, timestamp, _, raw_ph in stream:
+        stabilized, outlier = sensor_filter.update(device_id, raw_ph, timestamp)
+        filtered.append(stabilized)
+        outliers += outlier
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(stream)} readings from {args.devices} devices, {args.noise_lsb:g} LSB noise "
+          f"(~{args.noise_lsb * 3.3 / 4095 * 5.1552:.2f} pH), {args.spike_rate:.1%} spikes")
+    print(f"{'':<10}{'rms err':>10}{'p99 err':>10}{'same key':>14}{'keys/device':>16}")
+    report("raw", stream, [raw_ph for _, _, _, raw_ph in stream], cache)
+    report("filtered", stream, filtered, cache)
+    print(f"\n{outliers} readings rejected as outliers, "
+          f"SensorFilter.update {elapsed / len(stream) * 1e6:.1f} us per reading")
+
+
+if __name__ == "__main__":
+    main()
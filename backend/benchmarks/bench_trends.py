@@ -0,0 +1,117 @@
+"""
+Trend query benchmark: phTrends rollups vs scanning raw readings
+
+    python3 benchmarks/bench_trends.py --users 20 --sizes 10000,100000,1000000 --days 30
+
+Grows a readings database in steps up to each of --sizes readings, spread
+over --users users and a year of history, writing through ReadingStore with
+the TrendStore flush hook attached the way server.py runs it. At every size
+it times, for one user and a --days window:
+
+  * TrendStore.summary (rollup rows only)
+  * the same statistics computed from ph_readings with SQL aggregates plus a
+    sorted scan for the median (what a query without rollups has to do)
+
+and reports median latency of each and the ingest rate with the hook
+attached. The database lives in a temporary directory.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from phTrends import _DAY, _EPOCH, TrendStore, bucket_start
+from readingStore import ReadingStore
+
+
+def raw_summary(connection, user_id, start, end):
+    """The summary statistics straight from ph_readings"""
+    n, mean, ph_min, ph_max, t_mean, tt_mean, tp_mean = connection.execute(
+        "SELECT COUNT(*), AVG(ph_value), MIN(ph_value), MAX(ph_value), AVG(t), AVG(t * t), AVG(t * ph_value) "
+        "FROM (SELECT ph_value, (timestamp - ?) / ? AS t FROM ph_readings "
+        "WHERE user_id = ? AND timestamp BETWEEN ? AND ?)",
+        (_EPOCH, _DAY, user_id, start, end)
+    ).fetchone()
+    median = connection.execute(
+        "SELECT ph_value FROM ph_readings WHERE user_id = ? AND timestamp BETWEEN ? AND ? "
+        "ORDER BY ph_value LIMIT 1 OFFSET ?",
+        (user_id, start, end, (n - 1) // 2)
+    ).fetchone()[0]
+    variance = tt_mean - t_mean * t_mean
+    return {
+        "readings": n, "mean": mean, "median": median, "min": ph_min, "max": ph_max,
+        "slope_per_day": (tp_mean - t_mean * mean) / variance if variance > 0 else None
+    }
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="Users the readings are spread over")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated total readings to measure at")
+    parser.add_argument("--days", type=float, default=30, help="Trend window")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed queries per size")
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-trends-"), "readings.db")
+    store = ReadingStore(path, batch_size=5000, flush_interval=0.05, max_pending=10 ** 6)
+    trends = TrendStore(store)
+    store.start()
+
+    rng = random.Random(5)
+    now = time.time()
+    base_ph = [rng.uniform(4.0, 7.0) for _ in range(args.users)]
+    raw = sqlite3.connect(path)
+    user_id = "user-0000"
+    start = bucket_start(trends.resolution_for(args.days), now - args.days * _DAY)
+
+    print(f"{'readings':>10}{'per user':>10}{'in window':>11}{'summary ms':>12}{'raw scan ms':>13}"
+          f"{'speedup':>9}{'ingest/s':>10}")
+    written = 0
+    for size in sizes:
+        previous = written
+        ingest_start = time.perf_counter()
+        while written < size:
+            rows = []
+            for _ in range(min(5000, size - written)):
+                user = rng.randrange(args.users)
+                age = rng.uniform(0, 365 * _DAY)
+                ph = min(14.0, max(0.0, base_ph[user] - age / _DAY * 0.002 + rng.gauss(0, 0.15)))
+                rows.append((f"esp32-{user:04d}", f"user-{user:04d}", round(ph, 2), now - age))
+            store.submit(rows)
+            written += len(rows)
+        store.flush()
+        ingest_rate = (written - previous) / (time.perf_counter() - ingest_start)
+
+        summary = trends.summary(user_id, days=args.days, now=now)
+        expected = raw_summary(raw, user_id, start, now)
+        assert summary["readings"] == expected["readings"]
+        assert abs(summary["mean"] - expected["mean"]) < 1e-3
+        assert abs(summary["median"] - expected["median"]) <= 0.025 + 1e-9
+
+        rollup_ms = median_ms(lambda: trends.summary(user_id, days=args.days, now=now), args.repeat)
+        raw_ms = median_ms(lambda: raw_summary(raw, user_id, start, now), args.repeat)
+        print(f"{size:>10}{size // args.users:>10}{summary['readings']:>11}{rollup_ms:>12.3f}{raw_ms:>13.3f}"
+              f"{raw_ms / rollup_ms:>8.0f}x{ingest_rate:>10.0f}")
+
+    store.close()
+    raw.close()
+
+
+if __name__ == "__main__":
+    main()
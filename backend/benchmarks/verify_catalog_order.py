@@ -0,0 +1,87 @@
+"""
+Check that catalog-served recommendations do not depend on hash randomization
+
+    python3 benchmarks/verify_catalog_order.py --products 2000 --seeds 1 2
+
+Runs catalog_products_for and the ranking for a spread of pH values and
+symptom sets in one child process per PYTHONHASHSEED, over the same
+synthetic catalog, and fails (exit 1) unless every child returns the same
+candidates and the same recommended products in the same order. Symptom
+categories steer which catalog candidates are added, and score ties are
+broken by candidate position, so any set iteration on that path shows up
+as a difference between seeds.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+SYMPTOM_SETS = [[], ["dandruff"], ["dryness", "itchiness"], ["dandruff", "dryness", "itchiness"]]
+
+
+def lookups(products, config):
+    """Candidate ids and recommended ids per (pH, symptoms) request"""
+    from bench_ranking import synthetic_products
+    from productRecommendations import PHPerfectAPIIntegration
+    from scoringModel import ScoringModel
+
+    os.environ["CATALOG_MIN_PRODUCTS"] = "1"
+    api = PHPerfectAPIIntegration()
+    api.ranker.scoring_model = ScoringModel.from_config(config)
+    api.catalog.ingest(synthetic_products(products))
+
+    result = []
+    for tenth in range(35, 80, 5):
+        scalp_ph = tenth / 10
+        for symptoms in SYMPTOM_SETS:
+            candidates = api.catalog_products_for(scalp_ph, symptoms)
+            ranked = api._rank_products(candidates, scalp_ph, symptoms=symptoms)
+            result.append({
+                "scalp_ph": scalp_ph,
+                "symptoms": symptoms,
+                "candidates": [p.get('id') for p in candidates],
+                "recommended": [p.get('id') for p in ranked]
+            })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--products", type=int, default=2000, help="Synthetic catalog size")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1, 2], help="PYTHONHASHSEED values to compare")
+    parser.add_argument("--config", help="Scoring config JSON with symptom_categories (defaults to scoringConfig.json)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        json.dump(lookups(args.products, args.config), sys.stdout)
+        return
+
+    outputs = {}
+    for seed in args.seeds:
+        command = [sys.executable, os.path.abspath(__file__), "--child", "--products", str(args.products)]
+        if args.config:
+            command += ["--config", args.config]
+        child = subprocess.run(
+            command, env={**os.environ, "PYTHONHASHSEED": str(seed), "LOG_LEVEL": "WARNING"},
+            capture_output=True, text=True, check=True
+        )
+        outputs[seed] = json.loads(child.stdout)
+
+    baseline_seed, baseline = next(iter(outputs.items()))
+    for seed, output in outputs.items():
+        for expected, actual in zip(baseline, output):
+            if expected != actual:
+                raise SystemExit(
+                    f"pH {actual['scalp_ph']}, symptoms {actual['symptoms']}: PYTHONHASHSEED={seed} "
+                    f"differs from PYTHONHASHSEED={baseline_seed}"
+                )
+    print(f"{len(baseline)} lookups identical across PYTHONHASHSEED {', '.join(map(str, args.seeds))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Regression check and benchmark for the Sephora categorizer
+
+    python3 benchmarks/verify_categorizer.py --products 100000
+
+Runs the table-driven SephoraCategorizer and the original if/elif
+implementation over a regression corpus (every combination of name, type
+and query fragments, random products, and keywords glued together so they
+overlap), fails on any difference, then times both. The warm pass repeats
+the corpus, as a later page or catalog sync would.
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_ranking import best_time
+from sephoraCategorizer import SephoraCategorizer
+
+
+def legacy_categorize(product, query=None):
+    """The original _categorize_sephora_product, kept verbatim as the baseline"""
+    product_name = product.get('displayName', '').lower() if isinstance(product.get('displayName'), str) else ''
+    product_type = product.get('productType', '').lower() if isinstance(product.get('productType'), str) else ''
+    category = 'Hair Care'
+    ph_level = 5.5
+    if 'shampoo' in product_name or 'shampoo' in product_type:
+        category = 'Shampoo'
+        ph_level = 5.5
+    elif 'conditioner' in product_name or 'conditioner' in product_type:
+        category = 'Conditioner'
+        ph_level = 4.5
+    elif 'treatment' in product_name or 'treatment' in product_type:
+        category = 'Treatment'
+        ph_level = 5.0
+    elif 'mask' in product_name or 'mask' in product_type:
+        category = 'Mask'
+        ph_level = 5.0
+    elif 'oil' in product_name or 'oil' in product_type:
+        category = 'Oil'
+        ph_level = 5.0
+    elif 'serum' in product_name or 'serum' in product_type:
+        category = 'Serum'
+        ph_level = 5.0
+    elif 'scalp' in product_name or 'scalp' in product_type:
+        category = 'Scalp Care'
+        if 'oily' in product_name or 'oily' in product_type:
+            ph_level = 5.0
+        elif 'dry' in product_name or 'dry' in product_type:
+            ph_level = 5.8
+        elif 'dandruff' in product_name or 'dandruff' in product_type:
+            ph_level = 5.2
+    if query:
+        query = query.lower()
+        if 'oily' in query:
+            if category == 'Scalp Care':
+                ph_level = 5.0
+        elif 'dry' in query:
+            if category == 'Scalp Care':
+                ph_level = 5.8
+        elif 'dandruff' in query:
+            if category == 'Scalp Care':
+                ph_level = 5.2
+    return category, ph_level
+
+
+FRAGMENTS = ["", "Shampoo", "CONDITIONER", "Treatment", "Mask", "Oil", "Oily", "Serum", "Scalp",
+             "Dry", "Dandruff", "Boiling", "shampooil", "serumask", "Hydrating", "drYscalp"]
+
+# Keyword pieces glued without spaces, so keywords overlap at the seams
+PIECES = ["shampoo", "conditioner", "treatment", "mask", "oil", "oily", "serum", "scalp", "dry",
+          "dandruff", "sham", "poo", "ser", "um", "as", "k", "o", "il", "y", "t", "reatment", "ma"]
+QUERIES = [None, "", "oily scalp", "dry scalp", "dandruff shampoo", "scalp care", "itchy scalp relief", "Dry Oily"]
+
+
+def regression_corpus(n, seed=3):
+    corpus = []
+    # Every pairing of two name fragments with every type fragment and query
+    for a, b, t, q in itertools.product(FRAGMENTS, FRAGMENTS, FRAGMENTS[:8], QUERIES):
+        corpus.append(({'displayName': f"{a} {b}".strip(), 'productType': t}, q))
+
+    rng = random.Random(seed)
+    for i in range(n):
+        name = " ".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 5)))
+        product = {'displayName': name}
+        if rng.random() < 0.3:
+            product['productType'] = rng.choice(FRAGMENTS)
+        if rng.random() < 0.02:
+            product['displayName'] = None
+        # The same product comes back with the same id, as on later pages and syncs
+        product['productId'] = f"P{abs(hash((product['displayName'], product.get('productType')))) % 10 ** 9}"
+        corpus.append((product, rng.choice(QUERIES)))
+
+    for _ in range(n // 4):
+        name = "".join(rng.choice(PIECES) for _ in range(rng.randint(1, 6)))
+        corpus.append(({'displayName': name, 'productType': rng.choice(PIECES)}, rng.choice(QUERIES)))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000, help="Random products on top of the combinations")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = regression_corpus(args.products)
+
+    # Verify without memoization, so every product is really classified
+    uncached = SephoraCategorizer(max_entries=0)
+    for product, query in corpus:
+        expected, actual = legacy_categorize(product, query), uncached.categorize(product, query)
+        if actual != expected:
+            raise SystemExit(f"Mismatch for {product!r}, query {query!r}: {actual} != {expected}")
+
+    def categorize_all(categorize):
+        for product, query in corpus:
+            categorize(product, query)
+
+    def throughput(make_categorize):
+        return len(corpus) / best_time(lambda: categorize_all(make_categorize()), args.repeat)
+
+    warm = SephoraCategorizer(max_entries=len(corpus))
+    categorize_all(warm.categorize)
+
+    print(f"corpus:              {len(corpus)} products, outputs identical")
+    print(f"original:            {throughput(lambda: legacy_categorize):>12,.0f} products/sec")
+    print(f"categorizer, no memo:{throughput(lambda: SephoraCategorizer(max_entries=0).categorize):>12,.0f} products/sec")
+    print(f"categorizer, cold:   {throughput(lambda: SephoraCategorizer(max_entries=len(corpus)).categorize):>12,.0f} products/sec")
+    # A later page or catalog sync sees the same products again
+    print(f"categorizer, warm:   {throughput(lambda: warm.categorize):>12,.0f} products/sec")
+
+if __name__ == "__main__":
+    main()
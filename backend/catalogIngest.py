@@ -0,0 +1,176 @@
+"""
+Bulk catalog ingestion: crawl every page of the upstream product sources
+
+    python3 productRecommendations.py ingest --output catalog.jsonl
+    python3 catalogIngest.py --output catalog.jsonl --workers 4 --max-pages 20
+
+Normalized products are streamed to a JSONL file page by page, so memory use
+does not grow with the crawl. Progress is checkpointed after every page; an
+interrupted crawl started again with the same --output resumes where it left
+off. A page that was written but not yet checkpointed is crawled again, so a
+resumed file may repeat a few products - ProductCatalog.ingest deduplicates
+them by (source, id).
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from productRecommendations import PHPerfectAPIIntegration, SYMPTOM_QUERIES
+from structuredLogging import configure_logging
+
+logger = logging.getLogger(__name__)
+
+# Open Beauty Facts hair categories crawled by default
+HAIR_CATEGORIES = ["Hair", "shampoo", "conditioner", "hair-mask", "hair-oil", "hair-treatment"]
+
+# Sephora search queries crawled by default: everything the request path can
+# plan plus the broad hair care product types
+SEPHORA_QUERIES = (
+    ["scalp care", "oily scalp", "dry scalp"]
+    + [query for _, query in SYMPTOM_QUERIES]
+    + ["shampoo", "conditioner", "hair mask", "hair oil", "hair serum"]
+)
+
+
+class CatalogCrawler:
+    """
+    Paginated, resumable crawler over Open Beauty Facts and Sephora
+
+    Each (source, query) stream is crawled page by page until the upstream
+    returns a short page (fewer raw products than requested, before parsing
+    drops unnamed ones), which marks the stream done, or until max_pages,
+    which leaves it resumable by a later run with a higher limit. Streams
+    run concurrently on a bounded worker pool; pages within one stream are
+    sequential.
+    """
+
+    def __init__(self, api, output_path, checkpoint_path=None, page_size=50, max_pages=20, workers=4):
+        self.api = api
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path or f"{output_path}.checkpoint.json"
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._checkpoint = self._load_checkpoint()
+        self.products_written = 0
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return {"streams": {}}
+        with open(self.checkpoint_path) as f:
+            return json.load(f)
+
+    def _save_checkpoint(self):
+        """Write the checkpoint atomically (lock held)"""
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._checkpoint, f, indent=2)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    @staticmethod
+    def stream_id(source, query):
+        return f"{source}|{query}"
+
+    def _load_page(self, source, query, page):
+        """Return (parsed products, raw upstream product count) for one page"""
+        api = self.api
+        if source == "OpenBeauty":
+            raw_products = api._fetch_beauty_page(query, self.page_size, page=page)
+            return api._parse_beauty_products(raw_products), len(raw_products)
+        response_data = api._fetch_sephora_page(query, self.page_size, page=page)
+        if response_data is None:
+            return [], 0
+        return api._parse_sephora_products(response_data, query), len(api._sephora_products_data(response_data))
+
+    def _crawl_stream(self, source, query, output):
+        stream_id = self.stream_id(source, query)
+        with self._lock:
+            state = self._checkpoint["streams"].setdefault(stream_id, {"next_page": 1, "done": False})
+            if state["done"]:
+                return
+
+        while True:
+            page = state["next_page"]
+            if page > self.max_pages:
+                # Not done: a later run with a higher --max-pages continues from here
+                return
+
+            try:
+                products, raw_count = self._load_page(source, query, page)
+            except Exception as e:
+                # Leave the stream resumable at this page
+                logger.warning("Crawl of %s stopped at page %d: %s", stream_id, page, e)
+                return
+
+            with self._lock:
+                for product in products:
+                    output.write(json.dumps(product.to_dict()) + "\n")
+                output.flush()
+                self.products_written += len(products)
+                state["next_page"] = page + 1
+                self._save_checkpoint()
+
+            logger.info("%s: page %d -> %d products", stream_id, page, len(products))
+            if raw_count < self.page_size:
+                break
+
+        with self._lock:
+            state["done"] = True
+            self._save_checkpoint()
+
+    def crawl(self, categories=None, queries=None):
+        """
+        Crawl every stream that is not already finished
+
+        Args:
+            categories: Open Beauty Facts categories (defaults to HAIR_CATEGORIES)
+            queries: Sephora search queries (defaults to SEPHORA_QUERIES)
+
+        Returns:
+            Number of products written during this run
+        """
+        streams = [("OpenBeauty", c) for c in (categories or HAIR_CATEGORIES)]
+        streams += [("Sephora", q) for q in (queries or SEPHORA_QUERIES)]
+
+        with open(self.output_path, "a") as output:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="phperfect-crawl") as executor:
+                futures = [executor.submit(self._crawl_stream, source, query, output) for source, query in streams]
+                for future in futures:
+                    future.result()
+
+        remaining = [s for s, state in self._checkpoint["streams"].items() if not state["done"]]
+        if remaining:
+            logger.warning("Crawl incomplete, rerun to resume: %s", ", ".join(remaining))
+        logger.info("Wrote %d products to %s", self.products_written, self.output_path)
+        return self.products_written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crawl upstream hair products into a JSONL catalog")
+    parser.add_argument("--output", default="catalog.jsonl", help="JSONL file to append products to")
+    parser.add_argument("--checkpoint", help="Checkpoint file (defaults to <output>.checkpoint.json)")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--max-pages", type=int, default=20, help="Page limit per category/query")
+    parser.add_argument("--workers", type=int, default=4, help="Streams crawled concurrently")
+    parser.add_argument("--category", action="append", help="Open Beauty Facts category (repeatable)")
+    parser.add_argument("--query", action="append", help="Sephora search query (repeatable)")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    crawler = CatalogCrawler(
+        PHPerfectAPIIntegration(),
+        args.output,
+        checkpoint_path=args.checkpoint,
+        page_size=args.page_size,
+        max_pages=args.max_pages,
+        workers=args.workers
+    )
+    crawler.crawl(categories=args.category, queries=args.query)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,144 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Gauge values for /api/metrics
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, name):
+        super().__init__(f"circuit for {name} is open")
+        self.name = name
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one upstream
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    are rejected without touching the network. Once `reset_timeout` seconds
+    have passed one probe call is let through (half-open): a success closes
+    the circuit, a failure keeps it open for another `reset_timeout`. A probe
+    that never reports back does not wedge the breaker; the next one is let
+    through a `reset_timeout` later.
+
+    All methods take a short lock and never block, so one breaker can be
+    shared by request threads, fetch workers and the asyncio event loop.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._next_probe_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name):
+        """
+        Build a breaker configured by <NAME>_CIRCUIT_* or CIRCUIT_* environment variables
+
+        CIRCUIT_FAILURE_THRESHOLD (default 5, 0 disables the breaker) and
+        CIRCUIT_RESET_SECONDS (default 30) apply to every upstream unless
+        overridden per upstream, e.g. SEPHORA_CIRCUIT_RESET_SECONDS.
+        """
+        def setting(key, default):
+            return os.getenv(f"{name.upper()}_CIRCUIT_{key}", os.getenv(f"CIRCUIT_{key}", default))
+
+        return cls(
+            name,
+            failure_threshold=int(setting("FAILURE_THRESHOLD", "5")),
+            reset_timeout=float(setting("RESET_SECONDS", "30"))
+        )
+
+    def allow_request(self):
+        """
+        Decide whether a call may go upstream now
+
+        Returns:
+            True if the circuit is closed or this call is the half-open probe,
+            False if the call should be answered from a fallback instead
+        """
+        if not self.failure_threshold:
+            return True
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if now < self._next_probe_at:
+                self.rejected += 1
+                return False
+            probing = self.state == OPEN
+            self.state = HALF_OPEN
+            self._next_probe_at = now + self.reset_timeout
+        if probing:
+            logger.info("Circuit for %s half-open, probing upstream", self.name)
+        return True
+
+    def is_open(self):
+        """
+        True while calls would be rejected, without using up the half-open probe
+
+        Meant for callers that skip straight to a fallback, so a True answer
+        is counted as a rejected call.
+        """
+        if not self.failure_threshold:
+            return False
+        with self._lock:
+            if self.state != CLOSED and time.monotonic() < self._next_probe_at:
+                self.rejected += 1
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            # A slow call that started before the circuit opened says little about now
+            if self.state == OPEN:
+                return
+            recovered = self.state == HALF_OPEN
+            self.state = CLOSED
+            self.consecutive_failures = 0
+        if recovered:
+            logger.info("Circuit for %s closed, upstream recovered", self.name)
+
+    def record_failure(self):
+        if not self.failure_threshold:
+            return
+        with self._lock:
+            if self.state == OPEN:
+                return
+            self.consecutive_failures += 1
+            if self.state == CLOSED and self.consecutive_failures < self.failure_threshold:
+                return
+            self.state = OPEN
+            self.opened += 1
+            self._next_probe_at = time.monotonic() + self.reset_timeout
+            failures = self.consecutive_failures
+        logger.warning(
+            "Circuit for %s opened after %d consecutive failures, retrying in %ss",
+            self.name, failures, self.reset_timeout
+        )
+
+    def stats(self):
+        """Return the current state and counters"""
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "opened": self.opened,
+                "rejected": self.rejected
+            }
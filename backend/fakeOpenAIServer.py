@@ -0,0 +1,126 @@
+"""
+Local stand-in for the OpenAI chat completions API, for offline testing
+
+Run it and point the backend at it:
+
+    python3 fakeOpenAIServer.py --port 8089 --chunk-delay 0.05
+    OPENAI_API_BASE=http://127.0.0.1:8089/v1 python3 server.py
+
+Both plain and "stream": true completions are supported; streamed answers are
+sent word by word as server-sent events in the same format OpenAI uses.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ADVICE = (
+    "Your scalp pH suggests your scalp barrier would benefit from gentle, "
+    "pH-balanced care. The products above sit close to your scalp pH, so they "
+    "cleanse without pushing it further out of range. Wash two to three times "
+    "a week with lukewarm water, follow with a lightweight conditioner on the "
+    "lengths only, and avoid harsh sulfates and very hot styling tools."
+)
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Answers POST /v1/chat/completions with canned advice"""
+
+    protocol_version = "HTTP/1.1"
+    advice_text = DEFAULT_ADVICE
+    chunk_delay = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+
+        if payload.get("stream"):
+            self._send_stream(payload)
+        else:
+            self._send_completion(payload)
+
+    def _send_completion(self, payload):
+        body = json.dumps({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "model": payload.get("model", "gpt-3.5-turbo"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.advice_text},
+                "finish_reason": "stop"
+            }],
+            # Rough counts (about four characters per token), enough to exercise usage reporting
+            "usage": {
+                "prompt_tokens": sum(len(m.get("content", "")) for m in payload.get("messages", [])) // 4,
+                "completion_tokens": len(self.advice_text) // 4
+            }
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, payload):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        words = self.advice_text.split(" ")
+        for i, word in enumerate(words):
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "model": payload.get("model", "gpt-3.5-turbo"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if i == 0 else " " + word},
+                    "finish_reason": None
+                }]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if self.chunk_delay:
+                time.sleep(self.chunk_delay)
+
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def start_fake_openai_server(port=0, chunk_delay=0.0, advice_text=DEFAULT_ADVICE):
+    """
+    Start the fake server on a background thread
+
+    Returns:
+        (server, base_url) - call server.shutdown() when finished
+    """
+    handler = type("ConfiguredFakeOpenAIHandler", (FakeOpenAIHandler,), {
+        "chunk_delay": chunk_delay,
+        "advice_text": advice_text
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--chunk-delay", type=float, default=0.05,
+                        help="Seconds to wait between streamed words")
+    args = parser.parse_args()
+
+    handler = type("ConfiguredFakeOpenAIHandler", (FakeOpenAIHandler,), {"chunk_delay": args.chunk_delay})
+    print(f"Fake OpenAI server listening on http://127.0.0.1:{args.port}/v1")
+    ThreadingHTTPServer(("127.0.0.1", args.port), handler).serve_forever()
@@ -0,0 +1,204 @@
+"""
+Local stand-in for all three upstream APIs, replaying recorded fixtures
+
+Serves Open Beauty Facts search, Sephora search and OpenAI chat completions
+from the JSON files in fixtures/, with optional injected latency and error
+rate, so the backend can be exercised and benchmarked without network access:
+
+    python3 fakeUpstreamServer.py --port 8090 --latency 0.15 --openai-latency 0.8 --error-rate 0.02
+    OPENBEAUTY_API_URL=http://127.0.0.1:8090/api/v0 \
+    SEPHORA_API_URL=http://127.0.0.1:8090 \
+    OPENAI_API_BASE=http://127.0.0.1:8090/v1 python3 server.py
+
+Re-record the fixtures from the live APIs (needs real API keys):
+
+    python3 fakeUpstreamServer.py --record
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from fakeOpenAIServer import FakeOpenAIHandler
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+FIXTURE_FILES = {
+    "openbeauty": "openbeauty_search.json",
+    "sephora": "sephora_search.json",
+    "openai": "openai_chat_completion.json",
+}
+
+
+def load_fixtures(fixtures_dir=FIXTURES_DIR):
+    """Read every recorded upstream response, keyed by upstream name"""
+    fixtures = {}
+    for upstream, filename in FIXTURE_FILES.items():
+        with open(os.path.join(fixtures_dir, filename)) as f:
+            fixtures[upstream] = json.load(f)
+    return fixtures
+
+
+class FakeUpstreamHandler(FakeOpenAIHandler):
+    """Answers the Open Beauty Facts, Sephora and OpenAI endpoints the backend calls"""
+
+    fixtures = {}
+    latency = {}       # upstream -> seconds added before answering
+    jitter = 0.0       # +/- fraction applied to each latency
+    error_rate = 0.0   # share of requests answered with a 503
+    rng = random.Random()
+
+    def _delay_or_fail(self, upstream):
+        """Sleep for the configured latency; return True if this request should fail"""
+        delay = self.latency.get(upstream, 0.0)
+        if delay:
+            time.sleep(max(0.0, delay * (1 + self.rng.uniform(-self.jitter, self.jitter))))
+        return bool(self.error_rate) and self.rng.random() < self.error_rate
+
+    def _send_failure(self):
+        self._send_json({"error": "injected upstream failure"}, status=503)
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def _page(products, params, size_param, page_param):
+        """Slice the recorded products the way the live API pages them"""
+        size = int(params.get(size_param, [len(products)])[0])
+        page = int(params.get(page_param, ["1"])[0])
+        return products[(page - 1) * size:page * size]
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+
+        if url.path.endswith("/products/v2/search"):
+            if self._delay_or_fail("sephora"):
+                self._send_failure()
+                return
+            response = dict(self.fixtures["sephora"])
+            response["products"] = self._page(response.get("products", []), params, "pageSize", "currentPage")
+            self._send_json(response)
+        elif url.path.endswith("/search"):
+            if self._delay_or_fail("openbeauty"):
+                self._send_failure()
+                return
+            response = dict(self.fixtures["openbeauty"])
+            response["products"] = self._page(response.get("products", []), params, "page_size", "page")
+            self._send_json(response)
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if self._delay_or_fail("openai"):
+            # Drain the request body so the kept-alive connection stays usable
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self._send_failure()
+            return
+        super().do_POST()
+
+
+class _UpstreamHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Clients that time out on an injected delay hang up before the answer is written
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+def _configured_handler(latency=None, jitter=0.0, error_rate=0.0, fixtures_dir=FIXTURES_DIR, seed=None):
+    fixtures = load_fixtures(fixtures_dir)
+    return type("ConfiguredFakeUpstreamHandler", (FakeUpstreamHandler,), {
+        "fixtures": fixtures,
+        "advice_text": fixtures["openai"]["choices"][0]["message"]["content"],
+        "latency": dict(latency or {}),
+        "jitter": jitter,
+        "error_rate": error_rate,
+        "rng": random.Random(seed)
+    })
+
+
+def start_fake_upstream_server(port=0, latency=None, jitter=0.0, error_rate=0.0, fixtures_dir=FIXTURES_DIR, seed=None):
+    """
+    Start the fake upstream server on a background thread
+
+    Args:
+        port: Port to listen on (0 picks a free one)
+        latency: Dict of upstream name ("openbeauty", "sephora", "openai") to added seconds
+        jitter: Random +/- fraction applied to each added latency
+        error_rate: Share of requests (0..1) answered with a 503
+        fixtures_dir: Directory holding the recorded responses
+        seed: Seed for the latency jitter and error injection
+
+    Returns:
+        (server, base_url) - call server.shutdown() when finished. Point
+        OPENBEAUTY_API_URL at base_url + "/api/v0", SEPHORA_API_URL at
+        base_url and OPENAI_API_BASE at base_url + "/v1".
+    """
+    handler = _configured_handler(latency, jitter, error_rate, fixtures_dir, seed)
+    server = _UpstreamHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def record_fixtures(fixtures_dir=FIXTURES_DIR):
+    """Capture one live response from each upstream into the fixtures directory"""
+    from productRecommendations import PHPerfectAPIIntegration
+
+    api = PHPerfectAPIIntegration()
+    responses = {
+        "openbeauty": api.http.get(
+            f"{api.openbeauty_api_url}/search",
+            params={"categories_tags": "Hair", "page_size": 24, "page": 1}
+        ),
+        "sephora": api.http.get(
+            f"{api.sephora_api_url}/us/products/v2/search",
+            params={"q": "scalp care", "pageSize": 30, "currentPage": 1},
+            headers=api._sephora_headers()
+        ),
+    }
+    products = api._prompt_products(api._generate_default_products(), 5.5)
+    headers, payload = api._build_openai_request(5.5, [], products)
+    responses["openai"] = api.http.post(
+        f"{api.openai_api_url}/chat/completions", headers=headers, data=json.dumps(payload)
+    )
+
+    for upstream, response in responses.items():
+        response.raise_for_status()
+        path = os.path.join(fixtures_dir, FIXTURE_FILES[upstream])
+        with open(path, "w") as f:
+            json.dump(response.json(), f, indent=1)
+        print(f"Recorded {upstream} response to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Open Beauty Facts, Sephora and OpenAI server")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds added to every Open Beauty Facts and Sephora response")
+    parser.add_argument("--openai-latency", type=float, default=0.0,
+                        help="Seconds added to every OpenAI response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random +/- fraction applied to the latencies")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 503")
+    parser.add_argument("--record", action="store_true", help="Re-record the fixtures from the live APIs and exit")
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixtures()
+    else:
+        latency = {"openbeauty": args.latency, "sephora": args.latency, "openai": args.openai_latency}
+        handler = _configured_handler(latency, args.jitter, args.error_rate)
+        print(f"Fake upstream server listening on http://127.0.0.1:{args.port}")
+        _UpstreamHTTPServer(("127.0.0.1", args.port), handler).serve_forever()
@@ -0,0 +1,129 @@
+import os
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from circuitBreaker import CircuitOpenError
+
+# Statuses worth retrying: rate limiting and transient gateway/server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class UpstreamHTTPClient:
+    """
+    Pooled keep-alive HTTP client shared by every upstream API
+
+    Wraps a single requests.Session. Each upstream host gets its own mounted
+    adapter with a bounded connection pool, retry/backoff policy and
+    (connect, read) timeout, so repeated calls reuse TCP/TLS connections
+    instead of paying a fresh handshake each time. When given a
+    MetricsRegistry, every response status (or 'error' when no response
+    arrives) is counted per named upstream. A host mounted with a
+    CircuitBreaker fails fast with CircuitOpenError while its circuit is
+    open; transport errors and 5xx responses count as breaker failures.
+    """
+
+    def __init__(self, connect_timeout=3.05, read_timeout=10, retries=2, backoff_factor=0.3, metrics=None):
+        self.session = requests.Session()
+        self.default_timeout = (connect_timeout, read_timeout)
+        self.default_retries = retries
+        self.backoff_factor = backoff_factor
+        self.metrics = metrics
+        self._host_timeouts = {}
+        self._host_names = {}
+        self._host_breakers = {}
+
+    @classmethod
+    def from_env(cls, metrics=None):
+        """Build a client configured by the UPSTREAM_* environment variables"""
+        return cls(
+            connect_timeout=float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3.05")),
+            read_timeout=float(os.getenv("UPSTREAM_READ_TIMEOUT", "10")),
+            retries=int(os.getenv("UPSTREAM_RETRIES", "2")),
+            backoff_factor=float(os.getenv("UPSTREAM_BACKOFF_FACTOR", "0.3")),
+            metrics=metrics
+        )
+
+    def mount_host(self, base_url, pool_size=10, read_timeout=None, retries=None, retry_methods=("GET",), name=None,
+                   breaker=None, retry_reads=True):
+        """
+        Register connection pool, timeout and retry settings for one upstream
+
+        Args:
+            base_url: URL prefix the settings apply to (e.g. "https://api.openai.com")
+            pool_size: Maximum number of kept-alive connections to the host
+            read_timeout: Read timeout in seconds (defaults to the client default)
+            retries: Number of retries (defaults to the client default)
+            retry_methods: HTTP methods that are safe to retry for this host
+            name: Upstream label used in metrics (defaults to the base URL)
+            breaker: CircuitBreaker guarding calls to the host
+            retry_reads: Also retry read timeouts and errors after the request was sent;
+                turn off for non-idempotent calls, which then retry only on connect
+                errors and RETRY_STATUSES responses
+        """
+        retry = Retry(
+            total=self.default_retries if retries is None else retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(retry_methods),
+            read=None if retry_reads else 0,
+            other=None if retry_reads else 0,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount(base_url, adapter)
+
+        if read_timeout is not None:
+            self._host_timeouts[base_url] = (self.default_timeout[0], read_timeout)
+        self._host_names[base_url] = name or base_url
+        if breaker is not None:
+            self._host_breakers[base_url] = breaker
+
+    @staticmethod
+    def _most_specific(settings, url, default):
+        """Pick the setting registered for the longest base URL prefix of `url`"""
+        best = None
+        for base_url, value in settings.items():
+            if url.startswith(base_url) and (best is None or len(base_url) > len(best[0])):
+                best = (base_url, value)
+        return best[1] if best else default
+
+    def _timeout_for(self, url):
+        """Pick the most specific registered timeout for `url`"""
+        return self._most_specific(self._host_timeouts, url, self.default_timeout)
+
+    def request(self, method, url, **kwargs):
+        """Send a request through the pooled session with the host's timeout"""
+        kwargs.setdefault("timeout", self._timeout_for(url))
+        breaker = self._most_specific(self._host_breakers, url, None)
+        if self.metrics is None and breaker is None:
+            return self.session.request(method, url, **kwargs)
+
+        upstream = self._most_specific(self._host_names, url, "other")
+        if breaker is not None and not breaker.allow_request():
+            raise CircuitOpenError(upstream)
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            if self.metrics is not None:
+                self.metrics.record_upstream(upstream, "error")
+            if breaker is not None:
+                breaker.record_failure()
+            raise
+        if self.metrics is not None:
+            self.metrics.record_upstream(upstream, response.status_code)
+        if breaker is not None:
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        """Close every pooled connection"""
+        self.session.close()
@@ -0,0 +1,212 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a cached lookup up to a slow LLM call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_key, extra=None):
+    pairs = list(label_key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(key)} {_format_value(v)}" for key, v in values]
+        return lines
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with optional labels
+
+    Observing is a bisect plus a few increments under a short lock, so it is
+    cheap enough to call on every request stage from many threads.
+    """
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label key -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self, **labels):
+        """Return (count, sum) for one label set"""
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            return (sum(series[:-1]), series[-1]) if series else (0, 0.0)
+
+    def render(self):
+        with self._lock:
+            series_items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in series_items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _format_value(float(bound))))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class _Span:
+    """Context manager returned by MetricsRegistry.span"""
+
+    __slots__ = ("registry", "stage", "labels", "start")
+
+    def __init__(self, registry, stage, labels):
+        self.registry = registry
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.registry.stage_errors.inc(stage=self.stage, **self.labels)
+        self.registry.stage_duration.observe(time.perf_counter() - self.start, stage=self.stage, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics for the recommendation pipeline
+
+    Holds the per-stage latency histogram, upstream status counters and any
+    collector callbacks (e.g. cache stats read at scrape time), and renders
+    them in the Prometheus text exposition format.
+    """
+
+    def __init__(self, namespace="phperfect"):
+        self.namespace = namespace
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+        self.stage_duration = self.histogram(
+            "stage_duration_seconds", "Time spent in each recommendation pipeline stage"
+        )
+        self.stage_errors = self.counter(
+            "stage_errors_total", "Pipeline stages that raised an exception"
+        )
+        self.upstream_responses = self.counter(
+            "upstream_responses_total", "Upstream API responses by status code ('error' when no response)"
+        )
+        self.request_duration = self.histogram(
+            "request_duration_seconds", "HTTP request latency by endpoint and status"
+        )
+
+    def _register(self, cls, name, help_text, **kwargs):
+        full_name = f"{self.namespace}_{name}"
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = self._metrics[full_name] = cls(full_name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name, help_text):
+        """Get or create a counter named `<namespace>_<name>`"""
+        return self._register(Counter, name, help_text)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        """Get or create a histogram named `<namespace>_<name>`"""
+        return self._register(Histogram, name, help_text, buckets=buckets)
+
+    def add_collector(self, collector):
+        """
+        Register a callback read at scrape time
+
+        `collector()` returns an iterable of (name, type, help, samples) with
+        samples a list of (labels dict, value), for values that already live
+        elsewhere (cache hit counters, queue sizes, ...).
+        """
+        self._collectors.append(collector)
+
+    def span(self, stage, **labels):
+        """Context manager timing the enclosed block as one observation of `stage`"""
+        return _Span(self, stage, labels)
+
+    def observe_stage(self, stage, seconds, **labels):
+        """Record a stage timed by the caller, e.g. accumulated over a loop"""
+        self.stage_duration.observe(seconds, stage=stage, **labels)
+
+    def record_upstream(self, upstream, status):
+        """Count one upstream response (an HTTP status code, or 'error')"""
+        self.upstream_responses.inc(upstream=upstream, status=str(status))
+
+    def render(self):
+        """Render every metric in the Prometheus text format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+
+        for collector in self._collectors:
+            try:
+                collected = list(collector())
+            except Exception as e:
+                logger.warning("Metrics collector failed: %s", e)
+                continue
+            for name, metric_type, help_text, samples in collected:
+                full_name = f"{self.namespace}_{name}"
+                lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{full_name}{_format_labels(_label_key(labels))} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
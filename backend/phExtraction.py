@@ -0,0 +1,110 @@
+import re
+
+# The three pH phrasings the extractor understands, in priority order:
+#   1. "pH 5.5" / "pH5.5"
+#   2. "pH balanced (5.5)"
+#   3. "pH level of 5.5"
+# They are combined into one pattern matched at every "pH" occurrence. The
+# alternatives sit inside a lookahead so no occurrence is consumed by an
+# earlier, longer match, and at any one position at most one alternative
+# can match, so a single scan finds the first match of each phrasing.
+_PH_PATTERN = re.compile(
+    r'pH(?=\s*?(\d+\.?\d*)|\s+balance.*?(\d+\.?\d*)|\s+level.*?(\d+\.?\d*))',
+    re.IGNORECASE
+)
+
+# Plausible pH range for hair products
+PH_MIN = 3
+PH_MAX = 8
+
+# Typical pH by product category, checked in this order
+CATEGORY_PH = (
+    ('shampoo', 5.5),
+    ('conditioner', 4.5),
+    ('hair mask', 4.8),
+    ('treatment', 5.0),
+    ('oil', 5.0),
+    ('serum', 5.0),
+    ('spray', 5.5),
+)
+
+# Average pH for hair products, used when nothing else matches
+DEFAULT_PH = 5.5
+
+# Open Beauty Facts fields searched for a pH mention, in order
+TEXT_FIELDS = ('product_name', 'generic_name', 'ingredients_text')
+
+
+def _valid_ph(value):
+    ph_value = float(value)
+    return ph_value if PH_MIN <= ph_value <= PH_MAX else None
+
+
+def find_ph_in_text(text):
+    """
+    Find a pH level mentioned in text
+
+    Returns:
+        The pH value from the highest-priority phrasing whose first occurrence
+        is in the plausible range, or None
+    """
+    first = [None, None, None]
+    for match in _PH_PATTERN.finditer(text):
+        for i, value in enumerate(match.groups()):
+            if value is not None:
+                if first[i] is None:
+                    first[i] = value
+                    if i == 0:
+                        # The top-priority phrasing decides as soon as it is seen
+                        ph_value = _valid_ph(value)
+                        if ph_value is not None:
+                            return ph_value
+                break
+
+    for value in first[1:]:
+        if value is not None:
+            ph_value = _valid_ph(value)
+            if ph_value is not None:
+                return ph_value
+    return None
+
+
+def estimate_ph_by_category(product):
+    """Estimate pH from an Open Beauty Facts product's categories"""
+    categories = []
+    if 'categories' in product and product['categories']:
+        categories.append(product['categories'].lower())
+
+    if 'categories_tags' in product:
+        for tag in product['categories_tags']:
+            if isinstance(tag, str):
+                categories.append(tag.lower().replace('en:', ''))
+
+    for category in categories:
+        for key, ph in CATEGORY_PH:
+            if key in category:
+                return ph
+
+    return DEFAULT_PH
+
+
+def extract_ph_level(product):
+    """Extract pH level from raw product data, or estimate it if not available"""
+    if 'ph' in product:
+        try:
+            return float(product['ph'])
+        except (ValueError, TypeError):
+            pass
+
+    for field in TEXT_FIELDS:
+        if field in product and product[field]:
+            ph_match = find_ph_in_text(str(product[field]))
+            if ph_match is not None:
+                return ph_match
+
+    return estimate_ph_by_category(product)
+
+
+def extract_ph_levels(products):
+    """Batch version of extract_ph_level over many raw products"""
+    return [extract_ph_level(product) for product in products]
@@ -0,0 +1,317 @@
+"""
+Rolling pH statistics and downsampled history per user
+
+Every flush of the reading store also folds its rows into hourly, daily and
+monthly rollups in the same SQLite file, inside the same transaction. A
+rollup bucket keeps the reading count, pH sum, min, max, the sums needed for
+a least-squares slope, the first and latest reading, and a histogram of pH in
+BIN_WIDTH bins for medians. Trend queries read at most a few hundred
+rollup rows for any window, so their cost depends on the window, not on how
+many raw readings a user has.
+
+Medians come from the histograms and are exact to within BIN_WIDTH / 2.
+Windows cover whole buckets of the chosen resolution.
+"""
+import contextlib
+import datetime
+import functools
+import math
+import queue
+import time
+from readingStore import SCHEMA as READINGS_SCHEMA
+
+RESOLUTIONS = ("hourly", "daily", "monthly")
+
+# Width of the pH histogram bins medians are computed from
+BIN_WIDTH = 0.05
+
+# Slope sums use days since 2020-01-01 UTC, which keeps them well inside float precision
+_EPOCH = 1577836800.0
+_DAY = 86400.0
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ph_rollups (
+    user_id TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    bucket_start REAL NOT NULL,
+    readings INTEGER NOT NULL,
+    ph_sum REAL NOT NULL,
+    ph_min REAL NOT NULL,
+    ph_max REAL NOT NULL,
+    t_sum REAL NOT NULL,
+    tt_sum REAL NOT NULL,
+    tp_sum REAL NOT NULL,
+    first_ts REAL NOT NULL,
+    last_ts REAL NOT NULL,
+    last_ph REAL NOT NULL,
+    PRIMARY KEY (user_id, resolution, bucket_start)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ph_rollup_bins (
+    user_id TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    bucket_start REAL NOT NULL,
+    bin INTEGER NOT NULL,
+    readings INTEGER NOT NULL,
+    PRIMARY KEY (user_id, resolution, bucket_start, bin)
+) WITHOUT ROWID;
+"""
+
+_UPSERT_ROLLUP = """
+INSERT INTO ph_rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (user_id, resolution, bucket_start) DO UPDATE SET
+    readings = readings + excluded.readings,
+    ph_sum = ph_sum + excluded.ph_sum,
+    ph_min = MIN(ph_min, excluded.ph_min),
+    ph_max = MAX(ph_max, excluded.ph_max),
+    t_sum = t_sum + excluded.t_sum,
+    tt_sum = tt_sum + excluded.tt_sum,
+    tp_sum = tp_sum + excluded.tp_sum,
+    first_ts = MIN(first_ts, excluded.first_ts),
+    last_ph = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last_ph ELSE last_ph END,
+    last_ts = MAX(last_ts, excluded.last_ts)
+"""
+
+_UPSERT_BIN = """
+INSERT INTO ph_rollup_bins VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (user_id, resolution, bucket_start, bin) DO UPDATE SET readings = readings + excluded.readings
+"""
+
+
+@functools.lru_cache(maxsize=4096)
+def _month_start(day_start):
+    day = datetime.datetime.fromtimestamp(day_start, datetime.timezone.utc)
+    return day.replace(day=1).timestamp()
+
+
+def bucket_start(resolution, timestamp):
+    """Start (epoch seconds, UTC) of the `resolution` bucket holding `timestamp`"""
+    if resolution == "hourly":
+        return math.floor(timestamp / 3600) * 3600.0
+    day_start = math.floor(timestamp / _DAY) * _DAY
+    if resolution == "daily":
+        return day_start
+    if resolution == "monthly":
+        return _month_start(day_start)
+    raise ValueError(f"unknown resolution {resolution!r}")
+
+
+def _median(bins):
+    """Median pH from (bin, readings) pairs sorted by bin"""
+    total = sum(n for _, n in bins)
+    seen = 0
+    for b, n in bins:
+        seen += n
+        if seen * 2 >= total:
+            return round(b * BIN_WIDTH, 3)
+    return None
+
+
+def describe_trend(summary):
+    """
+    One prompt sentence about a user's recent readings
+
+    Figures are rounded to 0.1 pH and the direction to rising, falling or
+    stable, so users with similar histories share cached advice. The change
+    is the fitted slope over the time the readings actually span.
+    """
+    if not summary or not summary.get("readings"):
+        return None
+    span_days = (summary["latest_at"] - summary["first_at"]) / _DAY
+    change = (summary["slope_per_day"] or 0.0) * span_days
+    if change >= 0.2:
+        direction = f"has been rising (about +{change:.1f} pH over {span_days:.0f} days)"
+    elif change <= -0.2:
+        direction = f"has been falling (about {change:.1f} pH over {span_days:.0f} days)"
+    else:
+        direction = "has been stable"
+    return (
+        f"Over the last {summary['days']:g} days their scalp pH averaged {summary['mean']:.1f} "
+        f"(median {summary['median']:.1f}, range {summary['min']:.1f}-{summary['max']:.1f}) and {direction}."
+    )
+
+
+class TrendStore:
+    """
+    Hourly, daily and monthly pH rollups per user, fed by a ReadingStore
+
+    Construct it before ReadingStore.start(): it creates the rollup tables,
+    backfills them once from any readings already stored, and registers a
+    flush hook so every later flush updates them incrementally. Readings
+    without a user_id are stored but not rolled up.
+    """
+
+    def __init__(self, reading_store):
+        self.reading_store = reading_store
+        self._readers = queue.LifoQueue()
+        connection = reading_store.connect()
+        try:
+            connection.executescript(READINGS_SCHEMA + ROLLUP_SCHEMA)
+            empty = connection.execute("SELECT 1 FROM ph_rollups LIMIT 1").fetchone() is None
+            if empty and connection.execute("SELECT 1 FROM ph_readings LIMIT 1").fetchone() is not None:
+                self.rebuild(connection)
+        finally:
+            connection.close()
+        reading_store.add_flush_hook(self.apply)
+
+    def apply(self, connection, rows):
+        """Fold (device_id, user_id, ph_value, timestamp) rows into the rollups (a flush hook)"""
+        buckets, bins = {}, {}
+        for _, user_id, ph, timestamp in rows:
+            if user_id is None:
+                continue
+            t = (timestamp - _EPOCH) / _DAY
+            ph_bin = round(ph / BIN_WIDTH)
+            day_start = math.floor(timestamp / _DAY) * _DAY
+            for resolution, start in (
+                ("hourly", math.floor(timestamp / 3600) * 3600.0),
+                ("daily", day_start),
+                ("monthly", _month_start(day_start)),
+            ):
+                key = (user_id, resolution, start)
+                bucket = buckets.get(key)
+                if bucket is None:
+                    buckets[key] = [1, ph, ph, ph, t, t * t, t * ph, timestamp, timestamp, ph]
+                else:
+                    bucket[0] += 1
+                    bucket[1] += ph
+                    if ph < bucket[2]:
+                        bucket[2] = ph
+                    if ph > bucket[3]:
+                        bucket[3] = ph
+                    bucket[4] += t
+                    bucket[5] += t * t
+                    bucket[6] += t * ph
+                    if timestamp < bucket[7]:
+                        bucket[7] = timestamp
+                    if timestamp >= bucket[8]:
+                        bucket[8] = timestamp
+                        bucket[9] = ph
+                bin_key = key + (ph_bin,)
+                bins[bin_key] = bins.get(bin_key, 0) + 1
+
+        connection.executemany(_UPSERT_ROLLUP, [key + tuple(bucket) for key, bucket in buckets.items()])
+        connection.executemany(_UPSERT_BIN, [key + (n,) for key, n in bins.items()])
+
+    def rebuild(self, connection, chunk_size=50000):
+        """Recompute every rollup from the raw readings, in one transaction"""
+        with connection:
+            connection.execute("DELETE FROM ph_rollups")
+            connection.execute("DELETE FROM ph_rollup_bins")
+            cursor = connection.execute(
+                "SELECT device_id, user_id, ph_value, timestamp FROM ph_readings WHERE user_id IS NOT NULL"
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                self.apply(connection, rows)
+
+    @contextlib.contextmanager
+    def _reader(self):
+        """Borrow a read connection; WAL lets readers run alongside the writer thread"""
+        try:
+            connection = self._readers.get_nowait()
+        except queue.Empty:
+            connection = self.reading_store.connect(check_same_thread=False)
+        try:
+            yield connection
+        finally:
+            self._readers.put(connection)
+
+    @staticmethod
+    def resolution_for(days):
+        """Coarsest resolution that still gives a useful number of points for a window"""
+        if days <= 2:
+            return "hourly"
+        if days <= 400:
+            return "daily"
+        return "monthly"
+
+    def summary(self, user_id, days=30, now=None):
+        """
+        Rolling statistics over a user's last `days` days
+
+        Returns:
+            Dictionary with readings, mean, median, min, max, slope_per_day
+            (pH per day, least squares), first_at, latest_ph and latest_at; the
+            statistics are None when the window holds no readings
+        """
+        now = time.time() if now is None else now
+        resolution = self.resolution_for(days)
+        params = (user_id, resolution, bucket_start(resolution, now - days * _DAY), now)
+        summary = {
+            "user_id": user_id, "days": days, "resolution": resolution, "readings": 0,
+            "mean": None, "median": None, "min": None, "max": None,
+            "slope_per_day": None, "first_at": None, "latest_ph": None, "latest_at": None
+        }
+
+        with self._reader() as connection:
+            n, ph_sum, ph_min, ph_max, t_sum, tt_sum, tp_sum, first_ts = connection.execute(
+                "SELECT SUM(readings), SUM(ph_sum), MIN(ph_min), MAX(ph_max), SUM(t_sum), SUM(tt_sum), SUM(tp_sum), "
+                "MIN(first_ts) "
+                "FROM ph_rollups WHERE user_id = ? AND resolution = ? AND bucket_start BETWEEN ? AND ?",
+                params
+            ).fetchone()
+            if not n:
+                return summary
+            latest = connection.execute(
+                "SELECT last_ph, last_ts FROM ph_rollups WHERE user_id = ? AND resolution = ? "
+                "AND bucket_start BETWEEN ? AND ? ORDER BY bucket_start DESC LIMIT 1",
+                params
+            ).fetchone()
+            bins = connection.execute(
+                "SELECT bin, SUM(readings) FROM ph_rollup_bins WHERE user_id = ? AND resolution = ? "
+                "AND bucket_start BETWEEN ? AND ? GROUP BY bin ORDER BY bin",
+                params
+            ).fetchall()
+
+        spread = n * tt_sum - t_sum * t_sum
+        summary.update({
+            "readings": n,
+            "mean": round(ph_sum / n, 3),
+            "median": _median(bins),
+            "min": ph_min,
+            "max": ph_max,
+            # Readings spread over less than about an hour (std dev of their times) give no usable slope
+            "slope_per_day": round((n * tp_sum - t_sum * ph_sum) / spread, 5) if spread > n * n / 24 ** 2 else None,
+            "first_at": first_ts,
+            "latest_ph": latest[0],
+            "latest_at": latest[1]
+        })
+        return summary
+
+    def series(self, user_id, resolution, start, end=None):
+        """
+        Downsampled history: one point per `resolution` bucket between `start` and `end`
+
+        Returns:
+            List of dictionaries with bucket_start, readings, mean, median,
+            min and max, oldest first
+        """
+        end = time.time() if end is None else end
+        params = (user_id, resolution, bucket_start(resolution, start), end)
+        with self._reader() as connection:
+            bins = {}
+            for start_at, ph_bin, n in connection.execute(
+                "SELECT bucket_start, bin, readings FROM ph_rollup_bins WHERE user_id = ? AND resolution = ? "
+                "AND bucket_start BETWEEN ? AND ? ORDER BY bucket_start, bin",
+                params
+            ):
+                bins.setdefault(start_at, []).append((ph_bin, n))
+            rows = connection.execute(
+                "SELECT bucket_start, readings, ph_sum, ph_min, ph_max FROM ph_rollups "
+                "WHERE user_id = ? AND resolution = ? AND bucket_start BETWEEN ? AND ? ORDER BY bucket_start",
+                params
+            ).fetchall()
+
+        return [
+            {
+                "bucket_start": start_at,
+                "readings": n,
+                "mean": round(ph_sum / n, 3),
+                "median": _median(bins.get(start_at, [])),
+                "min": ph_min,
+                "max": ph_max
+            }
+            for start_at, n, ph_sum, ph_min, ph_max in rows
+        ]
@@ -0,0 +1,148 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class ProductCache:
+    """
+    Bounded LRU cache with a TTL and stale-while-revalidate
+
+    Entries younger than `ttl` are served as hits. Entries between `ttl` and
+    `ttl + stale_ttl` are still served immediately, but a background refresh
+    is scheduled so the next caller gets fresh data. Older entries count as
+    misses and are loaded inline. Empty results are never cached so a
+    transient upstream hiccup does not pin the default product set.
+    """
+
+    def __init__(self, ttl=900, stale_ttl=86400, max_entries=256, refresh_workers=2):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._refresh_executor = ThreadPoolExecutor(
+            max_workers=refresh_workers,
+            thread_name_prefix="phperfect-cache-refresh"
+        )
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache sized by the PRODUCT_CACHE_* environment variables"""
+        return cls(
+            ttl=float(os.getenv("PRODUCT_CACHE_TTL_SECONDS", "900")),
+            stale_ttl=float(os.getenv("PRODUCT_CACHE_STALE_SECONDS", "86400")),
+            max_entries=int(os.getenv("PRODUCT_CACHE_MAX_ENTRIES", "256"))
+        )
+
+    def get_or_load(self, key, loader):
+        """
+        Return the cached value for `key`, calling `loader()` on a miss
+
+        Args:
+            key: Hashable cache key, e.g. (source, query, count)
+            loader: Zero-argument callable that fetches the value upstream
+
+        Returns:
+            The cached or freshly loaded value
+        """
+        value = self.get(key, refresh_loader=loader)
+        if value is not None:
+            return value
+
+        value = loader()
+        self.put(key, value)
+        return value
+
+    def get(self, key, refresh_loader=None):
+        """
+        Return the cached value for `key`, or None on a miss
+
+        Stale entries are returned as well; if `refresh_loader` is given a
+        background refresh with it is scheduled. Callers that get None are
+        expected to load the value themselves and `put` it.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = time.monotonic() - stored_at
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if age < self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if refresh_loader is not None:
+                        self._schedule_refresh(key, refresh_loader)
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def peek(self, key):
+        """Return the cached value for `key` regardless of age, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None else None
+
+    def put(self, key, value):
+        """Store `value` under `key`, evicting the least recently used entry if full"""
+        if not value:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _schedule_refresh(self, key, loader):
+        """Queue a background reload of `key` unless one is already running (lock held)"""
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        self._refresh_executor.submit(self._refresh, key, loader)
+
+    def _refresh(self, key, loader):
+        try:
+            self.put(key, loader())
+            with self._lock:
+                self.refreshes += 1
+        except Exception as e:
+            logger.warning("Background refresh failed for %s: %s", key, e)
+            with self._lock:
+                self.refresh_failures += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "refresh_failures": self.refresh_failures,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0
+            }
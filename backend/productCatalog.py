@@ -0,0 +1,230 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from productRecord import Product
+
+logger = logging.getLogger(__name__)
+
+# Fields a catalog can be filtered on, besides pH
+INDEXED_FIELDS = ("category", "brand", "source")
+
+
+def _index_value(value):
+    """Normalize an indexed field value for case-insensitive lookups"""
+    return str(value or "").strip().lower()
+
+
+class _PhIndex:
+    """Products sorted by pH level, as parallel arrays for bisect lookups"""
+
+    __slots__ = ("ph_levels", "keys")
+
+    def __init__(self, entries):
+        entries.sort()
+        self.ph_levels = [ph for ph, _ in entries]
+        self.keys = [key for _, key in entries]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def closest(self, scalp_ph, k, accept=None):
+        """
+        Yield up to `k` product keys nearest to `scalp_ph`, closest first
+
+        Starts at the bisect position and walks outwards with two pointers,
+        so a query costs O(log n + k) when `accept` rejects nothing.
+        """
+        ph_levels = self.ph_levels
+        right = bisect.bisect_left(ph_levels, scalp_ph)
+        left = right - 1
+        found = 0
+        while found < k and (left >= 0 or right < len(ph_levels)):
+            if right >= len(ph_levels) or (left >= 0 and scalp_ph - ph_levels[left] <= ph_levels[right] - scalp_ph):
+                key = self.keys[left]
+                left -= 1
+            else:
+                key = self.keys[right]
+                right += 1
+            if accept is None or accept(key):
+                found += 1
+                yield key
+
+
+class _CatalogSnapshot:
+    """Immutable set of products plus their pH indexes, swapped in atomically"""
+
+    def __init__(self, products):
+        self.products = products
+        self.by_ph = _PhIndex([(p['ph_level'], key) for key, p in products.items()])
+        self.by_field = {}
+        for field in INDEXED_FIELDS:
+            groups = {}
+            for key, p in products.items():
+                groups.setdefault(_index_value(p.get(field)), []).append((p['ph_level'], key))
+            self.by_field[field] = {value: _PhIndex(entries) for value, entries in groups.items()}
+
+
+class ProductCatalog:
+    """
+    Local indexed store of normalized products
+
+    Products are held as compact Product records, the same ones produced by
+    fetch_beauty_products and fetch_sephora_products (dicts read from a JSONL
+    crawl are converted on ingest). Each snapshot keeps one pH-sorted index
+    over everything plus one per category, brand and source value, so "top-k
+    products closest to pH X in category Y" is a bisect plus a k-step walk.
+    Writers build a new snapshot and swap it in; readers never take a lock.
+    """
+
+    def __init__(self):
+        self._snapshot = _CatalogSnapshot({})
+        self._write_lock = threading.Lock()
+        self._sync_thread = None
+        self._stop_sync = threading.Event()
+        self.last_synced_at = None
+
+    def __len__(self):
+        return len(self._snapshot.products)
+
+    @staticmethod
+    def product_key(product):
+        """Identity of a product in the catalog: (source, id or name)"""
+        return (product.get('source', 'Unknown'), str(product.get('id') or product.get('name', '')))
+
+    def ingest(self, products):
+        """
+        Insert or replace products in the catalog
+
+        Args:
+            products: Iterable of Product records or normalized product dictionaries
+
+        Returns:
+            Number of products ingested
+        """
+        incoming = {}
+        for product in products:
+            if not product.get('name') or not isinstance(product.get('ph_level'), (int, float)):
+                continue
+            incoming[self.product_key(product)] = Product.from_dict(product)
+
+        if not incoming:
+            return 0
+
+        with self._write_lock:
+            merged = dict(self._snapshot.products)
+            merged.update(incoming)
+            self._snapshot = _CatalogSnapshot(merged)
+        return len(incoming)
+
+    def load_jsonl(self, path):
+        """
+        Ingest a JSONL product file written by catalogIngest.py
+
+        Returns:
+            Number of products ingested
+        """
+        def read_products():
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        yield json.loads(line)
+
+        ingested = self.ingest(read_products())
+        logger.info("Loaded %d products into the catalog from %s", ingested, path)
+        return ingested
+
+    def closest(self, scalp_ph, k=10, category=None, brand=None, source=None):
+        """
+        Find the products whose pH is nearest to a scalp pH
+
+        Args:
+            scalp_ph: Target pH
+            k: Maximum number of products to return
+            category, brand, source: Optional case-insensitive filters
+
+        Returns:
+            List of shared, read-only Product records, closest pH first
+        """
+        snapshot = self._snapshot
+        filters = {
+            field: _index_value(value)
+            for field, value in (("category", category), ("brand", brand), ("source", source))
+            if value
+        }
+
+        # Walk the smallest matching index and check any remaining filters per product
+        index = snapshot.by_ph
+        for field, value in filters.items():
+            candidate = snapshot.by_field[field].get(value)
+            if candidate is None:
+                return []
+            if len(candidate) < len(index):
+                index = candidate
+
+        accept = None
+        if len(filters) > 1 or (filters and index is snapshot.by_ph):
+            def accept(key):
+                product = snapshot.products[key]
+                return all(_index_value(product.get(f)) == v for f, v in filters.items())
+
+        return [snapshot.products[key] for key in index.closest(scalp_ph, k, accept)]
+
+    def values(self, field):
+        """Return the distinct indexed values of `field` (e.g. all categories)"""
+        return sorted(self._snapshot.by_field[field])
+
+    def sync_from_upstream(self, api, page_size=None):
+        """
+        Refresh the catalog from every query the request path can plan
+
+        Args:
+            api: PHPerfectAPIIntegration used to reach the upstream APIs
+            page_size: Products to request per query (defaults to CATALOG_SYNC_PAGE_SIZE)
+
+        Returns:
+            Number of products ingested
+        """
+        if page_size is None:
+            page_size = int(os.getenv("CATALOG_SYNC_PAGE_SIZE", "50"))
+
+        queries = set()
+        for scalp_ph in (4.0, 5.5, 6.5):
+            for source, query, _ in api.plan_product_queries(scalp_ph, ["dandruff", "dryness", "itchiness"]):
+                queries.add((source, query))
+
+        # Collect every query first so the indexes are rebuilt only once
+        products = []
+        for source, query in sorted(queries):
+            try:
+                if source == "OpenBeauty":
+                    products.extend(api._load_beauty_products(query, page_size))
+                else:
+                    products.extend(api._load_sephora_products(query, page_size))
+            except Exception as e:
+                logger.warning("Catalog sync failed for %s query '%s': %s", source, query, e)
+
+        ingested = self.ingest(products)
+        self.last_synced_at = time.time()
+        logger.info("Catalog sync ingested %d products, catalog now holds %d", ingested, len(self))
+        return ingested
+
+    def start_background_sync(self, api, interval):
+        """Sync from upstream now and then every `interval` seconds on a daemon thread"""
+        if self._sync_thread is not None:
+            return
+
+        def run():
+            while not self._stop_sync.is_set():
+                self.sync_from_upstream(api)
+                self._stop_sync.wait(interval)
+
+        self._sync_thread = threading.Thread(target=run, name="phperfect-catalog-sync", daemon=True)
+        self._sync_thread.start()
+
+    def stop_background_sync(self):
+        """Stop the background sync thread after its current pass"""
+        self._stop_sync.set()
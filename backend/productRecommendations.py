@@ -1,14 +1,55 @@
-import requests
+import contextvars
 import json
+import logging
 import time
 import os
-import http.client
-import re
+import sys
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, wait
 from dotenv import load_dotenv
+from rateLimiter import rate_limiter_from_env
+from productCache import ProductCache
+from httpClient import UpstreamHTTPClient
+from circuitBreaker import CircuitBreaker, CircuitOpenError, STATE_VALUES
+from singleFlight import SingleFlight
+from recommendationTable import RecommendationTable
+from adviceCache import AdviceCache
+from productCatalog import ProductCatalog
+from productRecord import Product
+from phTrends import describe_trend
+from promptBuilder import PromptBuilder
+from rankingEngine import RankingEngine, is_rankable
+from scoringModel import ScoringModel
+from phExtraction import extract_ph_level, find_ph_in_text, estimate_ph_by_category
+from sephoraCategorizer import SephoraCategorizer
+from metrics import MetricsRegistry
+from structuredLogging import configure_logging
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Extra Sephora queries to run for each reported symptom, in merge order
+SYMPTOM_QUERIES = [
+    ("dandruff", "dandruff shampoo"),
+    ("dryness", "dry scalp treatment"),
+    ("itchiness", "itchy scalp relief"),
+]
+
+# Catalog categories standing in for the symptom queries once the catalog is warm
+# (scoringConfig.json's symptom_categories take precedence when configured)
+SYMPTOM_CATEGORIES = {
+    "dandruff": ["Shampoo", "Treatment", "Scalp Care"],
+    "dryness": ["Conditioner", "Mask", "Oil", "Serum"],
+    "itchiness": ["Treatment", "Scalp Care", "Serum"],
+}
+
+# Catalog products added per symptom category, like the 2 per symptom query of the live plan
+CATALOG_SYMPTOM_K = 2
+
+# Advice text served when OpenAI could not be reached in time
+ADVICE_UNAVAILABLE = "Unable to generate additional recommendations."
+
 class PHPerfectAPIIntegration:
     """
     Class to handle integration with OpenAI API, Open Beauty Facts API, and Sephora API
@@ -21,11 +62,216 @@ class PHPerfectAPIIntegration:
         if not self.openai_api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
             
-        self.openbeauty_api_url = "https://world.openbeautyfacts.org/api/v0"
+        self.openbeauty_api_url = os.getenv("OPENBEAUTY_API_URL", "https://world.openbeautyfacts.org/api/v0")
+        self.sephora_api_url = os.getenv("SEPHORA_API_URL", "https://sephora.p.rapidapi.com")
+        self.openai_api_url = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
         self.sephora_api_key = os.getenv("SEPHORA_API_KEY")
         
-        # Product cache to avoid repeated API calls
-        self.product_cache = {}
+        # Per-stage latency histograms and upstream/cache counters for /api/metrics
+        self.metrics = MetricsRegistry()
+        
+        # Per-upstream circuit breakers, shared with the async integration
+        self.circuit_breakers = {
+            name: CircuitBreaker.from_env(name) for name in ("openbeauty", "sephora", "openai")
+        }
+        self.metrics.add_collector(self._circuit_metrics)
+        
+        # Pooled keep-alive HTTP client shared by all three upstreams
+        pool_size = int(os.getenv("UPSTREAM_POOL_SIZE", "10"))
+        self.http = UpstreamHTTPClient.from_env(metrics=self.metrics)
+        self.http.mount_host(
+            self.openbeauty_api_url, pool_size=pool_size, name="openbeauty",
+            breaker=self.circuit_breakers["openbeauty"]
+        )
+        self.http.mount_host(
+            self.sephora_api_url, pool_size=pool_size, name="sephora",
+            breaker=self.circuit_breakers["sephora"]
+        )
+        self.http.mount_host(
+            self.openai_api_url,
+            pool_size=pool_size,
+            read_timeout=float(os.getenv("OPENAI_READ_TIMEOUT", "30")),
+            retry_methods=("POST",),
+            retry_reads=False,
+            name="openai",
+            breaker=self.circuit_breakers["openai"]
+        )
+        
+        # Shared token bucket for outbound RapidAPI calls (all threads and workers)
+        self.sephora_rate_limiter = rate_limiter_from_env("SEPHORA", default_rate=5, default_burst=5)
+        
+        # Product cache to avoid repeated API calls, keyed by (source, query, count)
+        self.product_cache = ProductCache.from_env()
+        
+        # Identical concurrent product loads and advice prompts share one upstream call
+        self.product_flight = SingleFlight("products")
+        self.advice_flight = SingleFlight("advice")
+        self.single_flights = [self.product_flight, self.advice_flight]
+        self.metrics.add_collector(self._single_flight_metrics)
+        
+        # OpenAI advice cache keyed by (pH band, symptom set, product set) fingerprint
+        self.advice_cache = AdviceCache.from_env()
+        self.metrics.add_collector(self._cache_metrics)
+        
+        # Local product catalog, served instead of live fetches once it is warm
+        self.catalog = ProductCatalog()
+        self.catalog_min_products = int(os.getenv("CATALOG_MIN_PRODUCTS", "50"))
+        self.catalog_top_k = int(os.getenv("CATALOG_TOP_K", "20"))
+        
+        # Precomputed responses per (pH bucket, symptom set), served before the live path
+        self.recommendation_table = RecommendationTable(
+            os.getenv("RECOMMENDATION_TABLE_PATH"), [symptom for symptom, _ in SYMPTOM_QUERIES], band=self._ph_band
+        )
+        
+        # Table-driven Sephora categorizer, memoized by product id
+        self.sephora_categorizer = SephoraCategorizer()
+        
+        # Columnar top-k ranking, weighted by scoringConfig.json (or SCORING_CONFIG_PATH)
+        self.ranker = RankingEngine(self, scoring_model=ScoringModel.from_config())
+        
+        # Worker pool and overall deadline for concurrent source fetches
+        self.fetch_deadline = float(os.getenv("FETCH_DEADLINE_SECONDS", "8"))
+        self.fetch_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("FETCH_MAX_WORKERS", "8")),
+            thread_name_prefix="phperfect-fetch"
+        )
+        
+        # OpenAI calls run on their own pool so a request waits at most ADVICE_DEADLINE_SECONDS
+        self.advice_deadline = float(os.getenv("ADVICE_DEADLINE_SECONDS", "30"))
+        self.advice_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("ADVICE_MAX_WORKERS", str(pool_size))),
+            thread_name_prefix="phperfect-advice"
+        )
+        
+        # Advice prompts are held to PROMPT_INPUT_TOKEN_BUDGET, replies to *_MAX_TOKENS
+        self.prompt_builder = PromptBuilder.from_env(metrics=self.metrics)
+        
+    def plan_product_queries(self, scalp_ph, symptoms=None):
+        """
+        Plan every upstream query needed for a scalp pH and symptom set
+        
+        Args:
+            scalp_ph: User's scalp pH measurement
+            symptoms: List of symptoms reported by the user
+            
+        Returns:
+            List of (source, query, count) tuples in merge order
+        """
+        symptoms = symptoms or []
+        
+        # Get products based on scalp pH
+        query = "scalp care"
+        if scalp_ph > 6.0:
+            query = "oily scalp"
+        elif scalp_ph < 4.5:
+            query = "dry scalp"
+            
+        plan = [
+            ("OpenBeauty", "shampoo", 3),
+            ("Sephora", query, 3)
+        ]
+        
+        # Add more targeted products based on symptoms
+        for symptom, symptom_query in SYMPTOM_QUERIES:
+            if symptom in symptoms:
+                plan.append(("Sephora", symptom_query, 2))
+                
+        return plan
+    
+    def _run_planned_query(self, source, query, count):
+        """Run a single planned query against its upstream source"""
+        if source == "OpenBeauty":
+            return self.fetch_beauty_products(category=query, count=count)
+        return self.fetch_sephora_products(query=query, count=count)
+    
+    def fetch_planned_products(self, plan, deadline=None):
+        """
+        Run planned source queries concurrently and merge their results
+        
+        Args:
+            plan: List of (source, query, count) tuples from plan_product_queries
+            deadline: Overall time budget in seconds (defaults to FETCH_DEADLINE_SECONDS)
+            
+        Returns:
+            List of product dictionaries, merged in plan order. Queries that miss
+            the deadline are dropped so a slow source only costs its own products.
+        """
+        results = self._run_planned_queries(plan, deadline=deadline)
+        
+        products = []
+        for planned_query in plan:
+            products.extend(results.get(planned_query, []))
+                
+        return products
+    
+    def _run_planned_queries(self, plan, deadline=None):
+        """
+        Run distinct planned queries concurrently within the deadline
+        
+        Returns:
+            Dict mapping each (source, query, count) that finished in time to its products
+        """
+        if deadline is None:
+            deadline = self.fetch_deadline
+            
+        distinct = list(dict.fromkeys(plan))
+        futures = [
+            # Each worker runs in a copy of the caller's context so logs keep the request id
+            self.fetch_executor.submit(contextvars.copy_context().run, self._run_planned_query, source, query, count)
+            for source, query, count in distinct
+        ]
+        wait(futures, timeout=deadline)
+        
+        results = {}
+        for planned_query, future in zip(distinct, futures):
+            source, query, _ = planned_query
+            if not future.done():
+                future.cancel()
+                logger.warning("%s query '%s' missed the %ss deadline, skipping", source, query, deadline)
+                continue
+            try:
+                results[planned_query] = future.result()
+            except Exception as e:
+                logger.warning("%s query '%s' failed: %s", source, query, e)
+                
+        return results
+    
+    def fetch_products_for(self, scalp_ph, symptoms=None, deadline=None):
+        """Plan and concurrently fetch all source products for a scalp pH and symptom set"""
+        plan = self.plan_product_queries(scalp_ph, symptoms)
+        return self.fetch_planned_products(plan, deadline=deadline)
+        
+    def catalog_products_for(self, scalp_ph, symptoms=None, category=None):
+        """
+        Serve the products closest to a scalp pH from the local catalog
+        
+        Like the live plan, the pH-nearest products come first and each
+        reported symptom adds the pH-nearest products of the categories that
+        help it, so symptoms shape the candidates as their queries would.
+        
+        Returns:
+            List of product dictionaries, or None while the catalog holds fewer
+            than CATALOG_MIN_PRODUCTS products and live fetches should be used
+        """
+        if len(self.catalog) < self.catalog_min_products:
+            return None
+        products = self.catalog.closest(scalp_ph, k=self.catalog_top_k, category=category)
+        if not symptoms or category:
+            return products
+        
+        model = self.ranker.scoring_model
+        symptom_categories = model.symptom_categories if model is not None and model.symptom_categories else SYMPTOM_CATEGORIES
+        seen = {ProductCatalog.product_key(p) for p in products}
+        for symptom, _ in SYMPTOM_QUERIES:
+            if symptom not in symptoms:
+                continue
+            for symptom_category in symptom_categories.get(symptom, ()):
+                for product in self.catalog.closest(scalp_ph, k=CATALOG_SYMPTOM_K, category=symptom_category):
+                    key = ProductCatalog.product_key(product)
+                    if key not in seen:
+                        seen.add(key)
+                        products.append(product)
+        return products
         
     def fetch_beauty_products(self, category=None, count=20):
         """
@@ -38,56 +284,76 @@ class PHPerfectAPIIntegration:
         Returns:
             List of product dictionaries
         """
-        print(f"Fetching {count} beauty products from Open Beauty Facts API...")
+        logger.debug("Fetching %s beauty products from Open Beauty Facts API", count)
         
-        try:
-            # Construct search URL based on category
-            if category:
-                search_url = f"{self.openbeauty_api_url}/search?categories_tags={category}&page_size={count}"
-            else:
-                search_url = f"{self.openbeauty_api_url}/search?categories_tags=Hair&page_size={count}"
-                
-            # Make API request
-            response = requests.get(search_url)
-            response.raise_for_status()
+        cache_key = ("OpenBeauty", category or "Hair", count)
+        if self.circuit_breakers["openbeauty"].is_open():
+            return self._fallback_products(cache_key)
             
-            # Parse response
-            result = response.json()
-            products = result.get('products', [])
+        try:
+            processed_products = self.product_cache.get_or_load(
+                cache_key, lambda: self.product_flight.do(cache_key, lambda: self._load_beauty_products(category, count))
+            )
             
-            if not products:
-                print("No products found. Using default product set.")
+            if not processed_products:
+                logger.info("No products found. Using default product set.")
                 return self._generate_default_products(source="OpenBeauty")
                 
-            # Process products
-            processed_products = []
-            for product in products:
-                # Skip products with missing or "Unknown" names
-                product_name = product.get('product_name', '').strip()
-                if not product_name or product_name.lower() == 'unknown product':
-                    continue
-                    
-                # Extract relevant information
-                processed_product = {
-                    'id': product.get('_id', ''),
-                    'name': product_name,
-                    'brand': product.get('brands', 'Unknown Brand'),
-                    'category': product.get('categories_tags', ['unknown'])[0].replace('en:', ''),
-                    'ingredients': product.get('ingredients_text', 'Not specified'),
-                    'ph_level': self._extract_ph_level(product),
-                    'image_url': product.get('image_url', ''),
-                    'source': 'OpenBeauty'
-                }
-                
-                processed_products.append(processed_product)
-                
-            print(f"Successfully fetched {len(processed_products)} products from OpenBeauty")
-            return processed_products
+            return list(processed_products)
             
+        except CircuitOpenError:
+            return self._fallback_products(cache_key)
         except Exception as e:
-            print(f"Error fetching products from Open Beauty Facts API: {e}")
-            print("Using default product set instead.")
-            return self._generate_default_products(source="OpenBeauty")
+            logger.warning("Error fetching products from Open Beauty Facts API, using fallback products: %s", e)
+            return self._fallback_products(cache_key)
+    
+    def _fetch_beauty_page(self, category=None, count=20, page=1):
+        """Request one search page from Open Beauty Facts and return its raw product list"""
+        # Construct search parameters based on category
+        params = {"categories_tags": category or "Hair", "page_size": count, "page": page}
+            
+        # Make API request over the pooled connection
+        with self.metrics.span("fetch", source="openbeauty"):
+            response = self.http.get(f"{self.openbeauty_api_url}/search", params=params)
+            response.raise_for_status()
+            result = response.json()
+        return result.get('products', [])
+    
+    def _load_beauty_products(self, category=None, count=20, page=1):
+        """Request and parse one search page from Open Beauty Facts, bypassing the cache"""
+        raw_products = self._fetch_beauty_page(category, count, page)
+        
+        # Parse response
+        with self.metrics.span("parse", source="openbeauty"):
+            processed_products = self._parse_beauty_products(raw_products)
+        
+        logger.debug("Fetched %d products from OpenBeauty", len(processed_products))
+        return processed_products
+    
+    def _parse_beauty_products(self, products):
+        """Normalize raw Open Beauty Facts products into Product records"""
+        processed_products = []
+        for product in products:
+            # Skip products with missing or "Unknown" names
+            product_name = product.get('product_name', '').strip()
+            if not product_name or product_name.lower() == 'unknown product':
+                continue
+                
+            # Extract relevant information
+            processed_product = Product(
+                id=product.get('_id', ''),
+                name=product_name,
+                brand=product.get('brands', 'Unknown Brand'),
+                category=product.get('categories_tags', ['unknown'])[0].replace('en:', ''),
+                ingredients=product.get('ingredients_text', 'Not specified'),
+                ph_level=self._extract_ph_level(product),
+                image_url=product.get('image_url', ''),
+                source='OpenBeauty'
+            )
+            
+            processed_products.append(processed_product)
+            
+        return processed_products
     
     def fetch_sephora_products(self, query=None, count=10):
         """
@@ -100,121 +366,162 @@ class PHPerfectAPIIntegration:
         Returns:
             List of product dictionaries
         """
-        print(f"Fetching {count} products from Sephora API for query: '{query}'...")
+        logger.debug("Fetching %s products from Sephora API for query '%s'", count, query)
         
         # If no query provided, use a default pH-related query
         if not query:
             query = "scalp care"
             
-        try:
-            # Format the query for URL
-            formatted_query = query.replace(" ", "%20")
-            
-            # Set up connection
-            conn = http.client.HTTPSConnection("sephora.p.rapidapi.com")
+        cache_key = ("Sephora", query, count)
+        if self.circuit_breakers["sephora"].is_open():
+            return self._fallback_products(cache_key)
             
-            # Set headers with API key
-            headers = {
-                'x-rapidapi-key': self.sephora_api_key,
-                'x-rapidapi-host': "sephora.p.rapidapi.com"
-            }
-            
-            # Make the request
-            endpoint = f"/us/products/v2/search?q={formatted_query}&pageSize={count}&currentPage=1"
-            print(f"Making request to: {endpoint}")
+        try:
+            processed_products = self.product_cache.get_or_load(
+                cache_key, lambda: self.product_flight.do(cache_key, lambda: self._load_sephora_products(query, count))
+            )
             
-            conn.request("GET", endpoint, headers=headers)
+            if not processed_products:
+                logger.info("No products found from Sephora API. Using default product set.")
+                return self._generate_default_products(source="Sephora")
+                
+            return list(processed_products)
             
-            # Get response
-            res = conn.getresponse()
-            data = res.read()
+        except CircuitOpenError:
+            return self._fallback_products(cache_key)
+        except Exception as e:
+            logger.warning("Error fetching products from Sephora API, using fallback products: %s", e)
+            return self._fallback_products(cache_key)
+    
+    def _fetch_sephora_page(self, query, count, page=1):
+        """Request one search page from Sephora and return the decoded response, or None"""
+        # Set headers with API key
+        headers = self._sephora_headers()
+        
+        # Make the request
+        endpoint = f"{self.sephora_api_url}/us/products/v2/search"
+        params = {"q": query, "pageSize": count, "currentPage": page}
+        logger.debug("Making request to %s with %s", endpoint, params)
+        
+        # Respect the RapidAPI rate limit before going upstream
+        with self.metrics.span("rate_limit_wait", source="sephora"):
+            self.sephora_rate_limiter.acquire()
+        with self.metrics.span("fetch", source="sephora"):
+            response = self.http.get(endpoint, params=params, headers=headers)
+            response.raise_for_status()
+        
+        if not response.content:
+            logger.info("No response data from Sephora API")
+            return None
             
-            # Get raw response
-            raw_response = data.decode("utf-8") if data else None
+        # Parse JSON response
+        try:
+            return response.json()
+        except ValueError as e:
+            logger.warning("Failed to parse Sephora JSON: %s", e)
+            return None
+    
+    def _load_sephora_products(self, query, count, page=1):
+        """Request and parse one search page from Sephora, bypassing the cache"""
+        response_data = self._fetch_sephora_page(query, count, page)
+        if response_data is None:
+            return []
+        
+        with self.metrics.span("parse", source="sephora"):
+            processed_products = self._parse_sephora_products(response_data, query)
+        
+        logger.debug("Fetched %d products from Sephora", len(processed_products))
+        return processed_products
+    
+    def _fallback_products(self, cache_key):
+        """
+        Products to serve when an upstream is failing or its circuit is open
+        
+        Returns:
+            The last cached result for `cache_key` however old it is, or the
+            default product set for the source when nothing was ever cached
+        """
+        cached = self.product_cache.peek(cache_key)
+        if cached:
+            logger.debug("Serving last cached %s products for '%s'", cache_key[0], cache_key[1])
+            return list(cached)
+        return self._generate_default_products(source=cache_key[0])
+    
+    def _sephora_headers(self):
+        """RapidAPI authentication headers for Sephora requests"""
+        return {
+            'x-rapidapi-key': self.sephora_api_key,
+            'x-rapidapi-host': "sephora.p.rapidapi.com"
+        }
+    
+    @staticmethod
+    def _sephora_products_data(response_data):
+        """The raw product list of a Sephora search response, whichever shape it came in"""
+        products_data = []
+        if isinstance(response_data, dict):
+            if 'products' in response_data and isinstance(response_data['products'], list):
+                products_data = response_data['products']
+            elif 'data' in response_data and isinstance(response_data['data'], dict) and 'products' in response_data['data']:
+                products_data = response_data['data']['products']
+            elif 'items' in response_data and isinstance(response_data['items'], list):
+                products_data = response_data['items']
+            else:
+                # Log available keys for debugging
+                logger.warning("Unexpected Sephora response structure. Keys: %s", list(response_data.keys()))
+        return products_data
+    
+    def _parse_sephora_products(self, response_data, query=None):
+        """Normalize a raw Sephora search response into Product records"""
+        # Extract products array safely
+        products_data = self._sephora_products_data(response_data)
+        
+        # Process products
+        processed_products = []
+        categorize_seconds = 0.0
+        
+        for product in products_data:
+            if not isinstance(product, dict):
+                logger.debug("Skipping non-dict product: %s", type(product))
+                continue
             
-            if not raw_response:
-                print("No response data from Sephora API. Using default products.")
-                return self._generate_default_products(source="Sephora")
-                
-            # Parse JSON response
-            try:
-                response_data = json.loads(raw_response)
-            except json.JSONDecodeError as e:
-                print(f"Failed to parse JSON: {e}")
-                return self._generate_default_products(source="Sephora")
+            # Extract basic product info with safer access
+            product_id = product.get('productId', product.get('id', ''))
+            product_name = product.get('displayName', product.get('name', 'Unknown Product'))
+            brand_name = product.get('brandName', product.get('brand', 'Unknown Brand'))
+            price = product.get('currentSku', {}).get('listPrice', 'Price not available')
             
-            # Close connection
-            conn.close()
-            
-            # Extract products array safely
-            products_data = []
-            if isinstance(response_data, dict):
-                if 'products' in response_data and isinstance(response_data['products'], list):
-                    products_data = response_data['products']
-                elif 'data' in response_data and isinstance(response_data['data'], dict) and 'products' in response_data['data']:
-                    products_data = response_data['data']['products']
-                elif 'items' in response_data and isinstance(response_data['items'], list):
-                    products_data = response_data['items']
-                else:
-                    # Log available keys for debugging
-                    print(f"Unexpected response structure. Keys: {list(response_data.keys())}")
+            # Extract rating safely
+            rating = None
+            if 'rating' in product:
+                rating = product.get('rating')
+            elif 'reviews' in product:
+                reviews = product.get('reviews', {})
+                if isinstance(reviews, dict):
+                    rating = reviews.get('rating')
             
-            if not products_data:
-                print("No products found from Sephora API. Using backup approach...")
-                return self._generate_default_products(source="Sephora")
-                
-            # Process products
-            processed_products = []
+            # Determine category and estimate pH (timed in aggregate, one observation per page)
+            categorize_start = time.perf_counter()
+            category, ph_level = self._categorize_sephora_product(product, query)
+            categorize_seconds += time.perf_counter() - categorize_start
             
-            for product in products_data:
-                if not isinstance(product, dict):
-                    print(f"Skipping non-dict product: {type(product)}")
-                    continue
-                
-                # Extract basic product info with safer access
-                product_id = product.get('productId', product.get('id', ''))
-                product_name = product.get('displayName', product.get('name', 'Unknown Product'))
-                brand_name = product.get('brandName', product.get('brand', 'Unknown Brand'))
-                price = product.get('currentSku', {}).get('listPrice', 'Price not available')
-                
-                # Extract rating safely
-                rating = None
-                if 'rating' in product:
-                    rating = product.get('rating')
-                elif 'reviews' in product:
-                    reviews = product.get('reviews', {})
-                    if isinstance(reviews, dict):
-                        rating = reviews.get('rating')
-                
-                # Determine category and estimate pH
-                category, ph_level = self._categorize_sephora_product(product, query)
-                
-                # Create processed product entry
-                processed_product = {
-                    'id': product_id,
-                    'name': product_name,
-                    'brand': brand_name,
-                    'category': category,
-                    'ingredients': self._extract_sephora_ingredients(product),
-                    'ph_level': ph_level,
-                    'image_url': self._extract_image_url(product),
-                    'rating': rating,
-                    'price': price,
-                    'source': 'Sephora'
-                }
-                
-                processed_products.append(processed_product)
-                
-                # Add a small delay to avoid rate limiting
-                time.sleep(0.2)
+            # Create processed product entry
+            processed_product = Product(
+                id=product_id,
+                name=product_name,
+                brand=brand_name,
+                category=category,
+                ingredients=self._extract_sephora_ingredients(product),
+                ph_level=ph_level,
+                image_url=self._extract_image_url(product),
+                rating=rating,
+                price=price,
+                source='Sephora'
+            )
             
-            print(f"Successfully fetched {len(processed_products)} products from Sephora")
-            return processed_products
+            processed_products.append(processed_product)
             
-        except Exception as e:
-            print(f"Error fetching products from Sephora API: {e}")
-            print("Using default Sephora product set instead.")
-            return self._generate_default_products(source="Sephora")
+        self.metrics.observe_stage("categorize", categorize_seconds, source="sephora")
+        return processed_products
     
     def _extract_image_url(self, product):
         """Extract image URL safely from product data"""
@@ -246,58 +553,7 @@ class PHPerfectAPIIntegration:
         Returns:
             Tuple of (category, ph_level)
         """
-        # Extract name and attributes for categorization
-        product_name = product.get('displayName', '').lower() if isinstance(product.get('displayName'), str) else ''
-        product_type = product.get('productType', '').lower() if isinstance(product.get('productType'), str) else ''
-        
-        # Default pH and category
-        category = 'Hair Care'
-        ph_level = 5.5
-        
-        # Categorize based on product name and type
-        if 'shampoo' in product_name or 'shampoo' in product_type:
-            category = 'Shampoo'
-            ph_level = 5.5
-        elif 'conditioner' in product_name or 'conditioner' in product_type:
-            category = 'Conditioner'
-            ph_level = 4.5
-        elif 'treatment' in product_name or 'treatment' in product_type:
-            category = 'Treatment'
-            ph_level = 5.0
-        elif 'mask' in product_name or 'mask' in product_type:
-            category = 'Mask'
-            ph_level = 5.0
-        elif 'oil' in product_name or 'oil' in product_type:
-            category = 'Oil'
-            ph_level = 5.0
-        elif 'serum' in product_name or 'serum' in product_type:
-            category = 'Serum'
-            ph_level = 5.0
-        elif 'scalp' in product_name or 'scalp' in product_type:
-            category = 'Scalp Care'
-            
-            # Further refinement for scalp products
-            if 'oily' in product_name or 'oily' in product_type:
-                ph_level = 5.0
-            elif 'dry' in product_name or 'dry' in product_type:
-                ph_level = 5.8
-            elif 'dandruff' in product_name or 'dandruff' in product_type:
-                ph_level = 5.2
-        
-        # If original query can provide context, use it
-        if query:
-            query = query.lower()
-            if 'oily' in query:
-                if category == 'Scalp Care':
-                    ph_level = 5.0
-            elif 'dry' in query:
-                if category == 'Scalp Care':
-                    ph_level = 5.8
-            elif 'dandruff' in query:
-                if category == 'Scalp Care':
-                    ph_level = 5.2
-                
-        return category, ph_level
+        return self.sephora_categorizer.categorize(product, query)
     
     def _extract_sephora_ingredients(self, product):
         """Extract ingredients from Sephora product if available"""
@@ -317,77 +573,15 @@ class PHPerfectAPIIntegration:
     
     def _extract_ph_level(self, product):
         """Extract pH level from product data or estimate if not available"""
-        # Try to find explicit pH information
-        if 'ph' in product:
-            try:
-                return float(product['ph'])
-            except (ValueError, TypeError):
-                pass
-                
-        # Look for pH in product name or description
-        for field in ['product_name', 'generic_name', 'ingredients_text']:
-            if field in product and product[field]:
-                ph_match = self._find_ph_in_text(str(product[field]))
-                if ph_match is not None:
-                    return ph_match
-        
-        # Estimate pH based on category if still not found
-        return self._estimate_ph_by_category(product)
+        return extract_ph_level(product)
     
     def _find_ph_in_text(self, text):
         """Find pH level mentioned in text"""
-        import re
-        
-        # Look for patterns like "pH 5.5" or "pH balanced (5.5)"
-        ph_patterns = [
-            r'pH\s*?(\d+\.?\d*)',
-            r'pH\s+balance.*?(\d+\.?\d*)',
-            r'pH\s+level.*?(\d+\.?\d*)'
-        ]
-        
-        for pattern in ph_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                try:
-                    ph_value = float(match.group(1))
-                    if 3 <= ph_value <= 8:  # Validate reasonable pH range
-                        return ph_value
-                except (ValueError, IndexError):
-                    continue
-                    
-        return None
+        return find_ph_in_text(text)
         
     def _estimate_ph_by_category(self, product):
         """Estimate pH based on product category"""
-        # Default pH ranges by category
-        category_ph = {
-            'shampoo': 5.5,
-            'conditioner': 4.5,
-            'hair mask': 4.8,
-            'treatment': 5.0,
-            'oil': 5.0,
-            'serum': 5.0,
-            'spray': 5.5
-        }
-        
-        # Check product category
-        categories = []
-        if 'categories' in product and product['categories']:
-            categories.append(product['categories'].lower())
-            
-        if 'categories_tags' in product:
-            for tag in product['categories_tags']:
-                if isinstance(tag, str):
-                    categories.append(tag.lower().replace('en:', ''))
-        
-        # Find matching category and return pH
-        for category in categories:
-            for key, ph in category_ph.items():
-                if key in category:
-                    return ph
-                    
-        # Default pH if no category matched
-        return 5.5  # Average pH for hair products
+        return estimate_ph_by_category(product)
     
     def _generate_default_products(self, source="Default"):
         """Generate default product set for testing when API fails"""
@@ -516,60 +710,31 @@ class PHPerfectAPIIntegration:
             f"it can help {needs}.{rating_info}{price_info}"
         )
     
-    def _create_recommendation_prompt(self, scalp_ph, symptoms, products):
-        """Create a detailed prompt for OpenAI recommendation generation"""
-        # Determine scalp condition based on pH
+    def _describe_scalp_condition(self, scalp_ph):
+        """Describe the scalp condition band a pH reading falls into"""
         if scalp_ph < 4.5:
-            condition = "dry and potentially irritated scalp"
+            return "dry and potentially irritated scalp"
         elif scalp_ph > 6.0:
-            condition = "oily scalp"
+            return "oily scalp"
         elif 5.5 <= scalp_ph <= 6.0:
-            condition = "slightly oily scalp"
+            return "slightly oily scalp"
         elif 4.5 <= scalp_ph < 5.0:
-            condition = "sensitive scalp"
+            return "sensitive scalp"
         else:  # 5.0 <= scalp_ph < 5.5
-            condition = "balanced scalp"
-            
-        # Create base prompt
-        prompt = f"""
-        The user has a scalp pH of {scalp_ph}, which indicates a {condition}.
-        """
-        
-        # Add symptoms if available
-        if symptoms and len(symptoms) > 0:
-            prompt += f"\nThey report the following symptoms: {', '.join(symptoms)}."
-            
-        # Add product information from APIs
-        prompt += "\n\nBased on their scalp pH, these are some recommended products we found from our database:"
-        
-        for i, product in enumerate(products[:3], 1):
-            source = product.get('source', 'Unknown')
-            rating_info = f" | Rating: {product['rating']} stars" if product.get('rating') else ""
-            price_info = f" | Price: {product['price']}" if product.get('price') and product['price'] != 'Price not available' else ""
-            
-            prompt += f"""
-            {i}. {product['name']} by {product['brand']} (pH: {product['ph_level']}) - Source: {source}{rating_info}{price_info}
-               Description: {product['category']} with ingredients: {product['ingredients'][:100]}...
-            """
-            
-        # Instruction for response
-        prompt += """
-        Please provide:
-        
-        1. A brief explanation of what this scalp pH means for their hair health.
-        
-        2. A concise overview of why the products from our database are suitable for this pH level and symptoms.
-        
-        3. General recommendations for hair care routines based on this scalp pH.
-        
-        4. Tips for effectively using hair products with this scalp pH.
-        
-        Format your response to be conversational and informative. Do NOT list additional specific product recommendations - we will present our own product list to the user separately.
-        """
-        
-        return prompt
+            return "balanced scalp"
+    
+    def _ph_band(self, scalp_ph):
+        """Condition band and pH-driven product query of a reading; readings in one band get the same advice inputs"""
+        return self._describe_scalp_condition(scalp_ph), self.plan_product_queries(scalp_ph)[1][1]
+    
+    def _create_recommendation_prompt(self, scalp_ph, symptoms, products, trend=None, request_type="advice"):
+        """Create the advice prompt, compacted to the input token budget (see promptBuilder)"""
+        return self.prompt_builder.user_prompt(
+            scalp_ph, self._describe_scalp_condition(scalp_ph), symptoms, products[:3],
+            history=describe_trend(trend), request_type=request_type
+        )
 
-    def get_openai_recommendation(self, scalp_ph, symptoms=None, products=None):
+    def get_openai_recommendation(self, scalp_ph, symptoms=None, products=None, debug=False, trend=None):
         """
         Get personalized product recommendations using OpenAI API
         
@@ -577,6 +742,8 @@ class PHPerfectAPIIntegration:
             scalp_ph: User's scalp pH measurement
             symptoms: List of symptoms reported by the user
             products: List of product dictionaries to recommend from
+            debug: Include per-factor score contributions for each product
+            trend: phTrends summary of the user's recent readings, added to the advice prompt
             
         Returns:
             Dictionary containing recommendation text and top products
@@ -589,49 +756,13 @@ class PHPerfectAPIIntegration:
             if not products or len(products) == 0:
                 products = self._generate_default_products()
             
-            # Prepare the products with pH difference
-            enriched_products = self._enrich_products(products, scalp_ph)
-            
-            # Get general advice from OpenAI
-            advice_text = ""
-            
-            try:
-                # Call OpenAI API to get advice about scalp pH
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.openai_api_key}"
-                }
-                
-                # Create prompt for OpenAI
-                prompt = self._create_recommendation_prompt(scalp_ph, symptoms, enriched_products[:3])
-                
-                payload = {
-                    "model": "gpt-3.5-turbo",
-                    "messages": [
-                        {"role": "system", "content": "You are a scalp health expert providing personalized hair care advice."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "max_tokens": 1000
-                }
-                
-                response = requests.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers=headers,
-                    data=json.dumps(payload)
-                )
-                
-                response.raise_for_status()
-                result = response.json()
-                
-                # Extract advice text
-                advice_text = result["choices"][0]["message"]["content"]
-                
-            except Exception as e:
-                print(f"Error getting recommendations from OpenAI: {e}")
-                advice_text = "Unable to generate additional recommendations."
+            # Get general advice from OpenAI, reusing cached advice for identical inputs
+            prompt_products = self._prompt_products(products, scalp_ph)
+            advice_key = self._advice_key(scalp_ph, symptoms, prompt_products, trend)
+            advice_text = self._get_advice(advice_key, scalp_ph, symptoms, prompt_products, trend)
             
             # Select top products based on pH match
-            top_products = sorted(enriched_products, key=lambda x: x['ph_difference'])[:10]
+            top_products = self._rank_products(products, scalp_ph, symptoms=symptoms, debug=debug)
             
             return {
                 "advice_text": advice_text,
@@ -641,21 +772,303 @@ class PHPerfectAPIIntegration:
             }
             
         except Exception as e:
-            print(f"Unexpected error in recommendation process: {e}")
+            logger.exception("Unexpected error in recommendation process: %s", e)
             return {
                 "error": f"Failed to get recommendations: {str(e)}",
                 "recommended_products": self._enrich_products(products, scalp_ph)[:10] if products else [],
             }
     
+    def _advice_key(self, scalp_ph, symptoms, prompt_products, trend=None, request_type="advice"):
+        """Fingerprint of the inputs that determine the advice prompt and its reply cap"""
+        return self.advice_cache.fingerprint(
+            self._describe_scalp_condition(scalp_ph), scalp_ph, symptoms, prompt_products,
+            history=describe_trend(trend), max_tokens=self.prompt_builder.max_tokens[request_type]
+        )
+    
+    def _get_advice(self, advice_key, scalp_ph, symptoms, prompt_products, trend=None):
+        """
+        Return cached advice for the key, asking OpenAI (and caching the answer) on a miss
+        
+        The OpenAI call runs on the advice pool and is waited for at most
+        ADVICE_DEADLINE_SECONDS; a call that misses it keeps running and still
+        caches its answer for later requests.
+        """
+        advice_text = self.advice_cache.get(advice_key)
+        
+        if advice_text is None:
+            future = self._submit_advice_request(advice_key, scalp_ph, symptoms, prompt_products, trend)
+            try:
+                advice_text = future.result(timeout=self.advice_deadline)
+            except TimeoutError:
+                logger.warning("OpenAI advice missed the %ss deadline", self.advice_deadline)
+            if advice_text is None:
+                advice_text = ADVICE_UNAVAILABLE
+                
+        return advice_text
+    
+    def _submit_advice_request(self, advice_key, scalp_ph, symptoms, prompt_products, trend=None):
+        """
+        Ask OpenAI for advice on the advice pool, caching the answer when it arrives
+        
+        Returns:
+            Future for the advice text, shared with any identical prompt already in flight
+        """
+        def request_and_cache():
+            advice_text = self._request_openai_advice(scalp_ph, symptoms, prompt_products, trend)
+            if advice_text is not None:
+                self.advice_cache.put(advice_key, advice_text)
+            return advice_text
+            
+        return self.advice_flight.share(
+            advice_key, lambda: self.advice_executor.submit(contextvars.copy_context().run, request_and_cache)
+        )
+    
+    def get_batch_recommendations(self, items, deadline=None):
+        """
+        Get recommendations for many (scalp_ph, symptoms) readings at once
+        
+        Every distinct upstream query needed by any item is fetched once, and
+        items whose advice prompts share a fingerprint share one OpenAI call.
+        
+        Args:
+            items: List of dicts with 'scalp_ph' and optional 'symptoms'
+            deadline: Overall time budget in seconds for the upstream fetches
+            
+        Returns:
+            List of per-item results in input order. Each is either the same
+            dictionary get_openai_recommendation returns or {"error": ...}.
+        """
+        results = [None] * len(items)
+        valid = []
+        
+        for i, item in enumerate(items):
+            scalp_ph = item.get('scalp_ph', 5.5) if isinstance(item, dict) else None
+            symptoms = item.get('symptoms', []) if isinstance(item, dict) else None
+            if isinstance(scalp_ph, bool) or not isinstance(scalp_ph, (int, float)) or not isinstance(symptoms, list):
+                results[i] = {"error": "Each item needs a numeric scalp_ph and a list of symptoms"}
+                continue
+            valid.append((i, scalp_ph, symptoms))
+            
+        # Fetch the union of needed source queries once (or serve from the catalog)
+        plans = {}
+        for i, scalp_ph, symptoms in valid:
+            if self.catalog_products_for(scalp_ph) is None:
+                plans[i] = self.plan_product_queries(scalp_ph, symptoms)
+        union = [q for plan in plans.values() for q in plan]
+        fetched = self._run_planned_queries(union, deadline=deadline) if union else {}
+        
+        # Enrich per item and group items by advice fingerprint
+        prepared = {}
+        groups = {}
+        for i, scalp_ph, symptoms in valid:
+            try:
+                if i in plans:
+                    products = [p for q in plans[i] for p in fetched.get(q, [])]
+                else:
+                    products = self.catalog_products_for(scalp_ph, symptoms)
+                if not products:
+                    products = self._generate_default_products()
+                    
+                prompt_products = self._prompt_products(products, scalp_ph)
+                advice_key = self._advice_key(scalp_ph, symptoms, prompt_products)
+                prepared[i] = (scalp_ph, symptoms, products, advice_key)
+                groups.setdefault(advice_key, (scalp_ph, symptoms, prompt_products))
+            except Exception as e:
+                logger.warning("Error preparing batch item %d: %s", i, e)
+                results[i] = {"error": f"Failed to get recommendations: {str(e)}"}
+                
+        # Issue each distinct uncached advice prompt once, concurrently, within the advice deadline
+        advice = {}
+        advice_futures = {}
+        for key, args in groups.items():
+            advice[key] = self.advice_cache.get(key)
+            if advice[key] is None:
+                advice_futures[key] = self._submit_advice_request(key, *args)
+        logger.info(
+            "Batch of %d items needs %d source queries and %d advice prompts (%d cached)",
+            len(items), len(fetched), len(groups), len(groups) - len(advice_futures)
+        )
+        wait(advice_futures.values(), timeout=self.advice_deadline)
+        
+        for key, future in advice_futures.items():
+            if not future.done():
+                logger.warning("OpenAI advice missed the %ss deadline", self.advice_deadline)
+                continue
+            try:
+                advice[key] = future.result()
+            except Exception as e:
+                logger.warning("Error getting advice from OpenAI: %s", e)
+        
+        for i, (scalp_ph, symptoms, products, advice_key) in prepared.items():
+            advice_text = advice.get(advice_key) or ADVICE_UNAVAILABLE
+            results[i] = {
+                "advice_text": advice_text,
+                "recommended_products": self._rank_products(products, scalp_ph, symptoms=symptoms),
+                "scalp_ph": scalp_ph,
+                "symptoms": symptoms
+            }
+            
+        return results
+    
+    def _build_openai_request(self, scalp_ph, symptoms, products, stream=False, trend=None):
+        """Build the headers and JSON payload for an advice chat completion"""
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.openai_api_key}"
+        }
+        
+        # Create prompt for OpenAI
+        request_type = "stream" if stream else "advice"
+        with self.metrics.span("prompt_build"):
+            prompt = self._create_recommendation_prompt(scalp_ph, symptoms, products, trend, request_type)
+        
+        payload = {
+            "model": "gpt-3.5-turbo",
+            "messages": self.prompt_builder.messages(prompt),
+            "max_tokens": self.prompt_builder.max_tokens[request_type]
+        }
+        if stream:
+            payload["stream"] = True
+            
+        return headers, payload
+    
+    def _request_openai_advice(self, scalp_ph, symptoms, products, trend=None):
+        """
+        Ask OpenAI for scalp care advice about the given products
+        
+        Returns:
+            Advice text, or None if the call failed
+        """
+        try:
+            # Call OpenAI API to get advice about scalp pH
+            headers, payload = self._build_openai_request(scalp_ph, symptoms, products, trend=trend)
+            
+            with self.metrics.span("llm", source="openai"):
+                response = self.http.post(
+                    f"{self.openai_api_url}/chat/completions",
+                    headers=headers,
+                    data=json.dumps(payload)
+                )
+                
+                response.raise_for_status()
+                result = response.json()
+            self.prompt_builder.record_usage(result.get("usage"))
+            
+            # Extract advice text
+            return result["choices"][0]["message"]["content"]
+            
+        except CircuitOpenError:
+            logger.debug("OpenAI circuit is open, skipping advice")
+            return None
+        except Exception as e:
+            logger.warning("Error getting recommendations from OpenAI: %s", e)
+            return None
+    
+    def _stream_openai_advice(self, scalp_ph, symptoms, products):
+        """
+        Stream advice text from the OpenAI chat completions API
+        
+        Yields:
+            Advice text fragments as they arrive from the server-sent event stream
+        """
+        headers, payload = self._build_openai_request(scalp_ph, symptoms, products, stream=True)
+        
+        with self.metrics.span("llm_stream", source="openai"), self.http.post(
+            f"{self.openai_api_url}/chat/completions",
+            headers=headers,
+            data=json.dumps(payload),
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                    
+                chunk = json.loads(data)
+                choices = chunk.get("choices") or [{}]
+                text = choices[0].get("delta", {}).get("content")
+                if text:
+                    yield text
+    
+    def stream_recommendation_events(self, scalp_ph, symptoms=None, products=None):
+        """
+        Produce recommendation results incrementally for a streaming response
+        
+        The ranked product list is emitted first, as soon as it is ready, and
+        the OpenAI advice follows fragment by fragment.
+        
+        Args:
+            scalp_ph: User's scalp pH measurement
+            symptoms: List of symptoms reported by the user
+            products: List of product dictionaries to recommend from
+            
+        Yields:
+            (event, data) tuples: one "products" event, any number of "advice"
+            events, then a final "done" (or "error") event
+        """
+        # Use default products if none provided
+        if not products:
+            products = self._generate_default_products()
+            
+        yield "products", {
+            "recommended_products": self._rank_products(products, scalp_ph, symptoms=symptoms),
+            "scalp_ph": scalp_ph,
+            "symptoms": symptoms
+        }
+        
+        prompt_products = self._prompt_products(products, scalp_ph)
+        advice_key = self._advice_key(scalp_ph, symptoms, prompt_products, request_type="stream")
+        advice_text = self.advice_cache.get(advice_key)
+        
+        if advice_text is not None:
+            yield "advice", {"text": advice_text}
+            yield "done", {"advice_text": advice_text, "cached": True}
+            return
+            
+        fragments = []
+        try:
+            for text in self._stream_openai_advice(scalp_ph, symptoms, prompt_products):
+                fragments.append(text)
+                yield "advice", {"text": text}
+        except Exception as e:
+            logger.warning("Error streaming recommendations from OpenAI: %s", e)
+            yield "error", {"error": ADVICE_UNAVAILABLE}
+            return
+            
+        advice_text = "".join(fragments)
+        if advice_text:
+            self.advice_cache.put(advice_key, advice_text)
+        yield "done", {"advice_text": advice_text, "cached": False}
+    
+    def _rank_products(self, products, scalp_ph, limit=10, symptoms=None, debug=False):
+        """Select and enrich the best matching products by the configured score"""
+        with self.metrics.span("rank"):
+            return self.ranker.top_k(products, scalp_ph, k=limit, symptoms=symptoms, debug=debug)
+    
+    def _prompt_products(self, products, scalp_ph, count=3):
+        """Enrich the first few usable products, in input order, for the advice prompt"""
+        leading = []
+        for product in products:
+            if is_rankable(product):
+                leading.append(product)
+                if len(leading) == count:
+                    break
+        return self._enrich_products(leading, scalp_ph)
+    
     def _enrich_products(self, products, scalp_ph):
         """Enrich products with pH difference, suitability rating, and descriptions"""
+        enrich_start = time.perf_counter()
         enriched = []
         for product in products:
-            if not product.get('name') or product.get('name') == 'Unknown Product':
+            if not is_rankable(product):
                 continue
             
-            # Make a copy to avoid modifying the original
-            p = dict(product)
+            # Make a copy to avoid modifying the original (records are shared)
+            p = product.to_dict() if isinstance(product, Product) else dict(product)
             
             # Calculate pH difference if not already present
             if 'ph_difference' not in p:
@@ -671,20 +1084,73 @@ class PHPerfectAPIIntegration:
                 
             enriched.append(p)
             
+        self.metrics.observe_stage("enrich", time.perf_counter() - enrich_start)
         return enriched
             
+    def _cache_metrics(self):
+        """Product and advice cache counters, read by the metrics registry at scrape time"""
+        lookups, entries = [], []
+        for cache_name, stats in (
+            ("product", self.product_cache.stats()),
+            ("advice", self.advice_cache.stats()),
+            ("recommendation_table", self.recommendation_table.stats())
+        ):
+            for counter, result in (("hits", "hit"), ("stale_hits", "stale_hit"), ("misses", "miss")):
+                if counter in stats:
+                    lookups.append(({"cache": cache_name, "result": result}, stats[counter]))
+            entries.append(({"cache": cache_name}, stats["size"]))
+            
+        yield "cache_lookups_total", "counter", "Product, advice and recommendation table lookups by result", lookups
+        yield "cache_entries", "gauge", "Entries currently held in each cache", entries
+    
+    def _single_flight_metrics(self):
+        """Upstream calls made vs coalesced onto an identical in-flight call, read at scrape time"""
+        flights = [(flight.name, flight.stats()) for flight in self.single_flights]
+        yield "singleflight_calls_total", "counter", "Upstream calls by whether they ran or joined an identical in-flight call", [
+            ({"flight": name, "role": role}, stats[counter])
+            for name, stats in flights for counter, role in (("calls", "leader"), ("coalesced", "coalesced"))
+        ]
+        yield "singleflight_inflight", "gauge", "Distinct upstream calls currently in flight", [
+            ({"flight": name}, stats["inflight"]) for name, stats in flights
+        ]
+    
+    def _circuit_metrics(self):
+        """Circuit breaker state per upstream, read by the metrics registry at scrape time"""
+        breakers = [(name, breaker.stats()) for name, breaker in self.circuit_breakers.items()]
+        yield "circuit_state", "gauge", "Upstream circuit state (0 closed, 1 half-open, 2 open)", [
+            ({"upstream": name}, STATE_VALUES[stats["state"]]) for name, stats in breakers
+        ]
+        yield "circuit_opened_total", "counter", "Times each upstream circuit has opened", [
+            ({"upstream": name}, stats["opened"]) for name, stats in breakers
+        ]
+        yield "circuit_rejected_total", "counter", "Upstream calls skipped because the circuit was open", [
+            ({"upstream": name}, stats["rejected"]) for name, stats in breakers
+        ]
+            
     def save_recommendations_to_file(self, recommendation_data, filename="recommendations.json"):
         """Save recommendation data to a JSON file"""
         try:
             with open(filename, 'w') as f:
                 json.dump(recommendation_data, f, indent=2)
-            print(f"Recommendations saved to {filename}")
+            logger.info("Recommendations saved to %s", filename)
             return True
         except Exception as e:
-            print(f"Error saving recommendations: {e}")
+            logger.error("Error saving recommendations: %s", e)
             return False
 
 if __name__ == "__main__":
+    # Bulk catalog crawl: python3 productRecommendations.py ingest --output catalog.jsonl
+    if len(sys.argv) > 1 and sys.argv[1] == "ingest":
+        from catalogIngest import main as ingest_main
+        sys.exit(ingest_main(sys.argv[2:]))
+        
+    # Precompute every (pH bucket, symptom set) response: python3 productRecommendations.py precompute
+    if len(sys.argv) > 1 and sys.argv[1] == "precompute":
+        from recommendationTable import main as precompute_main
+        sys.exit(precompute_main(sys.argv[2:]))
+        
+    configure_logging()
+    
     # Initialize API integration
     api = PHPerfectAPIIntegration()
     
@@ -0,0 +1,105 @@
+import sys
+from collections.abc import Mapping
+from operator import attrgetter
+
+# Normalized product fields, in the order the API has always returned them
+FIELDS = ('id', 'name', 'brand', 'category', 'ingredients', 'ph_level', 'image_url', 'rating', 'price', 'source')
+
+# Per-request fields _enrich_products adds for one scalp pH
+ENRICHMENT_FIELDS = ('ph_difference', 'suitability', 'description')
+
+# Low-cardinality fields shared by many products; one string object per distinct value
+INTERNED_FIELDS = frozenset(('brand', 'category', 'source'))
+
+_SLOTS = FIELDS + ENRICHMENT_FIELDS
+_SLOT_SET = frozenset(_SLOTS)
+_slot_values = attrgetter(*_SLOTS)
+
+# Marks a field the product does not have; every slot holds a value or this
+_ABSENT = object()
+
+
+class Product(Mapping):
+    """
+    Compact, read-only record for one normalized product
+
+    Replaces the per-product dict: fields live in __slots__, brand, category
+    and source strings are interned, and a field the source did not provide
+    (e.g. rating and price for Open Beauty Facts) is marked absent and left
+    out of to_dict() again. The enrichment fields stay absent on stored
+    records; they are computed per request for the winning products only,
+    once _enrich_products has turned them into response dicts.
+
+    Records support the read side of the dict interface (p['ph_level'],
+    p.get('rating'), 'ph_difference' in p, dict(p)), so ranking and scoring
+    code handles records and plain dicts alike. They are shared between the
+    catalog, the product cache and concurrent requests, so never assign to
+    one; take a dict with to_dict() instead.
+    """
+
+    __slots__ = _SLOTS + ('_extra',)
+
+    def __init__(self, **fields):
+        for field in _SLOTS:
+            setattr(self, field, fields.pop(field, _ABSENT))
+        for field in INTERNED_FIELDS:
+            value = getattr(self, field)
+            if type(value) is str:
+                setattr(self, field, sys.intern(value))
+        # Anything outside the known fields (e.g. keys added by a newer crawl) is kept as is
+        self._extra = fields or None
+
+    @classmethod
+    def from_dict(cls, product):
+        """Build a record from a product dictionary (or return `product` if it is one already)"""
+        if isinstance(product, cls):
+            return product
+        return cls(**product)
+
+    def __getitem__(self, key):
+        if key in _SLOT_SET:
+            value = getattr(self, key)
+            if value is _ABSENT:
+                raise KeyError(key)
+            return value
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in _SLOT_SET:
+            value = getattr(self, key)
+            return default if value is _ABSENT else value
+        return self._extra.get(key, default) if self._extra is not None else default
+
+    def __contains__(self, key):
+        if key in _SLOT_SET:
+            return getattr(self, key) is not _ABSENT
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for field, value in zip(_SLOTS, _slot_values(self)):
+            if value is not _ABSENT:
+                yield field
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"Product({self.to_dict()!r})"
+
+    def __reduce__(self):
+        return (_from_fields, (self.to_dict(),))
+
+    def to_dict(self):
+        """Return the product as a new dict in the API's JSON shape"""
+        product = {field: value for field, value in zip(_SLOTS, _slot_values(self)) if value is not _ABSENT}
+        if self._extra is not None:
+            product.update(self._extra)
+        return product
+
+
+def _from_fields(fields):
+    return Product(**fields)
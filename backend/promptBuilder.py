@@ -0,0 +1,187 @@
+"""
+Advice prompt assembly under a token budget
+
+The fixed parts of the advice prompt (system message, instructions) are
+compacted once at import instead of being rebuilt from indented f-strings
+on every call. Each prompt is held to PROMPT_INPUT_TOKEN_BUDGET estimated
+tokens by compacting the product lines in stages (shorter ingredient
+lists, then bare name/brand/pH lines, then fewer products), and the reply
+is capped per request type: a blocking "advice" call waits behind
+ADVICE_DEADLINE_SECONDS, so it gets a tighter cap than a "stream" the user
+watches arrive. The prompt asks for a matching length so answers end
+naturally instead of being cut off at the cap.
+
+Token counts are estimated at about four characters per token, which is
+close for English prose and needs no tokenizer; OpenAI's reported usage is
+recorded next to the estimate for comparison.
+"""
+import os
+
+SYSTEM_PROMPT = "You are a scalp health expert providing personalized hair care advice."
+
+REQUEST_TYPES = ("advice", "stream")
+
+# Token counts from a bare prompt up to a very long one
+TOKEN_BUCKETS = (64, 128, 256, 384, 512, 768, 1024, 1536, 2048, 4096)
+
+# Chat format overhead: a few tokens per message plus the reply primer
+_MESSAGE_OVERHEAD = 4
+_REPLY_OVERHEAD = 3
+
+# English text runs about 0.75 words per token; leave headroom below the cap
+_WORDS_PER_TOKEN = 0.6
+
+
+def _compact(text):
+    """Strip indentation and blank lines from a triple-quoted block"""
+    return "\n".join(line.strip() for line in text.strip().splitlines() if line.strip())
+
+
+_INSTRUCTIONS = _compact("""
+    Please provide:
+    1. A brief explanation of what this scalp pH means for their hair health.
+    2. A concise overview of why the products from our database are suitable for this pH level and symptoms.
+    3. General recommendations for hair care routines based on this scalp pH.
+    4. Tips for effectively using hair products with this scalp pH.
+    Format your response to be conversational and informative. Do NOT list additional specific product recommendations - we will present our own product list to the user separately.
+""")
+
+_PRODUCTS_HEADER = "Based on their scalp pH, these are some recommended products we found from our database:"
+
+
+def estimate_tokens(text):
+    """Rough token count of `text` (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def _product_line(i, product, level):
+    """One prompt line for a product; higher levels are shorter"""
+    head = f"{i}. {product['name']} by {product['brand']} (pH: {product['ph_level']})"
+    if level >= 2:
+        return f"{head} - {product['category']}"
+
+    ingredients = product.get('ingredients') or ''
+    # Sephora's ingredientsList arrives as a list
+    if isinstance(ingredients, (list, tuple)):
+        ingredients = ", ".join(str(part) for part in ingredients)
+    elif not isinstance(ingredients, str):
+        ingredients = str(ingredients)
+    if level == 1:
+        ingredients = ", ".join(part.strip() for part in ingredients.split(",")[:3])
+        return f"{head} - {product['category']}; ingredients: {ingredients}"
+
+    source = product.get('source', 'Unknown')
+    rating_info = f" | Rating: {product['rating']} stars" if product.get('rating') else ""
+    price_info = f" | Price: {product['price']}" if product.get('price') and product['price'] != 'Price not available' else ""
+    if len(ingredients) > 100:
+        ingredients = ingredients[:100] + "..."
+    return (
+        f"{head} - Source: {source}{rating_info}{price_info}\n"
+        f"   Description: {product['category']} with ingredients: {ingredients}"
+    )
+
+
+class PromptBuilder:
+    """
+    Builds advice chat messages within an input token budget
+
+    Args:
+        input_token_budget: Most estimated tokens for the system and user messages together
+        max_tokens: Mapping of request type ("advice", "stream") to the reply token cap
+        metrics: MetricsRegistry to report prompt and reply token counts to
+    """
+
+    def __init__(self, input_token_budget=350, max_tokens=None, metrics=None):
+        self.input_token_budget = input_token_budget
+        self.max_tokens = {"advice": 600, "stream": 800}
+        self.max_tokens.update(max_tokens or {})
+        # Instruction tail per request type, with the length hint matching its cap
+        self._instructions = {
+            request_type: f"{_INSTRUCTIONS} Keep the whole answer under about "
+                          f"{int(cap * _WORDS_PER_TOKEN // 10 * 10)} words."
+            for request_type, cap in self.max_tokens.items()
+        }
+        self._fixed_tokens = estimate_tokens(SYSTEM_PROMPT) + 2 * _MESSAGE_OVERHEAD + _REPLY_OVERHEAD
+
+        self.prompt_tokens = self.compactions = self.usage_tokens = None
+        if metrics is not None:
+            self.prompt_tokens = metrics.histogram(
+                "prompt_tokens_estimated", "Estimated input tokens per advice prompt", buckets=TOKEN_BUCKETS
+            )
+            self.compactions = metrics.counter(
+                "prompt_compactions_total", "Advice prompts shortened to fit the input token budget, by level"
+            )
+            self.usage_tokens = metrics.histogram(
+                "llm_tokens", "Prompt and completion tokens reported by OpenAI per advice call", buckets=TOKEN_BUCKETS
+            )
+
+    @classmethod
+    def from_env(cls, metrics=None):
+        """Build a prompt builder configured by PROMPT_INPUT_TOKEN_BUDGET and the *_MAX_TOKENS variables"""
+        return cls(
+            input_token_budget=int(os.getenv("PROMPT_INPUT_TOKEN_BUDGET", "350")),
+            max_tokens={
+                "advice": int(os.getenv("ADVICE_MAX_TOKENS", "600")),
+                "stream": int(os.getenv("ADVICE_STREAM_MAX_TOKENS", "800"))
+            },
+            metrics=metrics
+        )
+
+    def user_prompt(self, scalp_ph, condition, symptoms, products, history=None, request_type="advice"):
+        """
+        The user message for an advice request, compacted to fit the budget
+
+        Args:
+            scalp_ph: User's scalp pH measurement
+            condition: Scalp condition band for the pH
+            symptoms: List of symptoms reported by the user
+            products: Enriched products to describe (in order of preference)
+            history: Sentence about the user's reading history, if any
+            request_type: "advice" or "stream"
+
+        Returns:
+            Prompt text
+        """
+        lines = [f"The user has a scalp pH of {scalp_ph}, which indicates a {condition}."]
+        if symptoms:
+            lines.append(f"They report the following symptoms: {', '.join(symptoms)}.")
+        if history:
+            lines.append(history)
+        lines.append(_PRODUCTS_HEADER)
+        head = "\n".join(lines)
+        instructions = self._instructions[request_type]
+        budget = self.input_token_budget - self._fixed_tokens
+
+        # Shorter product lines first, then fewer products; always keep one
+        products = list(products)
+        level = 0
+        while True:
+            product_lines = "\n".join(_product_line(i, p, min(level, 2)) for i, p in enumerate(products, 1))
+            prompt = f"{head}\n{product_lines}\n{instructions}"
+            tokens = estimate_tokens(prompt)
+            if tokens <= budget or (level >= 2 and len(products) <= 1):
+                break
+            if level >= 2:
+                products.pop()
+            level += 1
+
+        if self.prompt_tokens is not None:
+            self.prompt_tokens.observe(tokens + self._fixed_tokens, request_type=request_type)
+            if level:
+                self.compactions.inc(level=str(min(level, 3)))
+        return prompt
+
+    def messages(self, prompt):
+        """Chat messages for a user prompt"""
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    def record_usage(self, usage):
+        """Record the token usage OpenAI reported for one completion"""
+        if self.usage_tokens is None or not usage:
+            return
+        for kind in ("prompt", "completion"):
+            if usage.get(f"{kind}_tokens") is not None:
+                self.usage_tokens.observe(usage[f"{kind}_tokens"], kind=kind)
@@ -0,0 +1,154 @@
+import re
+import numpy as np
+
+_PRICE_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def parse_price(price):
+    """Parse a display price like "$24.50" or "$20.00 - $38.00" to its first number, or NaN"""
+    if isinstance(price, (int, float)) and not isinstance(price, bool):
+        return float(price)
+    if not isinstance(price, str):
+        return np.nan
+    match = _PRICE_PATTERN.search(price)
+    return float(match.group().replace(",", ".")) if match else np.nan
+
+
+def parse_rating(rating):
+    """Parse a star rating given as a number or a numeric string (Sephora sends "4.2110"), or NaN"""
+    if isinstance(rating, bool) or rating is None:
+        return np.nan
+    try:
+        value = float(rating)
+    except (TypeError, ValueError):
+        return np.nan
+    return value if np.isfinite(value) else np.nan
+
+
+def is_rankable(product):
+    """Products _enrich_products keeps: named, and not the 'Unknown Product' placeholder"""
+    name = product.get('name')
+    return bool(name) and name != 'Unknown Product'
+
+
+class CandidateBatch:
+    """
+    Column view over a list of candidate product dicts
+
+    Holds one NumPy array per numeric field (pH level, pH difference, rating,
+    price) so scoring and selection run over arrays instead of per-dict
+    Python code. `products` keeps the original dicts, untouched, in order.
+    The rating and price columns are only built when first used.
+    """
+
+    __slots__ = ("products", "scalp_ph", "ph_level", "ph_difference", "_rating", "_price")
+
+    def __init__(self, products, scalp_ph):
+        self.products = [p for p in products if is_rankable(p)]
+        self.scalp_ph = scalp_ph
+        n = len(self.products)
+        self.ph_level = np.fromiter((p['ph_level'] for p in self.products), dtype=np.float64, count=n)
+        self.ph_difference = np.abs(self.ph_level - scalp_ph)
+        self._rating = None
+        self._price = None
+
+        # Respect a precomputed difference, as _enrich_products does
+        for i, p in enumerate(self.products):
+            if 'ph_difference' in p:
+                self.ph_difference[i] = p['ph_difference']
+
+    def __len__(self):
+        return len(self.products)
+
+    @property
+    def rating(self):
+        """Star ratings, NaN where a product has none"""
+        if self._rating is None:
+            self._rating = np.fromiter(
+                (parse_rating(p.get('rating')) for p in self.products),
+                dtype=np.float64, count=len(self.products)
+            )
+        return self._rating
+
+    @property
+    def price(self):
+        """Parsed numeric prices, NaN where a product has none"""
+        if self._price is None:
+            self._price = np.fromiter(
+                (parse_price(p.get('price')) for p in self.products),
+                dtype=np.float64, count=len(self.products)
+            )
+        return self._price
+
+
+def select_top_k(scores, k):
+    """
+    Indices of the `k` lowest scores, lowest first, ties broken by index
+
+    Uses a partial sort (argpartition) so selection is O(n + k log k), and
+    matches a stable full sort of the scores exactly, including which of
+    several tied candidates at the cut-off are kept.
+    """
+    n = len(scores)
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    if n > k:
+        kth_score = scores[np.argpartition(scores, k - 1)[:k]].max()
+        below = np.flatnonzero(scores < kth_score)
+        tied = np.flatnonzero(scores == kth_score)[:k - len(below)]
+        chosen = np.concatenate([below, tied])
+    else:
+        chosen = np.arange(n)
+
+    return chosen[np.lexsort((chosen, scores[chosen]))]
+
+
+class RankingEngine:
+    """
+    Top-k product ranking over columnar candidate arrays
+
+    Without a scoring model (or with a pH-only one) this produces the same
+    list as sorting every enriched product by ph_difference and keeping the
+    first k. With a multi-factor ScoringModel candidates are ranked by its
+    weighted score instead. Either way only the k winners are copied and get
+    suitability labels and descriptions.
+    """
+
+    def __init__(self, api, scoring_model=None):
+        self.api = api
+        self.scoring_model = scoring_model
+
+    def top_k(self, products, scalp_ph, k=10, symptoms=None, debug=False):
+        """
+        Rank candidates and enrich the winners
+
+        Args:
+            products: List of product dictionaries
+            scalp_ph: User's scalp pH measurement
+            k: Number of products to return
+            symptoms: Symptoms reported by the user, used by the scoring model
+            debug: Attach each winner's score and per-factor contributions
+
+        Returns:
+            List of up to `k` enriched product dictionaries, best match first
+        """
+        batch = CandidateBatch(products, scalp_ph)
+
+        model = self.scoring_model
+        if model is None or model.ph_only:
+            scores, contributions = batch.ph_difference, {"ph_distance": batch.ph_difference / 5.0}
+        else:
+            scores, contributions = model.score(batch, symptoms)
+
+        winners = select_top_k(scores, k)
+        ranked = self.api._enrich_products([batch.products[i] for i in winners], scalp_ph)
+
+        if debug:
+            for product, i in zip(ranked, winners):
+                product['score'] = round(float(scores[i]), 4)
+                product['score_breakdown'] = {
+                    factor: round(float(values[i]), 4) for factor, values in contributions.items()
+                }
+
+        return ranked
@@ -0,0 +1,113 @@
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock, fall back to per-process limiting
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Two doubles: available tokens and the wall clock time they were last refilled
+_STATE_FORMAT = "dd"
+_STATE_SIZE = struct.calcsize(_STATE_FORMAT)
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter for outbound API calls
+
+    Tokens refill at `rate` per second up to `burst`. Callers that find the
+    bucket empty reserve a future token and sleep until it is due, so waiting
+    callers are served in order instead of spinning.
+
+    When `state_path` is given the bucket state is kept in that file behind an
+    exclusive flock, which makes one bucket shared by every thread of every
+    worker process on the host.
+    """
+
+    def __init__(self, rate, burst=1, state_path=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.state_path = state_path if fcntl else None
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = time.time()
+
+    def _refill(self, tokens, updated, now):
+        """Return the token count after refilling from `updated` to `now`"""
+        elapsed = max(0.0, now - updated)
+        return min(self.burst, tokens + elapsed * self.rate)
+
+    def _take(self, tokens, updated, amount, now):
+        """Deduct `amount` tokens and return (new_tokens, wait_seconds)"""
+        available = self._refill(tokens, updated, now) - amount
+        wait_seconds = -available / self.rate if available < 0 else 0.0
+        return available, wait_seconds
+
+    def _reserve_local(self, amount):
+        with self._lock:
+            now = time.time()
+            self._tokens, wait_seconds = self._take(self._tokens, self._updated, amount, now)
+            self._updated = now
+            return wait_seconds
+
+    def _reserve_shared(self, amount):
+        with self._lock:
+            fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                now = time.time()
+                raw = os.pread(fd, _STATE_SIZE, 0)
+                if len(raw) == _STATE_SIZE:
+                    tokens, updated = struct.unpack(_STATE_FORMAT, raw)
+                else:
+                    tokens, updated = self.burst, now
+                tokens, wait_seconds = self._take(tokens, updated, amount, now)
+                os.pwrite(fd, struct.pack(_STATE_FORMAT, tokens, now), 0)
+                return wait_seconds
+            finally:
+                os.close(fd)
+
+    def reserve(self, amount=1):
+        """
+        Take `amount` tokens, possibly borrowing against future refills
+
+        Returns:
+            Seconds the caller must wait before making its call (0 if none)
+        """
+        if self.state_path:
+            try:
+                return self._reserve_shared(amount)
+            except OSError as e:
+                logger.warning("Shared rate limit state unavailable (%s), limiting per process", e)
+                self.state_path = None
+        return self._reserve_local(amount)
+
+    def acquire(self, amount=1):
+        """Block until `amount` tokens are available"""
+        wait_seconds = self.reserve(amount)
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+        return wait_seconds
+
+
+def rate_limiter_from_env(prefix, default_rate, default_burst):
+    """
+    Build a TokenBucket from <prefix>_RATE_LIMIT_RPS, _BURST and _STATE_FILE
+
+    The state file defaults to one shared file per prefix in the temp
+    directory; set <prefix>_RATE_LIMIT_STATE_FILE to an empty string to keep
+    the limit per process.
+    """
+    rate = float(os.getenv(f"{prefix}_RATE_LIMIT_RPS", default_rate))
+    burst = float(os.getenv(f"{prefix}_RATE_LIMIT_BURST", default_burst))
+    default_state = os.path.join(tempfile.gettempdir(), f"phperfect-{prefix.lower()}-ratelimit")
+    state_path = os.getenv(f"{prefix}_RATE_LIMIT_STATE_FILE", default_state) or None
+    return TokenBucket(rate, burst, state_path=state_path)
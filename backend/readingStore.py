@@ -0,0 +1,308 @@
+"""
+Buffered storage for streamed pH readings
+
+POST /api/readings hands each batch to ReadingStore.submit, which only
+appends to an in-memory buffer; a writer thread drains the buffer into
+SQLite in bulk transactions, so a request never waits on a disk write and
+thousands of devices reporting every second cost a few commits per second
+instead of one per reading. The buffer is bounded (READINGS_MAX_PENDING):
+a batch that does not fit is rejected whole and the client retries later.
+
+Readings go into a ph_readings table shaped like the one in server.js,
+plus the device and user the reading came from.
+"""
+import collections
+import datetime
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ph_readings (
+    id INTEGER PRIMARY KEY,
+    device_id TEXT NOT NULL,
+    user_id TEXT,
+    ph_value REAL NOT NULL,
+    timestamp REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ph_readings_user_time ON ph_readings (user_id, timestamp);
+CREATE INDEX IF NOT EXISTS ph_readings_device_time ON ph_readings (device_id, timestamp);
+"""
+
+INSERT = "INSERT INTO ph_readings (device_id, user_id, ph_value, timestamp) VALUES (?, ?, ?, ?)"
+
+
+class ReadingStoreFull(Exception):
+    """Raised when a batch does not fit in the write buffer; retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__("reading buffer is full")
+        self.retry_after = retry_after
+
+
+class ReadingStoreUnavailable(Exception):
+    """Raised while readings cannot be written (writer stopped or the last flush failed)"""
+
+    def __init__(self, retry_after):
+        super().__init__("reading store is unavailable")
+        self.retry_after = retry_after
+
+
+def _parse_timestamp(value, received_at):
+    """Epoch seconds from epoch seconds, epoch milliseconds or an ISO 8601 string"""
+    if value is None:
+        return received_at
+    if isinstance(value, str):
+        parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return parsed.timestamp()
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"invalid timestamp {value!r}")
+    # JavaScript clients send Date.now() milliseconds
+    return value / 1000 if value > 1e11 else float(value)
+
+
+def parse_readings(data, received_at=None, max_readings=1000):
+    """
+    Validate an /api/readings body
+
+    Body: {"device_id": "esp32-01", "user_id": "u1",
+           "readings": [{"ph": 5.21, "timestamp": 1735689600}, ...]}
+    Each reading may override device_id/user_id; "ph" may be a number or a
+    numeric string (the firmware sends "5.21"), "ph_value" is accepted too,
+    and a missing timestamp means "now".
+
+    Returns:
+        List of (device_id, user_id, ph_value, timestamp) rows
+
+    Raises:
+        ValueError: describing the first invalid part of the body
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    readings = data.get('readings')
+    if not isinstance(readings, list) or not readings:
+        raise ValueError("Request body needs a non-empty 'readings' list")
+    if len(readings) > max_readings:
+        raise ValueError(f"At most {max_readings} readings per batch")
+
+    received_at = time.time() if received_at is None else received_at
+    rows = []
+    for i, reading in enumerate(readings):
+        if not isinstance(reading, dict):
+            raise ValueError(f"readings[{i}] must be an object")
+        device_id = reading.get('device_id', data.get('device_id'))
+        user_id = reading.get('user_id', data.get('user_id'))
+        if not device_id:
+            raise ValueError(f"readings[{i}] has no device_id")
+        try:
+            ph = float(reading.get('ph', reading.get('ph_value')))
+            timestamp = _parse_timestamp(reading.get('timestamp'), received_at)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"readings[{i}]: {e}") from None
+        if not 0.0 <= ph <= 14.0:
+            raise ValueError(f"readings[{i}] has pH {ph} outside 0-14")
+        rows.append((str(device_id), None if user_id is None else str(user_id), ph, timestamp))
+    return rows
+
+
+class ReadingStore:
+    """
+    Bounded write-behind buffer in front of a SQLite ph_readings table
+
+    submit() takes a short lock and appends; the writer thread waits until
+    `batch_size` rows are pending or `flush_interval` seconds have passed
+    and writes them with one executemany per transaction. Buffered plus
+    in-flight rows never exceed `max_pending`. A failed flush puts its rows
+    back at the front of the buffer and is retried after `flush_interval`;
+    until a flush succeeds again new batches are refused, so a broken disk
+    turns into 503s instead of unbounded memory.
+
+    The database runs in WAL mode with synchronous=NORMAL: a commit survives
+    a process crash, and an OS crash can lose at most the last few flushes.
+    """
+
+    def __init__(self, path, batch_size=1000, flush_interval=0.5, max_pending=100000, metrics=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.metrics = metrics
+        self._flush_hooks = []
+        self._pending = collections.deque()
+        self._inflight = 0
+        self._cond = threading.Condition()
+        self._writer = None
+        self._stopping = False
+        self._failing = False
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.flushes = 0
+        self.flush_failures = 0
+
+    @classmethod
+    def from_env(cls, metrics=None):
+        """Build a store configured by the READINGS_* environment variables"""
+        return cls(
+            os.getenv("READINGS_DB_PATH", "readings.db"),
+            batch_size=int(os.getenv("READINGS_FLUSH_BATCH", "1000")),
+            flush_interval=float(os.getenv("READINGS_FLUSH_INTERVAL_SECONDS", "0.5")),
+            max_pending=int(os.getenv("READINGS_MAX_PENDING", "100000")),
+            metrics=metrics
+        )
+
+    def connect(self, **kwargs):
+        """Open a new connection to the readings database (one per thread unless check_same_thread=False)"""
+        connection = sqlite3.connect(self.path, **kwargs)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def add_flush_hook(self, hook):
+        """
+        Register `hook(connection, rows)`, called inside every flush transaction
+
+        Hooks see exactly the rows being inserted and write through the same
+        connection, so derived tables (e.g. phTrends rollups) commit or roll
+        back together with the readings.
+        """
+        self._flush_hooks.append(hook)
+
+    def start(self):
+        """Create the schema and start the writer thread"""
+        if self._writer is not None:
+            return
+        with self.connect() as connection:
+            connection.executescript(SCHEMA)
+        connection.close()
+        self._writer = threading.Thread(target=self._run, name="phperfect-readings-writer", daemon=True)
+        self._writer.start()
+
+    def submit(self, rows):
+        """
+        Buffer rows for the writer thread
+
+        Args:
+            rows: (device_id, user_id, ph_value, timestamp) tuples, e.g. from parse_readings
+
+        Raises:
+            ReadingStoreFull: the batch does not fit in the buffer
+            ReadingStoreUnavailable: the writer is not running or failing
+        """
+        with self._cond:
+            if self._writer is None or self._stopping or self._failing:
+                self.rejected += len(rows)
+                raise ReadingStoreUnavailable(retry_after=max(1, math.ceil(self.flush_interval * 2)))
+            if len(self._pending) + self._inflight + len(rows) > self.max_pending:
+                self.rejected += len(rows)
+                raise ReadingStoreFull(retry_after=max(1, math.ceil(self.flush_interval)))
+            # Wake the writer to start its flush interval, or to write a full batch now
+            wake = not self._pending or len(self._pending) + len(rows) >= self.batch_size
+            self._pending.extend(rows)
+            self.accepted += len(rows)
+            if wake:
+                self._cond.notify_all()
+
+    def _next_batch(self):
+        """Wait for a full batch or the flush interval; returns [] once stopping with nothing left"""
+        with self._cond:
+            while not self._pending and not self._stopping:
+                self._cond.wait()
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._pending) < self.batch_size and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._pending.popleft() for _ in range(min(len(self._pending), self.batch_size))]
+            self._inflight = len(batch)
+            return batch
+
+    def _run(self):
+        connection = self.connect()
+        try:
+            while True:
+                batch = self._next_batch()
+                if not batch:
+                    return
+                flush_start = time.perf_counter()
+                try:
+                    with connection:
+                        connection.executemany(INSERT, batch)
+                        for hook in self._flush_hooks:
+                            hook(connection, batch)
+                except Exception as e:
+                    logger.error("Flushing %d readings failed, retrying: %s", len(batch), e)
+                    with self._cond:
+                        self._pending.extendleft(reversed(batch))
+                        self._inflight = 0
+                        self._failing = True
+                        self.flush_failures += 1
+                        self._cond.notify_all()
+                    if self._stopping:
+                        return
+                    time.sleep(self.flush_interval)
+                    continue
+
+                if self.metrics is not None:
+                    self.metrics.observe_stage("flush_readings", time.perf_counter() - flush_start)
+                with self._cond:
+                    self._inflight = 0
+                    self._failing = False
+                    self.written += len(batch)
+                    self.flushes += 1
+                    self._cond.notify_all()
+        finally:
+            connection.close()
+
+    def flush(self, timeout=None):
+        """Wait until every buffered row is written; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._pending or self._inflight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=10):
+        """Stop accepting rows, write what is buffered and stop the writer thread"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._writer is not None:
+            self._writer.join(timeout)
+        if self._pending:
+            logger.warning("Closed the reading store with %d readings unwritten", len(self._pending))
+
+    def stats(self):
+        """Return buffer depth and row counters"""
+        with self._cond:
+            return {
+                "pending": len(self._pending) + self._inflight,
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "written": self.written,
+                "flushes": self.flushes,
+                "flush_failures": self.flush_failures
+            }
+
+    def collect_metrics(self):
+        """Buffer depth and reading counters, for the metrics registry"""
+        stats = self.stats()
+        yield "readings_pending", "gauge", "Readings buffered or being written", [({}, stats["pending"])]
+        yield "readings_total", "counter", "Readings by outcome", [
+            ({"result": result}, stats[result]) for result in ("accepted", "rejected", "written")
+        ]
+        yield "readings_flushes_total", "counter", "Bulk reading transactions by outcome", [
+            ({"result": "ok"}, stats["flushes"]), ({"result": "error"}, stats["flush_failures"])
+        ]
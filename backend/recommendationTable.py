@@ -0,0 +1,339 @@
+"""
+Precomputed recommendations for every (pH bucket, symptom set) pair
+
+    python3 productRecommendations.py precompute --output recommendations.table
+    RECOMMENDATION_TABLE_PATH=recommendations.table python3 server.py
+
+Requests carry a pH between about 3 and 8 and any subset of the three known
+symptoms, so the whole input space is 51 pH buckets x 8 symptom sets. The
+table holds the ranked products and advice for each pair as ready-to-send
+JSON fragments; the server memory-maps it and answers a request in that
+space with one index lookup and a byte join, falling back to the live path
+for anything else (debug requests, unknown symptoms, out-of-range pH,
+entries a build could not fill, and readings whose condition band differs
+from their bucket's, e.g. 6.04 snapping to 6.0 across the "oily" boundary).
+
+An entry's products are ranked, and their ph_difference, suitability and
+description computed, for the bucket pH, at most 0.05 from the reading.
+
+File layout, little-endian:
+
+    magic "PHRT", u16 version, u32 header length, header JSON
+    entries: u32 advice blob id, u32 products blob id per (bucket, symptom mask)
+    blob offsets: u32 count + 1 offsets, relative to the blob section
+    blobs: JSON-encoded advice strings and product lists, each stored once
+"""
+import argparse
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"PHRT"
+VERSION = 1
+_PREAMBLE = struct.Struct("<4sHI")
+_ENTRY = struct.Struct("<II")
+_OFFSET = struct.Struct("<I")
+MISSING = 0xFFFFFFFF
+
+# 3.0, 3.1, ... 8.0 - the same 0.1 step the advice cache quantizes pH to
+PH_MIN = 3.0
+PH_STEP = 0.1
+PH_BUCKETS = 51
+
+
+class _MappedTable:
+    """One loaded table file; lookups only slice the memory map"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_length = _PREAMBLE.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} recommendation table")
+        header_start = _PREAMBLE.size
+        self.header = json.loads(self.map[header_start:header_start + header_length])
+        self.symptom_bits = {name: 1 << i for i, name in enumerate(self.header["symptoms"])}
+        self.combos = 1 << len(self.header["symptoms"])
+        self.buckets = self.header["ph_buckets"]
+        self.ph_min = self.header["ph_min"]
+        self.ph_step = self.header["ph_step"]
+
+        self.entries_start = header_start + header_length
+        self.offsets_start = self.entries_start + self.buckets * self.combos * _ENTRY.size
+        self.blob_count = self.header["blobs"]
+        self.blobs_start = self.offsets_start + (self.blob_count + 1) * _OFFSET.size
+        self.filled = self.header["filled"]
+
+    def blob(self, blob_id):
+        start, end = struct.unpack_from("<II", self.map, self.offsets_start + blob_id * _OFFSET.size)
+        return self.map[self.blobs_start + start:self.blobs_start + end]
+
+    def entry(self, index):
+        """Return (advice JSON, products JSON) for an entry index, or None if the build left it empty"""
+        advice_id, products_id = _ENTRY.unpack_from(self.map, self.entries_start + index * _ENTRY.size)
+        if advice_id == MISSING:
+            return None
+        return self.blob(advice_id), self.blob(products_id)
+
+
+class RecommendationTable:
+    """
+    Memory-mapped table of precomputed recommendation responses
+
+    `band(scalp_ph)` names the condition band and product queries a reading
+    gets on the live path; a reading is only answered from a bucket in the
+    same band. Readers use whichever file was loaded last without taking a lock;
+    a refresh builds a new file next to the old one, moves it into place
+    with os.replace and maps it, so a reader never sees a half-written table.
+    """
+
+    def __init__(self, path, symptoms, band=None):
+        self.path = path
+        self.symptoms = list(symptoms)
+        self.band = band
+        self._table = None
+        self._refresh_thread = None
+        self._stop_refresh = threading.Event()
+        # Guards the counters, which every Flask worker thread bumps
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def loaded(self):
+        return self._table is not None
+
+    def load(self):
+        """Map the table file; returns False if there is none yet"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        table = _MappedTable(self.path)
+        if table.header["symptoms"] != self.symptoms:
+            logger.warning("Ignoring %s, it was built for symptoms %s", self.path, table.header["symptoms"])
+            return False
+        self._table = table
+        logger.info(
+            "Loaded recommendation table %s: %d of %d entries, built %s",
+            self.path, table.filled, table.buckets * table.combos,
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(table.header["built_at"]))
+        )
+        return True
+
+    def lookup(self, scalp_ph, symptoms):
+        """
+        Precomputed /api/recommendations response body for a reading
+
+        The pH is snapped to the nearest 0.1 within its condition band; the
+        response echoes the request's own scalp_ph and symptoms, with the
+        products ranked for the bucket pH.
+
+        Returns:
+            JSON bytes, or None when the reading is outside the table and
+            the live path should answer it
+        """
+        table = self._table
+        index = self._index(table, scalp_ph, symptoms, self.band) if table is not None else None
+        entry = table.entry(index) if index is not None else None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if entry is None:
+            return None
+
+        advice, products = entry
+        return b"".join((
+            b'{"advice_text":', advice,
+            b',"recommended_products":', products,
+            b',"scalp_ph":', json.dumps(scalp_ph).encode(),
+            b',"symptoms":', json.dumps(symptoms).encode(),
+            b"}"
+        ))
+
+    @staticmethod
+    def _index(table, scalp_ph, symptoms, band=None):
+        if isinstance(scalp_ph, bool) or not isinstance(scalp_ph, (int, float)) or not math.isfinite(scalp_ph):
+            return None
+        bucket = round((scalp_ph - table.ph_min) / table.ph_step)
+        if not 0 <= bucket < table.buckets or not isinstance(symptoms, list):
+            return None
+        # Snapping must not carry a reading across a condition band or query boundary
+        if band is not None and band(scalp_ph) != band(round(table.ph_min + bucket * table.ph_step, 1)):
+            return None
+        mask = 0
+        for symptom in symptoms:
+            bit = table.symptom_bits.get(symptom) if isinstance(symptom, str) else None
+            if bit is None:
+                return None
+            mask |= bit
+        return bucket * table.combos + mask
+
+    def _readings(self):
+        """Every (bucket pH, symptom list) the table covers, in entry order"""
+        combos = 1 << len(self.symptoms)
+        for bucket in range(PH_BUCKETS):
+            scalp_ph = round(PH_MIN + bucket * PH_STEP, 1)
+            for mask in range(combos):
+                yield scalp_ph, [s for i, s in enumerate(self.symptoms) if mask & (1 << i)]
+
+    @staticmethod
+    def _usable(result, unavailable_advice):
+        """A live result worth pinning in the table: real advice and at least one real product"""
+        if "error" in result or result.get("advice_text") in (None, "", unavailable_advice):
+            return False
+        products = result.get("recommended_products") or []
+        return any(not str(p.get("id", "")).startswith("default-") for p in products)
+
+    def build(self, api, output_path=None):
+        """
+        Compute every entry through the live batch path and write a new table file
+
+        Readings are sent one pH bucket (one batch of symptom sets) at a
+        time, so shared queries and advice prompts are fetched once and no
+        batch runs into the advice deadline. An entry whose live result fell
+        back to default products or had no advice keeps its value from the
+        currently loaded table, or is left empty for the live path.
+
+        Returns:
+            Number of filled entries
+        """
+        from productRecommendations import ADVICE_UNAVAILABLE
+
+        output_path = output_path or self.path
+        readings = list(self._readings())
+        combos = 1 << len(self.symptoms)
+        previous = self._table
+
+        blobs, blob_ids, entries = [], {}, []
+
+        def blob_id(data):
+            if data not in blob_ids:
+                blob_ids[data] = len(blobs)
+                blobs.append(data)
+            return blob_ids[data]
+
+        started = time.perf_counter()
+        for start in range(0, len(readings), combos):
+            chunk = readings[start:start + combos]
+            results = api.get_batch_recommendations([{"scalp_ph": ph, "symptoms": s} for ph, s in chunk])
+            for offset, result in enumerate(results):
+                if self._usable(result, ADVICE_UNAVAILABLE):
+                    advice = json.dumps(result["advice_text"]).encode()
+                    products = json.dumps(result["recommended_products"]).encode()
+                elif previous is not None and previous.entry(start + offset) is not None:
+                    advice, products = previous.entry(start + offset)
+                else:
+                    entries.append((MISSING, MISSING))
+                    continue
+                entries.append((blob_id(bytes(advice)), blob_id(bytes(products))))
+
+        filled = sum(1 for advice_id, _ in entries if advice_id != MISSING)
+        self._write(output_path, entries, blobs, filled)
+        logger.info(
+            "Built recommendation table %s: %d of %d entries, %d distinct blobs, %d bytes in %.1fs",
+            output_path, filled, len(entries), len(blobs), os.path.getsize(output_path),
+            time.perf_counter() - started
+        )
+        return filled
+
+    def _write(self, output_path, entries, blobs, filled):
+        """Write the table to a temporary file and move it over `output_path` atomically"""
+        header = json.dumps({
+            "symptoms": self.symptoms,
+            "ph_min": PH_MIN,
+            "ph_step": PH_STEP,
+            "ph_buckets": PH_BUCKETS,
+            "blobs": len(blobs),
+            "filled": filled,
+            "built_at": time.time()
+        }).encode()
+
+        offsets = [0]
+        for data in blobs:
+            offsets.append(offsets[-1] + len(data))
+
+        directory = os.path.dirname(os.path.abspath(output_path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".recommendations-", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_PREAMBLE.pack(MAGIC, VERSION, len(header)))
+                f.write(header)
+                f.write(b"".join(_ENTRY.pack(*entry) for entry in entries))
+                f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+                f.writelines(blobs)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def refresh(self, api):
+        """Rebuild the table file from the live path and start serving it"""
+        try:
+            self.build(api)
+            self.load()
+        except Exception as e:
+            logger.exception("Recommendation table refresh failed: %s", e)
+
+    def start_background_refresh(self, api, interval):
+        """Rebuild now (unless a table is already loaded) and then every `interval` seconds on a daemon thread"""
+        if self._refresh_thread is not None:
+            return
+
+        def run():
+            if self.loaded:
+                self._stop_refresh.wait(interval)
+            while not self._stop_refresh.is_set():
+                self.refresh(api)
+                self._stop_refresh.wait(interval)
+
+        self._refresh_thread = threading.Thread(target=run, name="phperfect-table-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def stop_background_refresh(self):
+        """Stop the background refresh thread after its current pass"""
+        self._stop_refresh.set()
+
+    def stats(self):
+        """Return lookup counters and how much of the table is filled"""
+        table = self._table
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "size": table.filled if table is not None else 0,
+            "built_at": table.header["built_at"] if table is not None else None
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute the recommendation table")
+    parser.add_argument("--output", default=os.getenv("RECOMMENDATION_TABLE_PATH", "recommendations.table"))
+    args = parser.parse_args(argv)
+
+    from productRecommendations import PHPerfectAPIIntegration
+    from structuredLogging import configure_logging
+
+    configure_logging()
+    api = PHPerfectAPIIntegration()
+    table = RecommendationTable(args.output, api.recommendation_table.symptoms, band=api.recommendation_table.band)
+    table.load()
+    filled = table.build(api)
+    print(f"Wrote {filled} entries to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,125 @@
+import json
+import os
+import numpy as np
+
+# Factors the model knows how to compute, in the order they are reported
+FACTORS = ("ph_distance", "rating", "price", "symptom_match", "source_reliability")
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scoringConfig.json")
+# Opt-in weights for rating, price, symptom match and source reliability (SCORING_CONFIG_PATH)
+MULTIFACTOR_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scoringConfig.multifactor.json")
+
+
+class ScoringModel:
+    """
+    Weighted multi-factor product score, computed over a CandidateBatch
+
+    Every factor is a penalty scaled to roughly 0..1 (lower is better) and the
+    score is the weighted sum, so products are ranked by ascending score just
+    like the original pH-difference sort:
+
+        ph_distance         pH difference / 5
+        rating              1 - rating / 5 (0.5 when unrated)
+        price               price rank within the batch, cheapest 0 (0.5 when unknown)
+        symptom_match       0 if the category helps a reported symptom, else 1
+        source_reliability  1 - configured reliability of the product source
+    """
+
+    def __init__(self, weights, source_reliability=None, symptom_categories=None, default_reliability=0.5):
+        unknown = set(weights) - set(FACTORS)
+        if unknown:
+            raise ValueError(f"Unknown scoring factors: {', '.join(sorted(unknown))}")
+        self.weights = {factor: float(weights.get(factor, 0.0)) for factor in FACTORS}
+        self.source_reliability = {k.lower(): float(v) for k, v in (source_reliability or {}).items()}
+        # Ordered as configured (duplicates dropped), so anything iterating them is deterministic
+        self.symptom_categories = {
+            symptom: tuple(dict.fromkeys(c.lower() for c in categories))
+            for symptom, categories in (symptom_categories or {}).items()
+        }
+        self.default_reliability = default_reliability
+
+    @classmethod
+    def from_config(cls, path=None):
+        """
+        Load weights from a JSON config file
+
+        The path defaults to SCORING_CONFIG_PATH, then scoringConfig.json next
+        to this module. Returns None when no config file exists, which keeps
+        ranking on pH difference alone.
+        """
+        path = path or os.getenv("SCORING_CONFIG_PATH") or DEFAULT_CONFIG_PATH
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            config = json.load(f)
+        return cls(
+            config.get("weights", {"ph_distance": 1.0}),
+            source_reliability=config.get("source_reliability"),
+            symptom_categories=config.get("symptom_categories"),
+            default_reliability=config.get("default_reliability", 0.5)
+        )
+
+    @property
+    def ph_only(self):
+        """True when only pH distance carries weight, i.e. the original ranking"""
+        return all(w == 0 for f, w in self.weights.items() if f != "ph_distance")
+
+    def _factor(self, factor, batch, symptoms):
+        n = len(batch)
+        if factor == "ph_distance":
+            return batch.ph_difference / 5.0
+
+        if factor == "rating":
+            penalty = 1.0 - np.clip(batch.rating, 0.0, 5.0) / 5.0
+            return np.where(np.isnan(penalty), 0.5, penalty)
+
+        if factor == "price":
+            price = batch.price
+            known = ~np.isnan(price)
+            penalty = np.full(n, 0.5)
+            if known.any():
+                # Rank-based so one very expensive outlier does not flatten the rest; equal prices share a rank
+                distinct, ranks = np.unique(price[known], return_inverse=True)
+                penalty[known] = ranks / (len(distinct) - 1) if len(distinct) > 1 else 0.0
+            return penalty
+
+        if factor == "symptom_match":
+            wanted = set()
+            for symptom in symptoms or []:
+                wanted.update(self.symptom_categories.get(symptom, ()))
+            if not wanted:
+                return np.zeros(n)
+            categories = np.array([str(p.get('category', '')).lower() for p in batch.products], dtype=object)
+            return np.where(np.isin(categories, list(wanted)), 0.0, 1.0)
+
+        if factor == "source_reliability":
+            reliability = np.fromiter(
+                (self.source_reliability.get(str(p.get('source', '')).lower(), self.default_reliability)
+                 for p in batch.products),
+                dtype=np.float64, count=n
+            )
+            return 1.0 - reliability
+
+        raise ValueError(f"Unknown scoring factor: {factor}")
+
+    def score(self, batch, symptoms=None):
+        """
+        Score every candidate in a batch
+
+        Args:
+            batch: CandidateBatch of the candidate products
+            symptoms: Symptoms reported by the user
+
+        Returns:
+            (scores, contributions) where scores is an array aligned with
+            batch.products and contributions maps factor -> weighted array
+        """
+        scores = np.zeros(len(batch))
+        contributions = {}
+        for factor, weight in self.weights.items():
+            if weight == 0:
+                continue
+            contribution = weight * self._factor(factor, batch, symptoms)
+            contributions[factor] = contribution
+            scores += contribution
+        return scores, contributions
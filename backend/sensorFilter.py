@@ -0,0 +1,282 @@
+"""
+Noise filtering and calibration for streamed sensor pH
+
+The ESP32 firmware converts one unaveraged analogRead to pH and sends it
+with two decimals, so consecutive readings of the same scalp wander by a
+tenth of a pH or more and the odd bad sample lands far off. SensorFilter
+keeps a small window per device and turns each raw reading into a stable
+value before it is stored or used for recommendations:
+
+  1. add the device's calibration offset (SENSOR_CALIBRATION_PATH)
+  2. reject the reading as an outlier if it is further from the window
+     median than SENSOR_OUTLIER_THRESHOLD scaled median absolute deviations
+     (and at least SENSOR_OUTLIER_MIN_DEVIATION pH)
+  3. smooth the window median with an exponential moving average
+
+Rejected readings still enter the window, so a genuine change of level
+passes once it makes up half the window. State is kept for at most
+SENSOR_FILTER_MAX_DEVICES devices (least recently seen dropped first) and
+is reset after SENSOR_FILTER_IDLE_SECONDS without readings, e.g. when the
+sensor is moved to another spot.
+
+A batch that may still be refused downstream (the readings buffer can be
+full) is filtered with stage_rows, which leaves the device state alone, and
+applied with commit once it is accepted. Readings carry the device's own
+timestamps; a recommendation request has none, so it reads the device's
+current smoothed pH with current() instead of feeding the filter.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+# Scales a median absolute deviation to a standard deviation for normal noise
+_MAD_SCALE = 1.4826
+
+
+class _DeviceState:
+    __slots__ = ("window", "smoothed", "last_seen", "version", "received")
+
+    def __init__(self, size):
+        self.window = deque(maxlen=size)
+        self.smoothed = None
+        self.last_seen = None  # device timestamp of the newest reading
+        self.version = 0
+        self.received = None  # server monotonic time the newest reading arrived
+
+    def copy(self):
+        state = _DeviceState(self.window.maxlen)
+        state.window.extend(self.window)
+        state.smoothed, state.last_seen, state.version = self.smoothed, self.last_seen, self.version
+        state.received = self.received
+        return state
+
+
+def _median(values):
+    ordered = sorted(values)
+    mid = len(ordered) // 2
+    return ordered[mid] if len(ordered) % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+
+class SensorFilter:
+    """
+    Per-device median/EMA smoothing, outlier rejection and calibration offsets
+
+    Args:
+        window: Raw readings kept per device for the median and outlier test
+        alpha: EMA weight of the newest window median (1 disables smoothing)
+        outlier_threshold: Scaled MADs from the median beyond which a reading is rejected
+        min_deviation: Smallest distance (pH) from the median ever treated as an outlier
+        max_devices: Devices whose state is kept at once
+        idle_reset: Seconds without readings after which a device starts afresh
+        calibration: Mapping of device_id to a pH offset added to its readings
+    """
+
+    def __init__(self, window=7, alpha=0.3, outlier_threshold=3.5, min_deviation=0.3,
+                 max_devices=10000, idle_reset=300, calibration=None):
+        self.window = window
+        self.alpha = alpha
+        self.outlier_threshold = outlier_threshold
+        self.min_deviation = min_deviation
+        self.max_devices = max_devices
+        self.idle_reset = idle_reset
+        self._calibration = dict(calibration or {})
+        self._devices = OrderedDict()  # device_id -> _DeviceState
+        self._lock = threading.Lock()
+        self.readings = 0
+        self.outliers = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build a filter configured by the SENSOR_* environment variables"""
+        calibration = {}
+        path = os.getenv("SENSOR_CALIBRATION_PATH")
+        if path and os.path.exists(path):
+            with open(path) as f:
+                calibration = {str(device): float(offset) for device, offset in json.load(f).items()}
+            logger.info("Loaded calibration offsets for %d devices from %s", len(calibration), path)
+        return cls(
+            window=int(os.getenv("SENSOR_FILTER_WINDOW", "7")),
+            alpha=float(os.getenv("SENSOR_FILTER_ALPHA", "0.3")),
+            outlier_threshold=float(os.getenv("SENSOR_OUTLIER_THRESHOLD", "3.5")),
+            min_deviation=float(os.getenv("SENSOR_OUTLIER_MIN_DEVIATION", "0.3")),
+            max_devices=int(os.getenv("SENSOR_FILTER_MAX_DEVICES", "10000")),
+            idle_reset=float(os.getenv("SENSOR_FILTER_IDLE_SECONDS", "300")),
+            calibration=calibration
+        )
+
+    def set_calibration(self, device_id, offset):
+        """Set the pH offset added to every later reading from `device_id`"""
+        with self._lock:
+            self._calibration[device_id] = float(offset)
+
+    def update(self, device_id, ph, timestamp):
+        """
+        Feed one raw reading through the device's filter
+
+        Args:
+            device_id: Device the reading came from
+            ph: Raw pH as sent by the device
+            timestamp: Epoch seconds of the reading
+
+        Returns:
+            (stabilized_ph, outlier) - the device's smoothed pH after this
+            reading, rounded to 0.01, and whether the reading was rejected
+            (an outlier leaves the smoothed pH unchanged)
+        """
+        with self._lock:
+            ph = self._calibrated(device_id, ph)
+            state = self._devices.get(device_id)
+            if state is None:
+                state = self._track(device_id, _DeviceState(self.window))
+            else:
+                self._devices.move_to_end(device_id)
+            stabilized, outlier = self._step(state, ph, timestamp)
+            state.version += 1
+            state.received = time.monotonic()
+            self.readings += 1
+            self.outliers += outlier
+            return stabilized, outlier
+
+    def current(self, device_id, ph):
+        """
+        The device's stabilized pH, without feeding `ph` into its filter
+
+        Args:
+            device_id: Device the reading came from
+            ph: Raw pH from the request, used when the device has no recent readings
+
+        Returns:
+            The smoothed pH (rounded to 0.01) if the device sent readings in
+            the last idle_reset seconds, else `ph` with its calibration offset
+        """
+        with self._lock:
+            state = self._devices.get(device_id)
+            if (state is not None and state.smoothed is not None
+                    and time.monotonic() - state.received <= self.idle_reset):
+                return round(state.smoothed, 2)
+            return round(self._calibrated(device_id, ph), 2)
+
+    def stage_rows(self, rows):
+        """
+        Stabilize (device_id, user_id, ph_value, timestamp) rows without changing device state
+
+        Args:
+            rows: Rows as from parse_readings
+
+        Returns:
+            (rows, outliers, staged) - the rows with ph_value replaced by the
+            stabilized pH, without rejected readings, how many were rejected,
+            and the state changes to pass to commit once the rows are accepted
+        """
+        filtered = []
+        staged = {}  # device_id -> [base state, base version, staged state, calibrated readings, outliers]
+        with self._lock:
+            for device_id, user_id, ph, timestamp in rows:
+                entry = staged.get(device_id)
+                if entry is None:
+                    base = self._devices.get(device_id)
+                    entry = staged[device_id] = [
+                        base, base.version if base else 0,
+                        base.copy() if base else _DeviceState(self.window), [], 0
+                    ]
+                ph = self._calibrated(device_id, ph)
+                stabilized, outlier = self._step(entry[2], ph, timestamp)
+                entry[3].append((ph, timestamp))
+                entry[4] += outlier
+                if not outlier:
+                    filtered.append((device_id, user_id, stabilized, timestamp))
+        return filtered, len(rows) - len(filtered), staged
+
+    def commit(self, staged):
+        """
+        Apply the state changes from stage_rows
+
+        A device whose state moved on since staging (another batch or
+        update in between) gets the staged readings replayed on its current
+        state instead, so no reading is lost either way.
+        """
+        received = time.monotonic()
+        with self._lock:
+            for device_id, (base, base_version, state, readings, outliers) in staged.items():
+                current = self._devices.get(device_id)
+                if current is base and (base is None or base.version == base_version):
+                    state.version = base_version + 1
+                    if base is None:
+                        self._track(device_id, state)
+                    else:
+                        self._devices[device_id] = state
+                        self._devices.move_to_end(device_id)
+                else:
+                    if current is None:
+                        current = self._track(device_id, _DeviceState(self.window))
+                    else:
+                        self._devices.move_to_end(device_id)
+                    outliers = 0
+                    for ph, timestamp in readings:
+                        outliers += self._step(current, ph, timestamp)[1]
+                    current.version += 1
+                    state = current
+                state.received = received
+                self.readings += len(readings)
+                self.outliers += outliers
+
+    def _calibrated(self, device_id, ph):
+        """`ph` with the device's calibration offset, clamped to 0-14"""
+        return min(14.0, max(0.0, ph + self._calibration.get(device_id, 0.0)))
+
+    def _track(self, device_id, state):
+        """Start keeping `state` for a device, dropping the least recently seen past max_devices"""
+        self._devices[device_id] = state
+        if len(self._devices) > self.max_devices:
+            self._devices.popitem(last=False)
+            self.evictions += 1
+        return state
+
+    def _step(self, state, ph, timestamp):
+        """Feed one calibrated reading into `state`; returns (stabilized_ph, outlier)"""
+        if state.last_seen is not None and abs(timestamp - state.last_seen) > self.idle_reset:
+            state.window.clear()
+            state.smoothed = None
+        state.last_seen = timestamp
+        state.window.append(ph)
+
+        median = _median(state.window)
+        # Three readings are the fewest that can outvote one bad sample
+        if len(state.window) >= 3:
+            spread = _MAD_SCALE * _median([abs(value - median) for value in state.window])
+            if abs(ph - median) > max(self.outlier_threshold * spread, self.min_deviation):
+                return round(state.smoothed, 2), True
+
+        if state.smoothed is None:
+            state.smoothed = median
+        else:
+            state.smoothed += self.alpha * (median - state.smoothed)
+        return round(state.smoothed, 2), False
+
+    def stats(self):
+        """Return tracked devices and reading counters"""
+        with self._lock:
+            return {
+                "devices": len(self._devices),
+                "readings": self.readings,
+                "outliers": self.outliers,
+                "evictions": self.evictions
+            }
+
+    def collect_metrics(self):
+        """Tracked devices and filtered readings, for the metrics registry"""
+        stats = self.stats()
+        yield "sensor_filter_devices", "gauge", "Devices with filter state", [({}, stats["devices"])]
+        yield "sensor_filter_readings_total", "counter", "Readings through the sensor filter by outcome", [
+            ({"result": "accepted"}, stats["readings"] - stats["outliers"]),
+            ({"result": "outlier"}, stats["outliers"])
+        ]
+        yield "sensor_filter_evictions_total", "counter", "Device states dropped to stay under the limit", [
+            ({}, stats["evictions"])
+        ]
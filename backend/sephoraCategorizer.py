@@ -0,0 +1,115 @@
+import threading
+
+# (keyword, category, pH) checked in priority order against the product name and type
+CATEGORY_RULES = (
+    ('shampoo', 'Shampoo', 5.5),
+    ('conditioner', 'Conditioner', 4.5),
+    ('treatment', 'Treatment', 5.0),
+    ('mask', 'Mask', 5.0),
+    ('oil', 'Oil', 5.0),
+    ('serum', 'Serum', 5.0),
+    ('scalp', 'Scalp Care', 5.5),
+)
+
+# Refinements for 'Scalp Care' products, in priority order
+SCALP_PH_RULES = (
+    ('oily', 5.0),
+    ('dry', 5.8),
+    ('dandruff', 5.2),
+)
+
+DEFAULT_CATEGORY = ('Hair Care', 5.5)
+
+# Shared result tuples, so memoized results cost no extra allocations
+_SCALP_CARE = ('Scalp Care', 5.5)
+_CATEGORY_RESULTS = tuple(
+    (keyword, _SCALP_CARE if category == _SCALP_CARE[0] else (category, ph_level))
+    for keyword, category, ph_level in CATEGORY_RULES
+)
+_SCALP_RESULTS = tuple((keyword, (_SCALP_CARE[0], ph_level)) for keyword, ph_level in SCALP_PH_RULES)
+
+
+def classify(name, product_type):
+    """
+    Categorize a product from its lowercased name and type
+
+    Args:
+        name: Lowercased display name
+        product_type: Lowercased product type
+
+    Returns:
+        Tuple of (category, ph_level), before any refinement by search query
+    """
+    for keyword, result in _CATEGORY_RESULTS:
+        if keyword in name or keyword in product_type:
+            break
+    else:
+        return DEFAULT_CATEGORY
+
+    if result is _SCALP_CARE:
+        for keyword, scalp_result in _SCALP_RESULTS:
+            if keyword in name or keyword in product_type:
+                return scalp_result
+    return result
+
+
+class SephoraCategorizer:
+    """
+    Table-driven Sephora product categorizer with per-product memoization
+
+    The lowercased name and type are checked against the rule tables in
+    priority order. Results are memoized by product id in a
+    bounded table, so a product seen again in a later page or catalog sync
+    is not rescanned. The search query only refines 'Scalp Care' products,
+    so it is applied after the lookup instead of being part of the key.
+    Lookups and inserts are single dict operations and take no lock; only
+    eviction, once the table is full, does.
+    """
+
+    def __init__(self, max_entries=65536):
+        self.max_entries = max_entries
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def categorize(self, product, query=None):
+        """
+        Categorize Sephora product and estimate pH level
+
+        Args:
+            product: Product data from Sephora API
+            query: Original search query used
+
+        Returns:
+            Tuple of (category, ph_level)
+        """
+        memo = self._memo
+        product_id = product.get('productId') or product.get('id')
+        result = memo.get(product_id) if product_id else None
+        if result is None:
+            product_name = product.get('displayName')
+            product_type = product.get('productType')
+            result = classify(
+                product_name.lower() if isinstance(product_name, str) else '',
+                product_type.lower() if isinstance(product_type, str) else ''
+            )
+            if product_id and self.max_entries > 0:
+                if len(memo) >= self.max_entries:
+                    self._evict()
+                memo[product_id] = result
+
+        # If original query can provide context, use it
+        if query and result[0] == _SCALP_CARE[0]:
+            query = query.lower()
+            for keyword, scalp_result in _SCALP_RESULTS:
+                if keyword in query:
+                    return scalp_result
+        return result
+
+    def _evict(self):
+        """Drop the oldest entry to make room for a new one"""
+        with self._lock:
+            try:
+                del self._memo[next(iter(self._memo))]
+            except (StopIteration, KeyError, RuntimeError):
+                # Emptied or resized by a concurrent eviction
+                pass
@@ -1,13 +1,24 @@
-from flask import Flask, request, jsonify
+import atexit
+import json
+import logging
+import time
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 import os
-import traceback
 from dotenv import load_dotenv
 from productRecommendations import PHPerfectAPIIntegration
+from phTrends import RESOLUTIONS, TrendStore
+from readingStore import ReadingStore, ReadingStoreFull, ReadingStoreUnavailable, parse_readings
+from sensorFilter import SensorFilter
+from structuredLogging import configure_logging, logging_metrics, request_id_var, set_request_id, reset_request_id
 
 # Load environment variables
 load_dotenv()
 
+# Log through a background queue, tagged with the request id (LOG_LEVEL, LOG_FORMAT)
+configure_logging()
+logger = logging.getLogger("server")
+
 # Initialize Flask app
 app = Flask(__name__)
 
@@ -19,22 +30,115 @@ openai_key = os.getenv("OPENAI_API_KEY")
 sephora_key = os.getenv("SEPHORA_API_KEY")
 
 if not openai_key:
-    print("WARNING: OPENAI_API_KEY not found in environment")
+    logger.warning("OPENAI_API_KEY not found in environment")
 if not sephora_key:
-    print("WARNING: SEPHORA_API_KEY not found in environment")
+    logger.warning("SEPHORA_API_KEY not found in environment")
+
+# Largest accepted /api/recommendations/batch request
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+
+# Largest accepted /api/readings batch
+READINGS_MAX_BATCH = int(os.getenv("READINGS_MAX_BATCH", "1000"))
+
+# Days of reading history summarized into the advice for a user
+TREND_WINDOW_DAYS = float(os.getenv("TREND_WINDOW_DAYS", "30"))
 
 # Initialize API integration
 try:
     api = PHPerfectAPIIntegration()
-    print("Successfully initialized API integration")
+    api.metrics.add_collector(logging_metrics)
+    logger.info("Successfully initialized API integration")
+    
+    # Pre-warm the local product catalog from a nightly crawl, if one exists
+    catalog_path = os.getenv("CATALOG_JSONL_PATH")
+    if catalog_path and os.path.exists(catalog_path):
+        api.catalog.load_jsonl(catalog_path)
+        
+    # Keep the local product catalog in sync with the upstream APIs
+    catalog_sync_interval = float(os.getenv("CATALOG_SYNC_INTERVAL_SECONDS", "0"))
+    if catalog_sync_interval > 0:
+        api.catalog.start_background_sync(api, catalog_sync_interval)
+        
+    # Serve precomputed responses from RECOMMENDATION_TABLE_PATH, rebuilt in the background
+    api.recommendation_table.load()
+    table_refresh_interval = float(os.getenv("RECOMMENDATION_TABLE_REFRESH_SECONDS", "0"))
+    if api.recommendation_table.path and table_refresh_interval > 0:
+        api.recommendation_table.start_background_refresh(api, table_refresh_interval)
+        
+    # Smooth and calibrate device readings before they are stored or used (SENSOR_*)
+    sensor_filter = SensorFilter.from_env()
+    api.metrics.add_collector(sensor_filter.collect_metrics)
+    
+    # Buffer streamed pH readings and write them to READINGS_DB_PATH in bulk
+    reading_store = ReadingStore.from_env(metrics=api.metrics)
+    # Rollups are kept up to date by the store's flushes, so hook them in before it starts
+    trend_store = TrendStore(reading_store)
+    reading_store.start()
+    api.metrics.add_collector(reading_store.collect_metrics)
+    atexit.register(reading_store.close)
 except Exception as e:
-    print(f"Error initializing API integration: {e}")
-    traceback.print_exc()
+    logger.exception("Error initializing API integration: %s", e)
+
+@app.before_request
+def start_request():
+    g.request_start = time.perf_counter()
+    # Honour a caller-supplied id so logs can be joined across services
+    g.request_id_token = set_request_id(request.headers.get("X-Request-ID"))
+
+@app.after_request
+def finish_request(response):
+    if hasattr(g, 'request_start'):
+        seconds = time.perf_counter() - g.request_start
+        # Label by route pattern, not raw path, to keep the series count bounded
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        if 'api' in globals():
+            api.metrics.request_duration.observe(
+                seconds, endpoint=endpoint, method=request.method, status=str(response.status_code)
+            )
+        logger.info("%s %s %d in %.1f ms", request.method, request.path, response.status_code, seconds * 1000)
+    response.headers["X-Request-ID"] = request_id_var.get()
+    return response
+
+@app.teardown_request
+def reset_request(exc):
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        reset_request_id(token)
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Stage latency histograms, upstream statuses and cache counters in Prometheus text format"""
+    return Response(api.metrics.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route('/api/test', methods=['GET'])
 def test_endpoint():
     return jsonify({"status": "ok", "message": "API server is running"}), 200
 
+def fetch_hair_products(scalp_ph, symptoms):
+    """Fetch products from every planned source, falling back to the default set"""
+    hair_products = []
+    
+    try:
+        # Serve from the local catalog once it is warm
+        hair_products = api.catalog_products_for(scalp_ph, symptoms)
+        if hair_products is not None:
+            logger.debug("Serving %d products from the local catalog", len(hair_products))
+            return hair_products
+            
+        # Fetch all planned sources concurrently within the request deadline
+        hair_products = api.fetch_products_for(scalp_ph, symptoms)
+            
+        logger.debug("Fetched %d products total", len(hair_products))
+    except Exception as e:
+        logger.exception("Error fetching products: %s", e)
+    
+    # Continue with any products we have or fallback to default products
+    if not hair_products:
+        logger.warning("Using default products, no source returned in time")
+        hair_products = api._generate_default_products()
+        
+    return hair_products
+
 @app.route('/api/recommendations', methods=['POST'])
 def get_recommendations():
     try:
@@ -43,57 +147,40 @@ def get_recommendations():
         scalp_ph = data.get('scalp_ph', 5.5)  # Default to 5.5 if not provided
         symptoms = data.get('symptoms', [])
         
-        print(f"Received request for scalp pH: {scalp_ph}, symptoms: {symptoms}")
+        logger.debug("Received request for scalp pH: %s, symptoms: %s", scalp_ph, symptoms)
         
-        # Fetch product recommendations from different sources
-        hair_products = []
+        # A known device's reading is replaced by its filter's current stabilized pH
+        if data.get('device_id') is not None:
+            scalp_ph = sensor_filter.current(str(data['device_id']), float(scalp_ph))
         
-        try:
-            # Get shampoos
-            print("Fetching shampoo products...")
-            hair_products.extend(api.fetch_beauty_products(category="shampoo", count=3))
-            
-            # Get products based on scalp pH
-            query = "scalp care"
-            if scalp_ph > 6.0:
-                query = "oily scalp"
-            elif scalp_ph < 4.5:
-                query = "dry scalp"
-                
-            print(f"Fetching products for '{query}'...")
-            hair_products.extend(api.fetch_sephora_products(query=query, count=3))
-            
-            # Add more targeted products based on symptoms
-            if "dandruff" in symptoms:
-                print("Fetching dandruff products...")
-                hair_products.extend(api.fetch_sephora_products(query="dandruff shampoo", count=2))
-            if "dryness" in symptoms:
-                print("Fetching dry scalp products...")
-                hair_products.extend(api.fetch_sephora_products(query="dry scalp treatment", count=2))
-            if "itchiness" in symptoms:
-                print("Fetching itchy scalp products...")
-                hair_products.extend(api.fetch_sephora_products(query="itchy scalp relief", count=2))
-                
-            print(f"Successfully fetched {len(hair_products)} products total")
-        except Exception as e:
-            print(f"Error fetching products: {e}")
-            traceback.print_exc()
-            # Continue with any products we have or fallback to default products
-            if not hair_products:
-                print("Using default products due to fetch error")
-                hair_products = api._generate_default_products()
+        # Summarize the user's recent readings for the advice, if we have any
+        trend = None
+        if data.get('user_id') is not None:
+            trend = trend_store.summary(str(data['user_id']), days=TREND_WINDOW_DAYS)
+            if not trend["readings"]:
+                trend = None
+        
+        # Readings inside the precomputed table are a single lookup (the table has no history-aware advice)
+        if not data.get('debug') and trend is None:
+            body = api.recommendation_table.lookup(scalp_ph, symptoms)
+            if body is not None:
+                return Response(body, mimetype="application/json")
+        
+        # Fetch product recommendations from different sources
+        hair_products = fetch_hair_products(scalp_ph, symptoms)
             
         # Get recommendations from OpenAI and product list
-        print("Getting OpenAI recommendations...")
-        recommendations = api.get_openai_recommendation(scalp_ph, symptoms, hair_products)
+        recommendations = api.get_openai_recommendation(
+            scalp_ph, symptoms, hair_products, debug=bool(data.get('debug')), trend=trend
+        )
+        if trend is not None:
+            recommendations["trend"] = trend
         
-        print("Successfully generated recommendations")
         # Return JSON response
         return jsonify(recommendations)
     
     except Exception as e:
-        print(f"Error processing recommendation request: {e}")
-        traceback.print_exc()
+        logger.exception("Error processing recommendation request: %s", e)
         return jsonify({
             "error": str(e),
             "advice_text": f"Sorry, we encountered an error processing your request: {str(e)}. Please try again later.",
@@ -102,8 +189,122 @@ def get_recommendations():
             "symptoms": data.get('symptoms', []) if 'data' in locals() else []
         }), 500
 
+@app.route('/api/recommendations/batch', methods=['POST'])
+def get_batch_recommendations():
+    """
+    Recommendations for many readings in one call
+    
+    Body: {"items": [{"scalp_ph": 5.2, "symptoms": ["dandruff"]}, ...]}
+    Returns {"results": [...]} in input order; failed items carry an "error" key.
+    """
+    data = request.json or {}
+    items = data.get('items') if isinstance(data, dict) else data
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Request body needs a non-empty 'items' list"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {BATCH_MAX_ITEMS} items per batch"}), 400
+        
+    logger.debug("Received batch request with %d items", len(items))
+    
+    try:
+        results = api.get_batch_recommendations(items)
+        return jsonify({"results": results})
+    except Exception as e:
+        logger.exception("Error processing batch recommendation request: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/readings', methods=['POST'])
+def ingest_readings():
+    """
+    Accept a batch of timestamped pH readings from a device or relaying app
+    
+    Body: {"device_id": "esp32-01", "user_id": "u1", "readings": [{"ph": 5.21, "timestamp": 1735689600}, ...]}
+    Readings are stored as stabilized by the device's sensor filter; outliers
+    are dropped and counted. Returns 202 once the batch is buffered for the
+    next bulk write, or 429 (buffer full) / 503 (store not writing) with a
+    Retry-After header.
+    """
+    try:
+        rows = parse_readings(request.get_json(silent=True), max_readings=READINGS_MAX_BATCH)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+        
+    # Filter state only moves on once the batch is buffered, so a retried batch is filtered afresh
+    rows, outliers, staged = sensor_filter.stage_rows(rows)
+    try:
+        if rows:
+            reading_store.submit(rows)
+    except ReadingStoreFull as e:
+        return jsonify({"error": str(e)}), 429, {"Retry-After": str(e.retry_after)}
+    except ReadingStoreUnavailable as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+    sensor_filter.commit(staged)
+        
+    return jsonify({"accepted": len(rows), "outliers": outliers}), 202
+
+@app.route('/api/trends', methods=['GET'])
+def get_trends():
+    """
+    Rolling statistics and downsampled history of a user's readings
+    
+    Query: user_id (required), days (window, default TREND_WINDOW_DAYS),
+    resolution (hourly, daily or monthly; default picked from days)
+    Returns {"summary": {...}, "series": [{"bucket_start": ..., "mean": ...}, ...]}
+    """
+    user_id = request.args.get('user_id')
+    if not user_id:
+        return jsonify({"error": "user_id is required"}), 400
+    try:
+        days = float(request.args.get('days', TREND_WINDOW_DAYS))
+    except ValueError:
+        return jsonify({"error": "days must be a number"}), 400
+    if not 0 < days <= 3660:
+        return jsonify({"error": "days must be between 0 and 3660"}), 400
+    resolution = request.args.get('resolution') or trend_store.resolution_for(days)
+    if resolution not in RESOLUTIONS:
+        return jsonify({"error": f"resolution must be one of {', '.join(RESOLUTIONS)}"}), 400
+        
+    now = time.time()
+    return jsonify({
+        "summary": trend_store.summary(user_id, days=days, now=now),
+        "series": trend_store.series(user_id, resolution, now - days * 86400, now)
+    })
+
+@app.route('/api/recommendations/stream', methods=['POST'])
+def stream_recommendations():
+    """
+    Same input as /api/recommendations, answered as server-sent events:
+    a "products" event with the ranked list, "advice" events carrying text
+    fragments as OpenAI produces them, then a final "done" event.
+    """
+    data = request.json or {}
+    scalp_ph = data.get('scalp_ph', 5.5)
+    symptoms = data.get('symptoms', [])
+    
+    logger.debug("Received streaming request for scalp pH: %s, symptoms: %s", scalp_ph, symptoms)
+    
+    # A known device's reading is replaced by its filter's current stabilized pH
+    if data.get('device_id') is not None:
+        scalp_ph = sensor_filter.current(str(data['device_id']), float(scalp_ph))
+    
+    def generate():
+        try:
+            hair_products = fetch_hair_products(scalp_ph, symptoms)
+            for event, payload in api.stream_recommendation_events(scalp_ph, symptoms, hair_products):
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        except Exception as e:
+            logger.exception("Error streaming recommendation request: %s", e)
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
-    print("Starting Flask server...")
+    logger.info("Starting Flask server...")
     port = int(os.environ.get("PORT", 3001))
     # Use 0.0.0.0 to allow connections from other devices on the network
     app.run(host="0.0.0.0", port=port, debug=True)
\ No newline at end of file
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls across threads
+
+    While a call for a key is in flight, every other caller with the same key
+    waits for it and gets the same result (or exception) instead of starting
+    its own. The key is forgotten as soon as the call finishes, so this only
+    merges overlapping calls and never caches; the product and advice caches
+    do that.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._inflight = {}  # key -> Future
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """
+        Call `fn()` unless a call for `key` is already running, then share its outcome
+
+        Args:
+            key: Hashable identity of the call, e.g. (source, query, count)
+            fn: Zero-argument callable doing the upstream work
+
+        Returns:
+            The value returned by whichever caller ran `fn`
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._inflight[key] = Future()
+                self.calls += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self._forget(key, future)
+            future.set_exception(e)
+            raise
+        self._forget(key, future)
+        future.set_result(result)
+        return result
+
+    def share(self, key, start):
+        """
+        Return the in-flight Future for `key`, or the one `start()` returns
+
+        For calls that already run on an executor: `start` submits the work
+        and only the first caller's submission happens.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            future = self._inflight[key] = start()
+            self.calls += 1
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def stats(self):
+        """Return call counters and the number of keys in flight"""
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced, "inflight": len(self._inflight)}
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces identical concurrent coroutines on one event loop
+
+    The first caller's coroutine runs as a task that every caller awaits
+    through asyncio.shield, so a waiter giving up at its own deadline never
+    cancels the call the others are waiting on.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._inflight = {}  # key -> Task
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, coro_fn):
+        """
+        Await `coro_fn()` unless a call for `key` is already running, then share its outcome
+
+        Args:
+            key: Hashable identity of the call
+            coro_fn: Zero-argument callable returning the coroutine to run
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(coro_fn())
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Every waiter may have given up already; consume the outcome so it is not reported as lost
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        """Return call counters and the number of keys in flight"""
+        return {"calls": self.calls, "coalesced": self.coalesced, "inflight": len(self._inflight)}
@@ -0,0 +1,144 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+import uuid
+
+# Request id of the request being served on the current thread or task
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"
+
+# Transport libraries that log every connection and request; kept at WARNING or above
+QUIET_LOGGERS = ("urllib3", "httpcore", "httpx", "asyncio")
+
+_listener = None
+_handler = None
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:16]
+
+
+def set_request_id(request_id=None):
+    """Bind a request id (a new one if not given) to the current context; returns a reset token"""
+    return request_id_var.set(request_id or new_request_id())
+
+
+def reset_request_id(token):
+    request_id_var.reset(token)
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps each record with the current request id, on the thread that logged it"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any `extra={"fields": {...}}` merged in"""
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if isinstance(fields, dict):
+            entry.update(fields)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a background listener without ever blocking the caller
+
+    Only the message interpolation (and traceback text, when there is one)
+    happens on the logging thread; formatting and stream I/O happen on the
+    listener thread. When the queue is full the record is dropped and
+    counted instead of stalling the request.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def stop_listener(listener):
+    """Flush the queue, then stop the listener (its stop sentinel cannot go into a full queue)"""
+    listener.queue.join()
+    listener.stop()
+
+
+def configure_logging(level=None, log_format=None, stream=None, queue_size=None):
+    """
+    Route all logging through a queue to a background writer thread
+
+    Configured by LOG_LEVEL (default INFO), LOG_FORMAT ("text" or "json",
+    default "text") and LOG_QUEUE_SIZE (default 10000). Safe to call more
+    than once; later calls return the handler installed by the first.
+
+    Returns:
+        The NonBlockingQueueHandler installed on the root logger
+    """
+    global _listener, _handler
+    if _handler is not None:
+        return _handler
+
+    level = level or os.getenv("LOG_LEVEL", "INFO").upper()
+    log_format = (log_format or os.getenv("LOG_FORMAT", "text")).lower()
+    queue_size = queue_size or int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    _handler = NonBlockingQueueHandler(log_queue)
+    _handler.addFilter(RequestIdFilter())
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_listener, _listener)
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(max(root.level, logging.WARNING))
+    return _handler
+
+
+def logging_metrics():
+    """Queue depth and dropped record count, for the metrics registry"""
+    if _handler is None:
+        return
+    yield "log_queue_depth", "gauge", "Log records waiting for the writer thread", [({}, _handler.queue.qsize())]
+    yield "log_records_dropped_total", "counter", "Log records dropped because the queue was full", [({}, _handler.dropped)]